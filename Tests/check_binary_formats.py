@@ -0,0 +1,134 @@
+"""
+Round trips through the binary model (".bin") and dataset (".chords")
+formats, compared with the JSON / JSONL versions.
+
+    python -m Tests.check_binary_formats
+"""
+
+import os
+import random
+import tempfile
+
+from models.markov_backoff import lookup_next_probs
+from models.model_store import DEFAULT_MODEL_DIR, load_model
+from Tests.check_sampling import alias_probs, contexts, max_error, normalized
+from Tests.run_checks import expect, needs
+
+# Probabilities are stored as float32
+FLOAT32_TOLERANCE = 1e-6
+
+
+def check_binary_model_round_trip():
+    from models.model_binary import MappedMarkovModel, save_binary_model
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for filename in ("markov_probabilities.json", "markov_probabilities_2nd_order.json"):
+            model = load_model(os.path.join(DEFAULT_MODEL_DIR, filename))
+            path = os.path.join(tmp, filename.replace(".json", ".bin"))
+            save_binary_model(model.index, model.order, path, model.functions)
+            mapped = MappedMarkovModel(path)
+            try:
+                expect(mapped.order == model.order, f"{filename}: order")
+                expect(mapped.moods == list(model.moods), f"{filename}: moods")
+
+                for mood in list(model.moods) + ["unknown mood"]:
+                    for context in contexts(model.order):
+                        probs, level = lookup_next_probs(model.index, mood, context)
+                        mapped_probs, mapped_level = mapped.lookup(mood, context)
+                        where = f"{filename} {mood} {context}"
+                        expect(mapped_level == level, f"{where}: level {mapped_level} != {level}")
+                        expect(max_error(normalized(probs), mapped_probs) < FLOAT32_TOLERANCE, where)
+                        table, _ = mapped.sampler.resolve(mood, context)
+                        expect(max_error(normalized(mapped_probs), alias_probs(table)) < 1e-9, where)
+
+                # The decoded index holds the same rows
+                for mood, tables in model.index.items():
+                    for level, rows in tables.items():
+                        for context, probs in rows.items():
+                            decoded = mapped.index[mood][level][context]
+                            expect(
+                                max_error(normalized(probs), decoded) < FLOAT32_TOLERANCE,
+                                f"{filename} index {mood} {level} {context}",
+                            )
+            finally:
+                mapped.close()
+
+
+def check_binary_dataset_round_trip():
+    needs("numpy")
+    from utils.dataset_binary import BinaryDataset
+    from utils.dataset_stream import is_binary_dataset, iter_dataset
+    from utils.generate_dataset_no_ext import iter_sessions, write_dataset
+
+    with tempfile.TemporaryDirectory() as tmp:
+        binary = os.path.join(tmp, "dataset.chords")
+        jsonl = os.path.join(tmp, "dataset.jsonl.gz")
+        count = write_dataset(binary, 300, 8, random.Random(7))
+        write_dataset(jsonl, 300, 8, random.Random(7))
+
+        expect(is_binary_dataset(binary), "written .chords not recognized")
+        expect(list(iter_dataset(binary)) == list(iter_dataset(jsonl)), "samples differ from JSONL")
+
+        dataset = BinaryDataset(binary)
+        sessions = list(iter_sessions(300, 8, random.Random(7)))
+        expect(len(dataset) == count, "sample count")
+        expect(
+            [dataset.session(i) for i in range(dataset.num_sessions)] == [(m, p) for m, p in sessions],
+            "sessions differ",
+        )
+
+
+def check_binary_dataset_counts():
+    needs("numpy")
+    from utils.dataset_binary import BinaryDataset
+    from utils.generate_dataset_no_ext import write_dataset
+
+    order = 2
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "dataset.chords")
+        write_dataset(path, 500, 8, random.Random(3))
+        dataset = BinaryDataset(path)
+
+        functions = sorted(set(dataset.functions))
+        codes = {f: i for i, f in enumerate(functions)}
+        V = len(functions)
+        chord_functions = [codes[f] for f in dataset.functions]
+        counts = dataset.transition_counts(order, chord_functions, V, chunk_tokens=97)
+
+        # Same counts, one session at a time in plain Python
+        expected = {j: [0] * (len(dataset.moods) * V ** (j + 1)) for j in range(1, order + 1)}
+        for i in range(dataset.num_sessions):
+            mood, progression = dataset.session(i)
+            m = dataset.moods.index(mood)
+            funcs = [chord_functions[dataset.chords.index(ch)] for ch in progression]
+            for t in range(len(funcs)):
+                for j in range(1, min(t, order) + 1):
+                    context = 0
+                    for f in funcs[t - j:t]:
+                        context = context * V + f
+                    expected[j][(m * V ** j + context) * V + funcs[t]] += 1
+
+        for j in expected:
+            expect(counts[j].ravel().tolist() == expected[j], f"order-{j} transition counts")
+
+
+def check_failed_dataset_write():
+    needs("numpy")
+    from utils.dataset_binary import BinaryDatasetWriter
+    from utils.dataset_stream import is_binary_dataset
+    from utils.generate_dataset_no_ext import FUNCTIONS, KEY_CHORDS, MOODS
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "partial.chords")
+        try:
+            with BinaryDatasetWriter(path, KEY_CHORDS, MOODS, FUNCTIONS) as writer:
+                writer.add_session("mixed", ["C", "F", "G"])
+                raise RuntimeError("interrupted")
+        except RuntimeError:
+            pass
+        expect(not is_binary_dataset(path), "an interrupted write looks like a dataset")
+
+
+if __name__ == "__main__":
+    from Tests.run_checks import main
+    main(["__main__"])
@@ -0,0 +1,104 @@
+"""
+Sharded dataset generation: reproducible shards, and merge_shards() into
+every output format from every shard format.
+
+    python -m Tests.check_dataset_shards
+"""
+
+import contextlib
+import filecmp
+import io
+import os
+import random
+import tempfile
+from itertools import chain
+
+from Tests.run_checks import Skip, expect, needs
+from utils.dataset_stream import iter_dataset
+from utils.generate_dataset_no_ext import (
+    generate_dataset_sharded,
+    iter_samples,
+    merge_shards,
+    sample_sessions,
+    session_samples,
+    shard_paths,
+)
+
+SESSIONS = 400
+SHARDS = 4
+
+
+def generate(*args, **kwargs):
+    """generate_dataset_sharded without its progress output."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return generate_dataset_sharded(*args, **kwargs)
+
+
+def shard_suffixes():
+    suffixes = [".jsonl", ".jsonl.gz", ".json"]
+    try:
+        needs("numpy")
+    except Skip:
+        return suffixes
+    return suffixes + [".chords"]
+
+
+def same_tree(a, b):
+    """Files (or binary dataset directories) with identical bytes."""
+    if os.path.isdir(a):
+        names = sorted(os.listdir(a))
+        return names == sorted(os.listdir(b)) and all(
+            filecmp.cmp(os.path.join(a, n), os.path.join(b, n), shallow=False) for n in names
+        )
+    return filecmp.cmp(a, b, shallow=False)
+
+
+def check_shards_independent_of_workers():
+    with tempfile.TemporaryDirectory() as tmp:
+        for suffix in shard_suffixes():
+            one = os.path.join(tmp, "one" + suffix.replace(".", "_"))
+            three = os.path.join(tmp, "three" + suffix.replace(".", "_"))
+            generate(SESSIONS, 8, one, SHARDS, seed=5, workers=1, suffix=suffix)
+            generate(SESSIONS, 8, three, SHARDS, seed=5, workers=3, suffix=suffix)
+
+            for a, b in zip(shard_paths(one), shard_paths(three)):
+                expect(same_tree(a, b), f"{suffix}: {os.path.basename(a)} depends on the worker count")
+            expect(same_tree(os.path.join(one, "manifest.json"), os.path.join(three, "manifest.json")), "manifest")
+
+
+def check_merge_shards_every_format():
+    with tempfile.TemporaryDirectory() as tmp:
+        for shard_suffix in shard_suffixes():
+            shards = os.path.join(tmp, "shards" + shard_suffix.replace(".", "_"))
+            manifest = generate(SESSIONS, 8, shards, SHARDS, seed=9, workers=1, suffix=shard_suffix)
+            expected = list(chain.from_iterable(iter_dataset(p) for p in shard_paths(shards)))
+            expect(len(expected) == manifest["samples"], f"{shard_suffix}: manifest sample count")
+
+            for output_suffix in shard_suffixes():
+                where = f"{shard_suffix} shards → {output_suffix}"
+                output = os.path.join(tmp, "merged" + shard_suffix.replace(".", "_") + output_suffix)
+                count = merge_shards(shards, output)
+                expect(count == len(expected), f"{where}: merged {count} samples, expected {len(expected)}")
+                expect(list(iter_dataset(output)) == expected, f"{where}: samples differ")
+
+
+def check_sample_sessions_round_trip():
+    samples = list(iter_samples(200, 8, random.Random(1)))
+    rebuilt = [
+        sample
+        for mood, progression in sample_sessions(samples)
+        for sample in session_samples(mood, progression)
+    ]
+    expect(rebuilt == samples, "sessions rebuilt from samples give other samples")
+
+    try:
+        list(sample_sessions([samples[1]]))
+    except ValueError:
+        pass
+    else:
+        expect(False, "samples that don't start a session should raise ValueError")
+
+
+if __name__ == "__main__":
+    from Tests.run_checks import main
+    main(["__main__"])
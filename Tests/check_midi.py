@@ -0,0 +1,49 @@
+"""
+The direct MIDI writer against music21's streamToMidiFile, byte for byte.
+
+    python -m Tests.check_midi
+"""
+
+import random
+
+from Tests.run_checks import expect, needs
+from utils.chord_render import progression_to_stream, render_midi_bytes
+from utils.midi_writer import CHORD_PITCHES, can_render, progression_to_midi
+from utils.transpose import transpose
+
+DIATONIC = ["C", "Dm", "Em", "F", "G", "Am", "Bdim"]
+
+
+def music21_bytes(progression):
+    midi = needs("music21.midi")
+    return midi.translate.streamToMidiFile(progression_to_stream(progression)).writestr()
+
+
+def check_direct_writer_matches_music21():
+    rng = random.Random(0)
+    progressions = [["C"], ["C", "F", "G", "C"], DIATONIC]
+    progressions += [[rng.choice(DIATONIC) for _ in range(rng.randint(1, 16))] for _ in range(20)]
+    # The same progressions in other keys (sharps, flats, double accidentals)
+    for key in ("G", "Bb", "F#", "Db", "C#"):
+        progressions += [transpose(p, "C", key) for p in progressions[:6]]
+
+    for progression in progressions:
+        expect(can_render(progression), f"{progression} not in the direct writer's table")
+        expect(progression_to_midi(progression) == music21_bytes(progression), f"bytes differ for {progression}")
+
+
+def check_every_table_chord_matches_music21():
+    for symbol in CHORD_PITCHES:
+        expect(progression_to_midi([symbol]) == music21_bytes([symbol]), f"bytes differ for {symbol}")
+
+
+def check_fallback_renders_extended_chords():
+    progression = ["C", "G7", "Am", "Fmaj7"]
+    expect(not can_render(progression), "extended chords should use the music21 fallback")
+    expected = music21_bytes(progression)
+    expect(render_midi_bytes(progression) == expected, "fallback bytes differ")
+
+
+if __name__ == "__main__":
+    from Tests.run_checks import main
+    main(["__main__"])
@@ -0,0 +1,157 @@
+"""
+Style model registry: LRU eviction by count and by bytes, bounded caches
+for client-supplied moods, and style suggestions that follow reloads.
+
+    python -m Tests.check_model_registry
+"""
+
+import contextlib
+import json
+import os
+import random
+import shutil
+import tempfile
+
+from models.model_binary import save_binary_model
+from models.model_registry import REGISTRY, ModelRegistry, model_nbytes
+from models.model_store import DEFAULT_MODEL_DIR, load_model
+from Tests.run_checks import expect
+
+MODEL_FILE = "markov_probabilities_2nd_order.json"
+STYLES = ["s0", "s1", "s2", "s3", "s4"]
+
+
+@contextlib.contextmanager
+def style_dir():
+    """Temporary styles: s0..s4 (JSON), mapped (.bin), edm (one mood dir)."""
+    source = os.path.join(DEFAULT_MODEL_DIR, MODEL_FILE)
+    with tempfile.TemporaryDirectory() as tmp:
+        for style in STYLES:
+            os.makedirs(os.path.join(tmp, style))
+            shutil.copy(source, os.path.join(tmp, style))
+
+        os.makedirs(os.path.join(tmp, "mapped"))
+        model = load_model(source)
+        binary = os.path.join(tmp, "mapped", "markov_probabilities_2nd_order.bin")
+        save_binary_model(model.index, model.order, binary)
+
+        with open(source) as f:
+            raw = json.load(f)
+        os.makedirs(os.path.join(tmp, "edm", "tension-drive"))
+        with open(os.path.join(tmp, "edm", MODEL_FILE), "w") as f:
+            json.dump(raw, f)
+        with open(os.path.join(tmp, "edm", "tension-drive", MODEL_FILE), "w") as f:
+            json.dump({"tension / drive": raw["tension / drive"]}, f)
+        yield tmp
+
+
+def check_lru_by_count():
+    with style_dir() as tmp:
+        registry = ModelRegistry(tmp, max_models=3)
+        for style in STYLES[:3]:
+            registry.get(style, "mixed", 2)
+        registry.get("s0", "mixed", 2)  # s0 becomes the most recent
+        registry.get("s3", "mixed", 2)  # evicts s1
+
+        expect(len(registry) == 3, f"{len(registry)} models loaded, max 3")
+        expect(("s1", "mixed", 2) not in registry, "least recently used style kept")
+        expect(all((s, "mixed", 2) in registry for s in ("s0", "s2", "s3")), "recent styles evicted")
+        expect(registry.evictions == 1, f"{registry.evictions} evictions")
+
+
+def check_lru_by_bytes():
+    with style_dir() as tmp:
+        size = model_nbytes(ModelRegistry(tmp).get("s0", "mixed", 2))
+        registry = ModelRegistry(tmp, max_bytes=int(size * 2.5))
+        for style in STYLES:
+            registry.get(style, "mixed", 2)
+        expect(len(registry) == 2, f"{len(registry)} models within {registry.max_bytes} bytes")
+        expect(registry.nbytes <= registry.max_bytes, "byte budget exceeded")
+        expect(registry.nbytes == sum(e[1] for e in registry._models.values()), "byte total out of sync")
+
+
+def check_unknown_moods_stay_bounded():
+    with style_dir() as tmp:
+        registry = ModelRegistry(tmp)
+        rng = random.Random(0)
+        for i in range(500):
+            model = registry.get("s0", f"mood {i}", 2)
+            model.sampler.sample(f"mood {i}", ("tonic", "dominant"), rng=rng)
+        expect(len(registry._files) == 1, f"{len(registry._files)} path entries for one style")
+        expect(model.sampler.memo_size <= 1, f"sampler memo grew to {model.sampler.memo_size}")
+
+        mood_file = os.path.join(tmp, "edm", "tension-drive", MODEL_FILE)
+        expect(registry.locate("edm", "tension / drive", 2) == mood_file, "mood directory not preferred")
+        expect(registry.locate("edm", "mixed", 2) == os.path.join(tmp, "edm", MODEL_FILE), "shared file")
+
+
+def check_mapped_models_remeasured():
+    with style_dir() as tmp:
+        registry = ModelRegistry(tmp)
+        model = registry.get("mapped", "mixed", 2)
+        before = registry.nbytes
+
+        rng = random.Random(1)
+        functions = ["tonic", "predominant", "dominant"] + [f"x{i}" for i in range(400)]
+        for mood in model.moods:
+            for _ in range(2000):
+                context = (rng.choice(functions), rng.choice(functions))
+                model.sampler.sample(mood, context, rng=rng)
+                registry.get("mapped", mood, 2)
+
+        actual = model_nbytes(model)
+        expect(registry.nbytes > before, "lazily built alias tables not counted")
+        # Re-measured once the memo grows by half: at most ~1/3 behind
+        expect(registry.nbytes >= actual / 1.5 - 64 * 200, f"counted {registry.nbytes} of {actual} bytes")
+
+
+def check_style_suggestions_follow_reloads():
+    from interactive.interactive_markov_2nd_order import SuggestionCache
+
+    saved = REGISTRY.style_dir
+    with style_dir() as tmp:
+        REGISTRY.style_dir = tmp
+        REGISTRY.clear()
+        try:
+            cache = SuggestionCache()
+            before = cache.get("mixed", "tonic", "dominant", style="s0")
+
+            # Retrain s0: only predominant after every context
+            path = os.path.join(tmp, "s0", MODEL_FILE)
+            with open(path) as f:
+                raw = json.load(f)
+            for mood_rows in raw.values():
+                for context in mood_rows:
+                    mood_rows[context] = {"predominant": 1.0}
+            with open(path, "w") as f:
+                json.dump(raw, f)
+
+            expect(cache.get("mixed", "tonic", "dominant", style="s0") == before, "cached until reload")
+            REGISTRY.clear()
+            after = cache.get("mixed", "tonic", "dominant", style="s0")
+            expect(after != before and after[0][0] == "predominant", f"stale ranking after reload: {after}")
+        finally:
+            REGISTRY.style_dir = saved
+            REGISTRY.clear()
+
+
+def check_style_model_resolved_once_per_progression():
+    import models.generate_with_markov_2nd_order as gen
+
+    saved = REGISTRY.style_dir
+    with style_dir() as tmp:
+        REGISTRY.style_dir = tmp
+        REGISTRY.clear()
+        try:
+            gen.generate_progression("C", "mixed", 4, random.Random(0), style="s0")
+            hits = REGISTRY.hits
+            gen.generate_progression("C", "mixed", 32, random.Random(0), style="s0")
+            expect(REGISTRY.hits - hits == 1, f"{REGISTRY.hits - hits} registry lookups for one progression")
+        finally:
+            REGISTRY.style_dir = saved
+            REGISTRY.clear()
+
+
+if __name__ == "__main__":
+    from Tests.run_checks import main
+    main(["__main__"])
@@ -0,0 +1,87 @@
+"""
+Online model: a count snapshot backs off like the saved probability model,
+and update + undo return the counts to their previous values.
+
+    python -m Tests.check_online_model
+"""
+
+import copy
+import json
+import os
+import random
+import tempfile
+
+from models.markov_backoff import HARMONIC_FUNCTIONS, lookup_next_probs
+from models.markov_online import OnlineMarkovModel
+from models.markov_training_nth_order import count_transitions, encode_level, normalize_levels, save_counts
+from models.model_store import load_model
+from Tests.check_sampling import contexts, max_error
+from Tests.run_checks import expect
+from utils.generate_dataset_no_ext import iter_samples
+
+TOLERANCE = 1e-12
+
+
+def trained_pair(tmp, sessions=300):
+    """
+    (index of the saved 2nd-order model, online model loaded from its
+    counts), both written like markov_training_2nd_order.py does.
+    """
+    counts = count_transitions(list(iter_samples(sessions, 8, random.Random(3))), order=2)
+    model_path = os.path.join(tmp, "markov_probabilities_2nd_order.json")
+    with open(model_path, "w") as f:
+        json.dump(encode_level(normalize_levels(counts)[2]), f)
+    counts_path = os.path.join(tmp, "markov_counts_2nd_order.json")
+    save_counts(counts, counts_path, merged_first_order=True)
+    return load_model(model_path).index, OnlineMarkovModel.load(counts_path)
+
+
+def close_counts(a, b):
+    """Nested count dicts equal up to float rounding (level-1 counts are merged rows)."""
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(close_counts(a[k], b[k]) for k in a)
+    return abs(a - b) <= 1e-9 * max(1.0, abs(a))
+
+
+def check_snapshot_backs_off_like_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        index, online = trained_pair(tmp)
+        for mood in list(index) + ["unknown mood"]:
+            for context in list(contexts(2)) + [("x", func) for func in HARMONIC_FUNCTIONS]:
+                probs, level = lookup_next_probs(index, mood, context)
+                online_probs, online_level = online.lookup(mood, context)
+                expect(online_level == level, f"{mood} {context}: level {online_level} != {level}")
+                error = max_error(probs, online_probs)
+                expect(error < TOLERANCE, f"{mood} {context}: fallback off by {error}")
+
+
+def check_update_undo_restores_counts():
+    with tempfile.TemporaryDirectory() as tmp:
+        _, online = trained_pair(tmp)
+        before = copy.deepcopy(online.counts)
+        moods = list(online.counts)
+
+        rng = random.Random(4)
+        # Known functions plus one the training data never produced (new rows)
+        functions = HARMONIC_FUNCTIONS + ["secondary"]
+        updates = [
+            (rng.choice(moods), (rng.choice(functions), rng.choice(functions)), rng.choice(functions))
+            for _ in range(200)
+        ]
+        for mood, context, next_func in updates:
+            online.update(mood, context, next_func)
+        expect(not close_counts(online.counts, before), "updates left the counts unchanged")
+
+        for mood, context, next_func in reversed(updates):
+            online.update(mood, context, next_func, weight=-1)
+        expect(close_counts(online.counts, before), "update + undo changed the counts")
+        for mood in moods:
+            for context in contexts(2):
+                online_probs, _ = online.lookup(mood, context)
+                expected = OnlineMarkovModel.from_snapshot(online.snapshot()).lookup(mood, context)[0]
+                expect(max_error(online_probs, expected) < TOLERANCE, f"{mood} {context}: stale cached row")
+
+
+if __name__ == "__main__":
+    from Tests.run_checks import main
+    main(["__main__"])
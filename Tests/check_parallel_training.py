@@ -0,0 +1,85 @@
+"""
+Parallel training: shard-by-shard, chunked JSONL and cached counts against
+one serial pass over the same samples.
+
+    python -m Tests.check_parallel_training
+"""
+
+import contextlib
+import io
+import os
+import random
+import tempfile
+from itertools import chain
+
+from models.markov_training_nth_order import (
+    count_file,
+    count_transitions,
+    iter_jsonl_range,
+    split_jsonl,
+)
+from Tests.run_checks import expect
+from utils.dataset_stream import iter_dataset
+from utils.generate_dataset_no_ext import generate_dataset_sharded, shard_paths, write_dataset
+
+ORDER = 3
+
+
+def rows(levels):
+    return {j: counts.to_rows() for j, counts in levels.items()}
+
+
+def serial_rows(paths):
+    samples = chain.from_iterable(iter_dataset(p) for p in paths)
+    return rows(count_transitions(samples, ORDER))
+
+
+def quiet(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+def check_jsonl_chunks_cover_every_line():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "dataset.jsonl")
+        quiet(write_dataset, path, 100, 8, random.Random(0))
+        expected = list(iter_dataset(path))
+        for num_chunks in (1, 2, 3, 7, 64, len(expected) * 3):
+            chunks = split_jsonl(path, num_chunks)
+            samples = [s for byte_range in chunks for s in iter_jsonl_range(path, *byte_range)]
+            expect(samples == expected, f"{num_chunks} chunks: lines lost or repeated")
+
+
+def check_chunked_jsonl_matches_serial():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "dataset.jsonl")
+        quiet(write_dataset, path, 400, 8, random.Random(1))
+        expected = serial_rows([path])
+        for workers in (1, 3):
+            got = rows(count_file(path, ORDER, workers=workers))
+            expect(got == expected, f"{workers} worker(s): chunked counts differ from serial")
+
+
+def check_shards_and_cache_match_serial():
+    with tempfile.TemporaryDirectory() as tmp:
+        shards = os.path.join(tmp, "shards")
+        cache = os.path.join(tmp, "cache")
+        quiet(generate_dataset_sharded, 400, 8, shards, 4, seed=2, workers=1)
+        expected = serial_rows(shard_paths(shards))
+
+        for workers in (1, 2):
+            expect(rows(count_file(shards, ORDER, workers=workers)) == expected, f"{workers} worker(s)")
+
+        expect(rows(count_file(shards, ORDER, cache_dir=cache)) == expected, "counts that fill the cache")
+        expect(len(os.listdir(cache)) == 4, f"{len(os.listdir(cache))} cache files for 4 shards")
+        expect(rows(count_file(shards, ORDER, cache_dir=cache)) == expected, "counts read from the cache")
+
+        # Regenerated shards (other seed) make the cached counts stale
+        quiet(generate_dataset_sharded, 400, 8, shards, 4, seed=3, workers=1)
+        expected = serial_rows(shard_paths(shards))
+        expect(rows(count_file(shards, ORDER, cache_dir=cache)) == expected, "stale cache entries were used")
+
+
+if __name__ == "__main__":
+    from Tests.run_checks import main
+    main(["__main__"])
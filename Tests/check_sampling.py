@@ -0,0 +1,107 @@
+"""
+Alias-table sampling against the distributions it was built from.
+
+    python -m Tests.check_sampling
+"""
+
+import itertools
+import os
+import random
+
+from models.markov_backoff import HARMONIC_FUNCTIONS, lookup_next_probs
+from models.markov_sampler import AliasTable
+from models.model_store import DEFAULT_MODEL_DIR, load_model
+from Tests.run_checks import expect
+
+DRAWS = 200000
+TOLERANCE = 0.005
+
+
+def alias_probs(table):
+    """Exact outcome probabilities encoded by an AliasTable."""
+    probs = dict.fromkeys(table.outcomes, 0.0)
+    for column in range(table.size):
+        probs[table.outcomes[column]] += table.prob[column] / table.size
+        probs[table.outcomes[table.alias[column]]] += (1.0 - table.prob[column]) / table.size
+    return probs
+
+
+def normalized(distribution):
+    total = sum(distribution.values())
+    return {k: v / total for k, v in distribution.items() if v > 0}
+
+
+def max_error(expected, actual):
+    return max(abs(expected.get(k, 0.0) - actual.get(k, 0.0)) for k in set(expected) | set(actual))
+
+
+def draw_frequencies(draw, n=DRAWS):
+    counts = {}
+    for _ in range(n):
+        outcome = draw()
+        counts[outcome] = counts.get(outcome, 0) + 1
+    return {k: c / n for k, c in counts.items()}
+
+
+def contexts(order, functions=HARMONIC_FUNCTIONS):
+    """Every known context up to `order`, plus short and unknown ones."""
+    yield ()
+    for length in range(1, order + 1):
+        yield from itertools.product(functions, repeat=length)
+    yield ("tonic", "unknown")
+    yield ("unknown",)
+
+
+def check_alias_table_draws():
+    rng = random.Random(0)
+    for distribution in (
+        {"a": 1.0},
+        {"a": 1, "b": 1, "c": 1},
+        {"a": 0.7, "b": 0.2, "c": 0.1},
+        {"a": 0.001, "b": 0.999},
+        {i: w for i, w in enumerate([5, 1, 3, 0.5, 8, 2, 1, 0.25])},
+    ):
+        table = AliasTable(distribution)
+        expected = normalized(distribution)
+        expect(max_error(expected, alias_probs(table)) < 1e-12, f"alias table of {distribution}")
+        error = max_error(expected, draw_frequencies(lambda: table.draw(rng)))
+        expect(error < TOLERANCE, f"draws of {distribution} off by {error:.4f}")
+
+
+def check_compiled_sampler_matches_backoff():
+    for filename in ("markov_probabilities.json", "markov_probabilities_2nd_order.json"):
+        model = load_model(os.path.join(DEFAULT_MODEL_DIR, filename))
+        for mood in list(model.moods) + ["unknown mood"]:
+            for context in contexts(model.order):
+                probs, level = lookup_next_probs(model.index, mood, context)
+                table, table_level = model.sampler.resolve(mood, context)
+                expect(table_level == level, f"{filename} {mood} {context}: level {table_level} != {level}")
+                error = max_error(normalized(probs), alias_probs(table))
+                expect(error < 1e-12, f"{filename} {mood} {context}: off by {error}")
+
+
+def check_sampler_draws():
+    model = load_model(os.path.join(DEFAULT_MODEL_DIR, "markov_probabilities_2nd_order.json"))
+    rng = random.Random(1)
+    for context in (("tonic", "predominant"), ("dominant",), ("unknown",)):
+        probs, _ = lookup_next_probs(model.index, "mixed", context)
+        draws = draw_frequencies(lambda: model.sampler.sample("mixed", context, rng=rng))
+        error = max_error(normalized(probs), draws)
+        expect(error < TOLERANCE, f"draws after {context} off by {error:.4f}")
+
+
+def check_chord_sampler_draws():
+    model = load_model(os.path.join(DEFAULT_MODEL_DIR, "markov_chord_probabilities.json"))
+    sampler = model.sampler
+    rng = random.Random(2)
+    # A trained chord row, and an unseen token that backs off to functions
+    for context in (("I", "IV"), ("V7",)):
+        probs, level = sampler.next_token_probs("mixed", context)
+        draws = draw_frequencies(lambda: sampler.sample("mixed", context, rng=rng), DRAWS // 2)
+        error = max_error(normalized(probs), draws)
+        expect(error < 2 * TOLERANCE, f"chord draws after {context} (level {level}) off by {error:.4f}")
+
+
+if __name__ == "__main__":
+    from Tests.run_checks import main
+    main(["__main__"])
@@ -0,0 +1,149 @@
+"""
+k-best search and batch scoring of the 2nd-order generator against
+brute-force enumeration of every progression, and batch generation
+lengths of every generator.
+
+    python -m Tests.check_search
+"""
+
+import itertools
+import math
+import os
+import random
+
+import models.generate_with_markov_2nd_order as gen
+from models.markov_backoff import lookup_next_probs
+from Tests.run_checks import expect, needs
+
+CHORDS = [ch for chords in gen.FUNCTION_TO_CHORDS.values() for ch in chords]
+TOLERANCE = 1e-9
+
+
+def log(p):
+    return math.log(p) if p > 0 else -math.inf
+
+
+def function_log_prob(functions, mood, strict=True):
+    """
+    log P of a function sequence under generate_progression: the first two
+    functions are given, the rest follow the model. strict: the 2nd
+    function must repeat the 1st, as generate_progression draws it.
+    """
+    index = gen.MODEL.refresh().index
+    if len(functions) < 2:
+        return 0.0
+    total = 0.0 if functions[1] == functions[0] or not strict else -math.inf
+    for t in range(2, len(functions)):
+        probs, _ = lookup_next_probs(index, mood, tuple(functions[t - 2:t]))
+        total += log(probs.get(functions[t], 0.0))
+    return total
+
+
+def chord_log_prob(progression, mood):
+    """function_log_prob plus the uniform chord pick within each function."""
+    functions = [gen.get_function(ch) for ch in progression]
+    total = function_log_prob(functions, mood)
+    for func in functions[1:]:
+        total -= math.log(len(gen.FUNCTION_TO_CHORDS[func]))
+    return total
+
+
+def brute_force(start_chord, mood, length, end, by):
+    """[(log_prob, sequence)] of every possible sequence, best first."""
+    if by == "chords":
+        symbols, first, score = CHORDS, start_chord, chord_log_prob
+        func_of = gen.get_function
+    else:
+        symbols, first, score = list(gen.FUNCTION_TO_CHORDS), gen.get_function(start_chord), function_log_prob
+        func_of = str
+
+    results = []
+    for rest in itertools.product(symbols, repeat=length - 1):
+        sequence = [first, *rest]
+        if not gen._matches_end(sequence[-1], func_of(sequence[-1]), end):
+            continue
+        lp = score(sequence, mood)
+        if lp > -math.inf:
+            results.append((lp, sequence))
+    results.sort(key=lambda x: x[0], reverse=True)
+    return results
+
+
+def check_top_k_matches_brute_force():
+    k = 5
+    for by, max_length in (("chords", 5), ("functions", 7)):
+        for start, mood, end in itertools.product(("C", "F", "G"), ("mixed", "tension / drive"), (None, "tonic")):
+            for length in range(2, max_length + 1):
+                where = f"by={by} start={start} mood={mood} end={end} length={length}"
+                found = gen.top_k_progressions(start, mood, length, k, end=end, by=by)
+                expected = brute_force(start, mood, length, end, by)[:k]
+
+                expect(len(found) == len(expected), f"{where}: {len(found)} results, expected {len(expected)}")
+                for (lp, sequence), (best_lp, _) in zip(found, expected):
+                    # Ties may come in another order: compare scores, and
+                    # re-score each returned sequence independently
+                    expect(abs(lp - best_lp) < TOLERANCE, f"{where}: {lp} != {best_lp}")
+                    rescored = (chord_log_prob if by == "chords" else function_log_prob)(sequence, mood)
+                    expect(abs(lp - rescored) < TOLERANCE, f"{where}: {sequence} scored {lp}, is {rescored}")
+
+
+def check_batch_score_matches_brute_force():
+    needs("numpy")
+
+    rng = random.Random(0)
+    for mood in ("mixed", "gentle motion", "unknown mood"):
+        progressions = [
+            gen.generate_progression(rng.choice(CHORDS), mood, rng.randint(1, 12), rng)
+            for _ in range(200)
+        ]
+        # Second chords generate_progression can't produce: ranked by
+        # default, -inf with strict=True
+        progressions += [["C", "G"], ["C", "F", "G", "C"], ["C", "G", "Am", "F"]]
+        progressions += [[rng.choice(CHORDS) for _ in range(6)] for _ in range(20)]
+        for strict in (False, True):
+            scores = gen.score(progressions, mood, strict=strict)
+            for progression, score in zip(progressions, scores):
+                functions = [gen.get_function(ch) for ch in progression]
+                expected = function_log_prob(functions, mood, strict)
+                same = score == expected or abs(score - expected) < TOLERANCE
+                expect(same, f"{mood} {progression} strict={strict}: scored {score}, brute force {expected}")
+
+    scores = gen.score([["C", "F", "G", "C"], ["C", "G", "Am", "F"]], "mixed")
+    expect(all(s > -math.inf for s in scores), f"I-IV-V-I / I-V-vi-IV should be ranked, got {scores}")
+
+
+def batch_lengths(module):
+    name = module.__name__
+    for length in (0, 1, 2, 8):
+        codes = module.generate_batch("C", length=length, n=3, rng=0)
+        expect(codes.shape == (3, length), f"{name}: shape {codes.shape} for length {length}")
+        progressions = module.get_batch_generator().decode(codes)
+        expect(all(len(p) == length for p in progressions), f"{name}: decoded lengths for {length}")
+        expect(length == 0 or all(p[0] == "C" for p in progressions), f"{name}: start chord")
+    try:
+        module.generate_batch("C", length=-1, n=3)
+    except ValueError:
+        pass
+    else:
+        expect(False, f"{name}: negative length should raise ValueError")
+
+
+def check_batch_generate_lengths():
+    needs("numpy")
+    import models.generate_with_markov as gen1
+    import models.generate_with_markov_nth_order as gen_n
+    from models.model_store import DEFAULT_MODEL_DIR, ModelHandle
+
+    saved = gen_n.MODEL
+    # No k-th order model in data/: the 2nd-order one serves as k = 2
+    gen_n.MODEL = ModelHandle(os.path.join(DEFAULT_MODEL_DIR, gen.MODEL_FILE))
+    try:
+        for module in (gen1, gen, gen_n):
+            batch_lengths(module)
+    finally:
+        gen_n.MODEL = saved
+
+
+if __name__ == "__main__":
+    from Tests.run_checks import main
+    main(["__main__"])
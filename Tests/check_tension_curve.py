@@ -0,0 +1,85 @@
+"""
+Tension-curve solver against brute-force enumeration: every draw follows
+the curve, impossible curves raise, and draws have the requested weighting.
+
+    python -m Tests.check_tension_curve
+"""
+
+import itertools
+import random
+
+from models.tension_curve import (
+    TRANSITIONS,
+    InfeasibleCurve,
+    TensionCurveSolver,
+    _follows,
+    base_functions,
+    parse_curve,
+)
+from Tests.check_sampling import draw_frequencies, max_error, normalized
+from Tests.run_checks import expect
+
+DRAWS = 50000
+TOLERANCE = 0.01
+
+
+def valid_progressions(start, length, curve):
+    """{progression: chain probability} of every progression following the curve."""
+    changes = parse_curve(curve)
+    paths = {(start,): 1.0}
+    for t in range(length - 1):
+        change = changes[t] if t < len(changes) else None
+        paths = {
+            path + (nxt,): p * q
+            for path, p in paths.items()
+            for nxt, q in TRANSITIONS[None][path[-1]]
+            if change is None or _follows(change, path[-1], nxt)
+        }
+    return paths
+
+
+def check_draws_follow_curve():
+    rng = random.Random(0)
+    for start in base_functions:
+        for length in range(1, 6):
+            for curve in map("".join, itertools.product("WSD", repeat=min(length - 1, 3))):
+                valid = valid_progressions(start, length, curve)
+                try:
+                    solver = TensionCurveSolver(start, length, curve)
+                except InfeasibleCurve:
+                    expect(not valid, f"{start} {length} {curve!r} raised, but {len(valid)} progressions fit")
+                    continue
+                expect(bool(valid), f"{start} {length} {curve!r}: no progression fits, but nothing raised")
+                for progression in solver.sample_batch(50, rng):
+                    expect(tuple(progression) in valid, f"{start} {length} {curve!r}: {progression} off the curve")
+
+
+def check_weightings():
+    rng = random.Random(1)
+    start, length, curve = "C", 6, "WSW"
+    valid = valid_progressions(start, length, curve)
+    expect(len(valid) > 2, "curve with too few progressions to tell weightings apart")
+
+    for weighting, expected in (
+        ("uniform", {path: 1.0 for path in valid}),
+        ("chain", valid),
+    ):
+        solver = TensionCurveSolver(start, length, curve, weighting)
+        draws = draw_frequencies(lambda: tuple(solver.sample(rng)), DRAWS)
+        error = max_error(normalized(expected), draws)
+        expect(error < TOLERANCE, f"{weighting} draws off by {error:.4f}")
+
+
+def check_curve_symbols():
+    expect(parse_curve("↑↓→") == parse_curve("wsd") == ["W", "S", "D"], "arrows and lower case")
+    try:
+        parse_curve("WX")
+    except ValueError as exc:
+        expect(not isinstance(exc, InfeasibleCurve), "unknown symbol reported as infeasible")
+    else:
+        expect(False, "unknown curve symbol should raise ValueError")
+
+
+if __name__ == "__main__":
+    from Tests.run_checks import main
+    main(["__main__"])
@@ -0,0 +1,74 @@
+"""
+Transposition tables: round trips between every major key, pitch classes
+moved by the key interval, and generation in a key against generation in C.
+
+    python -m Tests.check_transpose
+"""
+
+import random
+
+import models.generate_with_markov_2nd_order as gen
+from Tests.run_checks import expect
+from utils.midi_writer import CHORD_PITCHES
+from utils.transpose import NATURAL_PC, REFERENCE_KEY, key_tables, parse_chord, transpose
+
+KEYS = ["C", "G", "D", "A", "E", "B", "F#", "C#", "F", "Bb", "Eb", "Ab", "Db", "Gb", "Cb"]
+EXTENDED = ["G7", "Fmaj7", "Dm7", "Bbadd9", "Esus4", "A7b9"]
+
+
+def tonic_pc(key):
+    letter, accidental = parse_chord(key)[:2]
+    return (NATURAL_PC[letter] + accidental) % 12
+
+
+def pitch_classes(chord):
+    return sorted(p % 12 for p in CHORD_PITCHES[chord])
+
+
+def check_round_trips():
+    triads = list(key_tables(REFERENCE_KEY).from_reference)
+    for key in KEYS:
+        tables = key_tables(key)
+        moved = transpose(triads, REFERENCE_KEY, key)
+        expect(transpose(moved, key, REFERENCE_KEY) == triads, f"C → {key} → C")
+        extended = transpose(EXTENDED, REFERENCE_KEY, key)
+        expect(transpose(extended, key, REFERENCE_KEY) == EXTENDED, f"C → {key} → C: {extended}")
+
+        tokens = tables.to_tokens(moved)
+        expect(tables.realize(tokens) == moved, f"{key}: tokens → names → tokens")
+        expect(tokens == key_tables(REFERENCE_KEY).to_tokens(triads), f"{key}: tokens differ from C's")
+        expect(all(tables.to_reference[tables.from_reference[ch]] == ch for ch in triads), f"{key}: lookup tables")
+
+
+def check_pitch_classes_move_by_key_interval():
+    triads = list(key_tables(REFERENCE_KEY).from_reference)
+    for key in KEYS:
+        interval = tonic_pc(key)
+        for chord, moved in zip(triads, transpose(triads, REFERENCE_KEY, key)):
+            expected = sorted((p + interval) % 12 for p in pitch_classes(chord))
+            expect(moved in CHORD_PITCHES, f"{key}: no MIDI pitches for {moved}")
+            expect(pitch_classes(moved) == expected, f"{chord} in {key} spelled {moved}")
+
+
+def check_generation_in_key():
+    for key in KEYS:
+        start = key_tables(key).from_reference["F"]
+        progression = gen.generate_progression(start, "mixed", 12, random.Random(7), key=key)
+        reference = gen.generate_progression("F", "mixed", 12, random.Random(7))
+        expect(progression[0] == start, f"{key}: start chord changed")
+        expect(transpose(progression, key, REFERENCE_KEY) == reference, f"{key}: differs from C generation")
+
+
+def check_unknown_key():
+    for key in ("H", "Am", "C7", ""):
+        try:
+            key_tables(key)
+        except ValueError:
+            pass
+        else:
+            expect(False, f"key {key!r} should raise ValueError")
+
+
+if __name__ == "__main__":
+    from Tests.run_checks import main
+    main(["__main__"])
@@ -0,0 +1,79 @@
+"""
+Non-interactive checks of the optimized code paths, each compared with a
+slow reference (brute force, the JSON formats, music21, serial counting).
+Run from the repository root; the exit status is 1 if any check fails:
+
+    python -m Tests.run_checks
+    python -m Tests.check_search          one group only
+
+Every Tests/check_<topic>.py module is a group of checks for one feature
+and is picked up automatically. The other scripts in Tests/ are
+interactive demos.
+"""
+
+import glob
+import importlib
+import os
+import sys
+import time
+import traceback
+
+CHECK_MODULES = sorted(
+    "Tests." + os.path.splitext(os.path.basename(path))[0]
+    for path in glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "check_*.py"))
+)
+
+
+class Skip(Exception):
+    """Raised by a check whose optional dependency is missing."""
+
+
+def needs(module):
+    """Import an optional dependency, or skip the calling check."""
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise Skip(f"{module} not installed")
+
+
+def expect(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+def module_checks(module):
+    """check_* functions of a module, in definition order."""
+    return [f for name, f in vars(module).items() if name.startswith("check_") and callable(f)]
+
+
+def run(checks):
+    """Run each check, print one line per check; returns the number of failures."""
+    failures = 0
+    for check in checks:
+        start = time.perf_counter()
+        try:
+            check()
+        except Skip as exc:
+            status = f"skipped ({exc})"
+        except Exception:
+            traceback.print_exc()
+            status = "FAILED"
+            failures += 1
+        else:
+            status = "ok"
+        print(f"{check.__name__:<45} {status}  ({time.perf_counter() - start:.2f} s)")
+    return failures
+
+
+def main(module_names=CHECK_MODULES):
+    failures = 0
+    for name in module_names:
+        module = importlib.import_module(name)
+        print(f"== {module.__spec__.name if module.__spec__ else name}")
+        failures += run(module_checks(module))
+    print("all checks passed" if not failures else f"{failures} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
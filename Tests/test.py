@@ -1,42 +1,12 @@
 from music21 import stream, chord, note
-import random
 import os
 
-# -----------------------------
-# Step 1: Base chord functions and tension
-# -----------------------------
-base_functions = {
-    "C": ("Tonic", 1.0),
-    "Am": ("Tonic", 1.0),
-    "F": ("Predominant", 2.0),
-    "G": ("Dominant", 3.0),
-    "D": ("Secondary Dominant (V/V)", 3.5),
-    "E": ("Secondary Dominant (V/vi)", 3.5),
-    "A": ("Secondary Dominant (V/ii)", 3.5)
-}
+from models.tension_curve import InfeasibleCurve, base_functions, solve_tension_curve
 
 # -----------------------------
-# Step 2: Next chord rules
+# Steps 1-3: Chord functions, next chord rules and the 7th/9th/13th
+# tension adjustment are defined once in models/tension_curve.py
 # -----------------------------
-next_chord_map = {
-    "Tonic": ["F", "G", "C"],
-    "Predominant": ["G", "C"],
-    "Dominant": ["C", "D", "E", "A"],
-    "Secondary Dominant (V/V)": ["G"],
-    "Secondary Dominant (V/vi)": ["Am"],
-    "Secondary Dominant (V/ii)": ["D"]
-}
-
-# -----------------------------
-# Step 3: Chord tension adjustment for 7th/9th/13th
-# -----------------------------
-def tension_with_extensions(chord_name, base_tension):
-    if chord_name in ["G", "D", "E", "A"]:  # Dominants + secondary dominants
-        return base_tension + 1.0
-    elif chord_name in ["C", "Am", "F"]:    # Tonic/Predominant color notes
-        return base_tension + 0.5
-    else:
-        return base_tension
 
 # -----------------------------
 # Step 4: User input
@@ -80,38 +50,13 @@ use_extensions = True if use_extensions_input == "y" else False
 # -----------------------------
 # Step 5: Generate chord progression
 # -----------------------------
-progression = [start_chord]
-
-for i in range(1, length):
-    current_chord = progression[-1]
-    function, base_tension = base_functions.get(current_chord, ("Unknown", 0.0))
-    total_tension = tension_with_extensions(current_chord, base_tension)
-
-    allowed = next_chord_map.get(function, [])
-
-    # Filter allowed chords by tension curve
-    if i-1 < len(tension_curve):
-        change = tension_curve[i-1]
-        filtered = []
-        for chord_name in allowed:
-            _, next_base = base_functions.get(chord_name, ("Unknown", 0.0))
-            next_tension = tension_with_extensions(chord_name, next_base)
-            if change == "↑" and next_tension > total_tension:
-                filtered.append(chord_name)
-            elif change == "↓" and next_tension < total_tension:
-                filtered.append(chord_name)
-            elif change == "→" and abs(next_tension - total_tension) <= 0.2:
-                filtered.append(chord_name)
-        allowed = filtered
-
-    # Fallbacks to avoid empty list
-    if not allowed:
-        allowed = next_chord_map.get(function, [])
-        if not allowed:
-            allowed = list(base_functions.keys())
-
-    next_chord = random.choice(allowed)
-    progression.append(next_chord)
+# Only progressions that follow the whole curve are drawn (see
+# models/tension_curve.py); an impossible curve is reported up front.
+try:
+    progression = solve_tension_curve(start_chord, length, tension_curve, weighting="chain")
+except InfeasibleCurve as exc:
+    print(f"⚠️ {exc}. Generating without the tension curve.")
+    progression = solve_tension_curve(start_chord, length, [], weighting="chain")
 
 print("\nGenerated chord progression:")
 print(" → ".join(progression))
@@ -0,0 +1,99 @@
+"""
+Startup-time benchmark for the sampling path.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for
+each generator module, several times, and reports the cumulative import
+time of the module itself. It also checks that music21 is not pulled in:
+rendering is optional and music21 is only imported when a MIDI file is
+actually written through it.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeat 10 --budget-ms 300
+
+Run from the repo root; the model JSON files are looked up in data/ (or
+pass --model-dir). Exits with status 1 if a module imports music21 or
+goes over the budget.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules a CLI launch or a sampling worker imports
+SAMPLING_MODULES = [
+    "models.generate_with_markov",
+    "models.generate_with_markov_2nd_order",
+    "models.markov_sampler",
+]
+
+# Imported only when rendering; must not show up on the sampling path
+HEAVY_MODULES = ["music21"]
+
+
+def parse_importtime(stderr):
+    """{module: cumulative microseconds} from -X importtime output."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue  # header line
+        times[fields[2].strip()] = int(fields[1])
+    return times
+
+
+def measure(module, model_dir):
+    """Import `module` in a fresh interpreter; return its importtime table."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=model_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def benchmark(modules, model_dir, repeat):
+    """Return [(module, median_ms, heavy_modules_loaded)]."""
+    results = []
+    for module in modules:
+        samples = []
+        heavy = set()
+        for _ in range(repeat):
+            times = measure(module, model_dir)
+            samples.append(times.get(module, 0) / 1000)
+            heavy.update(m for m in times if m.split(".")[0] in HEAVY_MODULES)
+        heavy = sorted({m.split(".")[0] for m in heavy})
+        results.append((module, statistics.median(samples), heavy))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import time of the sampling path.")
+    parser.add_argument("modules", nargs="*", default=SAMPLING_MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--model-dir", default=os.path.join(REPO_ROOT, "data"),
+                        help="directory holding the model JSON files")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="fail if a module takes longer than this")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':45} {'median ms':>10}  heavy imports")
+    for module, median_ms, heavy in benchmark(args.modules, args.model_dir, args.repeat):
+        over = args.budget_ms is not None and median_ms > args.budget_ms
+        failed = failed or over or bool(heavy)
+        flag = "  OVER BUDGET" if over else ""
+        print(f"{module:45} {median_ms:10.1f}  {', '.join(heavy) or '-'}{flag}")
+
+    sys.exit(1 if failed else 0)
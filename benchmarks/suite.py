@@ -0,0 +1,302 @@
+"""
+Throughput benchmarks for the generators, dataset generation, training and
+MIDI export.
+
+Every case uses a fixed seed and the model fixtures in data/ (never a
+model lying around in the working directory), so two runs on the same
+machine measure the same work:
+
+    case              unit            what runs
+    generate_1st      progressions/s  generate_with_markov.generate_progression
+    generate_2nd      progressions/s  generate_with_markov_2nd_order.generate_progression
+    generate_dataset  samples/s       generate_dataset_no_ext.iter_samples
+    train_1st         transitions/s   train_file(order=1) on a seeded JSONL dataset
+    train_2nd         transitions/s   train_file(order=2) on the same dataset
+    midi_export       files/s         chord_render.render_midi_file into a BytesIO
+                                      (can_render dispatch, direct SMF writer, write)
+    midi_music21      files/s         the same progressions through music21 (if installed)
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --baseline results.json --threshold 0.15
+    python -m benchmarks.suite --only generate_2nd midi_export --quick
+
+Each case runs once to warm up, then --repeat times. The best rate (the
+run least disturbed by the rest of the machine, as timeit does) is
+compared against the baseline; --stat median uses the median instead. A
+case slower than baseline * (1 - threshold) is a regression and the run
+exits with status 1. Per-case thresholds override the global
+one: --threshold 0.15 --case-threshold midi_music21=0.3
+"""
+
+import argparse
+import datetime
+import io
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from models import generate_with_markov, generate_with_markov_2nd_order
+from models.markov_training_nth_order import train_file
+from models.model_store import DEFAULT_MODEL_DIR, ModelHandle
+from utils.chord_render import progression_to_stream, render_midi_file
+from utils.generate_dataset_no_ext import iter_samples, write_dataset
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEED = 1234
+DEFAULT_THRESHOLD = 0.15
+START_CHORDS = ["C", "F", "G", "Am"]
+MOODS = ["gentle motion", "tension / drive", "mixed"]
+
+# Work per repeat: (normal, --quick)
+SIZES = {
+    "generate_1st": (20000, 2000),
+    "generate_2nd": (20000, 2000),
+    "generate_dataset": (5000, 500),
+    "train_1st": (20000, 2000),
+    "train_2nd": (20000, 2000),
+    "midi_export": (20000, 2000),
+    "midi_music21": (200, 20),
+}
+
+
+# ------------------------------------------------------
+# Fixtures
+# ------------------------------------------------------
+
+def use_fixture_models():
+    """Point both generators at the model files in data/."""
+    for module in (generate_with_markov, generate_with_markov_2nd_order):
+        module.MODEL = ModelHandle(os.path.join(DEFAULT_MODEL_DIR, module.MODEL_FILE))
+
+
+def fixture_progressions(count, length=8):
+    """Seeded progressions to export (from the 2nd-order generator)."""
+    rng = random.Random(SEED)
+    return [
+        generate_with_markov_2nd_order.generate_progression(
+            rng.choice(START_CHORDS), rng.choice(MOODS), length, rng=rng
+        )
+        for _ in range(min(count, 500))
+    ]
+
+
+# ------------------------------------------------------
+# Cases: each takes a size and returns a callable doing one repeat, which
+# returns how many units it processed
+# ------------------------------------------------------
+
+def case_generate(module, size):
+    def run():
+        rng = random.Random(SEED)
+        for i in range(size):
+            module.generate_progression(
+                START_CHORDS[i % len(START_CHORDS)], MOODS[i % len(MOODS)], 8, rng=rng
+            )
+        return size
+    return run
+
+
+def case_generate_dataset(size):
+    def run():
+        count = 0
+        for _ in iter_samples(num_sessions=size, max_length=8, rng=random.Random(SEED)):
+            count += 1
+        return count
+    return run
+
+
+def case_train(order, size, workdir):
+    path = os.path.join(workdir, f"bench_dataset_{size}.jsonl")
+    if not os.path.exists(path):
+        write_dataset(path, num_sessions=size, max_length=8, rng=random.Random(SEED))
+    with open(path) as f:
+        transitions = sum(1 for _ in f)  # one next_chord per sample
+
+    def run():
+        train_file(path, order)
+        return transitions
+    return run
+
+
+def case_midi_export(size):
+    progressions = fixture_progressions(size)
+
+    def run():
+        for i in range(size):
+            render_midi_file(progressions[i % len(progressions)], io.BytesIO())
+        return size
+    return run
+
+
+def case_midi_music21(size):
+    from music21 import midi
+
+    progressions = fixture_progressions(size)
+
+    def run():
+        for i in range(size):
+            s = progression_to_stream(progressions[i % len(progressions)])
+            midi.translate.streamToMidiFile(s).writestr()
+        return size
+    return run
+
+
+CASES = {
+    "generate_1st": ("progressions/s", lambda size, _: case_generate(generate_with_markov, size)),
+    "generate_2nd": ("progressions/s", lambda size, _: case_generate(generate_with_markov_2nd_order, size)),
+    "generate_dataset": ("samples/s", lambda size, _: case_generate_dataset(size)),
+    "train_1st": ("transitions/s", lambda size, workdir: case_train(1, size, workdir)),
+    "train_2nd": ("transitions/s", lambda size, workdir: case_train(2, size, workdir)),
+    "midi_export": ("files/s", lambda size, _: case_midi_export(size)),
+    "midi_music21": ("files/s", lambda size, _: case_midi_music21(size)),
+}
+
+
+def music21_available():
+    try:
+        import music21  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# ------------------------------------------------------
+# Running + comparing
+# ------------------------------------------------------
+
+def measure(run, repeat):
+    """
+    Warm up once, then time `repeat` runs; returns the rates. The garbage
+    collector is off while timing, like timeit.
+    """
+    run()
+    rates = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            units = run()
+            rates.append(units / (time.perf_counter() - start))
+    finally:
+        gc.enable()
+    return rates
+
+
+def run_suite(names, repeat, quick, workdir):
+    results = {}
+    for name in names:
+        unit, make = CASES[name]
+        if name == "midi_music21" and not music21_available():
+            print(f"{name:18} skipped (music21 not installed)")
+            continue
+        size = SIZES[name][1 if quick else 0]
+        rates = measure(make(size, workdir), repeat)
+        results[name] = {
+            "unit": unit,
+            "size": size,
+            "repeat": repeat,
+            "median": statistics.median(rates),
+            "best": max(rates),
+            "rates": rates,
+        }
+        print(f"{name:18} {results[name]['median']:14,.0f} {unit:15} (best {max(rates):,.0f})")
+    return results
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def metadata(quick):
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": SEED,
+        "quick": quick,
+    }
+
+
+def compare(results, baseline, threshold, case_thresholds, stat="best"):
+    """Print the change vs. baseline; return the names that regressed."""
+    regressions = []
+    print(f"\n{'case':18} {'baseline':>14} {'current':>14} {'change':>8}  limit")
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:18} {'-':>14} {result[stat]:14,.0f} {'new':>8}")
+            continue
+        limit = case_thresholds.get(name, threshold)
+        change = result[stat] / base[stat] - 1
+        regressed = change < -limit
+        if regressed:
+            regressions.append(name)
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:18} {base[stat]:14,.0f} {result[stat]:14,.0f} "
+              f"{change:+8.1%}  -{limit:.0%}{flag}")
+    return regressions
+
+
+def parse_case_thresholds(items):
+    thresholds = {}
+    for item in items:
+        name, _, value = item.partition("=")
+        if name not in CASES or not value:
+            raise SystemExit(f"Bad --case-threshold {item!r} (expected CASE=FRACTION)")
+        thresholds[name] = float(value)
+    return thresholds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the throughput benchmarks.")
+    parser.add_argument("--only", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="smaller workloads (smoke test)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown as a fraction of the baseline rate")
+    parser.add_argument("--stat", choices=["best", "median"], default="best",
+                        help="which rate to compare against the baseline")
+    parser.add_argument("--case-threshold", nargs="*", default=[], metavar="CASE=FRACTION")
+    args = parser.parse_args()
+
+    case_thresholds = parse_case_thresholds(args.case_threshold)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    use_fixture_models()
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_suite(args.only, args.repeat, args.quick, workdir)
+
+    report = {"meta": metadata(args.quick), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    regressions = []
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold, case_thresholds, args.stat)
+        if baseline.get("meta", {}).get("quick") != args.quick:
+            print("warning: baseline and current run use different workload sizes")
+    sys.exit(1 if regressions else 0)
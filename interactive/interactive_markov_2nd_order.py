@@ -1,22 +1,54 @@
-import json
+import argparse
+import os
 import random
-from music21 import stream, harmony, midi
+import weakref
+
+from models.markov_backoff import resolve_mood
+from models.markov_online import OnlineMarkovModel
+from models.model_registry import REGISTRY
+from models.model_store import find_model_file, load_model
+from utils import metrics
+from utils.chord_render import render_midi_file
 
 # ------------------------------------------------------
 # Load trained 2nd-order model
 # ------------------------------------------------------
 
-with open("markov_probabilities_2nd_order.json", "r") as f:
-    RAW_MODEL = json.load(f)
+# 2nd-order table + 1st-order and uniform fallbacks, read on first use
+MODEL_FILE = "markov_probabilities_2nd_order.json"
+
+# ------------------------------------------------------
+# Online model: user choices are folded in live
+# ------------------------------------------------------
+# Raw counts written by markov_training_2nd_order.py. Without them, the
+# probabilities above are used as pseudo-counts. Learning is opt-in
+# (--learn); the snapshot then goes to COUNTS_FILE (see counts_path()).
+
+COUNTS_FILE = "markov_counts_2nd_order.json"
+
+# Persist the count snapshot after this many accepted choices
+AUTOSAVE_EVERY = 10
 
-# Decode "func1|func2" → tuple
-PROB_MODEL = {}
-for mood, transitions in RAW_MODEL.items():
-    PROB_MODEL[mood] = {}
-    for key_str, next_probs in transitions.items():
-        f1, f2 = key_str.split("|")
-        PROB_MODEL[mood][(f1, f2)] = next_probs
+_ONLINE_MODEL = None
 
+def get_online_model():
+    """Online model, built on first use from the counts (or the probabilities)."""
+    global _ONLINE_MODEL
+    if _ONLINE_MODEL is None:
+        counts_file = find_model_file(COUNTS_FILE)
+        if os.path.exists(counts_file):
+            _ONLINE_MODEL = OnlineMarkovModel.load(counts_file, autosave_every=AUTOSAVE_EVERY)
+        else:
+            _ONLINE_MODEL = OnlineMarkovModel.from_index(
+                load_model(MODEL_FILE).index, order=2,
+                snapshot_path=COUNTS_FILE, autosave_every=AUTOSAVE_EVERY,
+            )
+    return _ONLINE_MODEL
+
+
+def counts_path():
+    """Absolute path the online model's count snapshot is saved to."""
+    return os.path.abspath(get_online_model().snapshot_path)
 
 # ------------------------------------------------------
 # Harmony definitions
@@ -34,6 +66,7 @@ FUNCTIONS = {
     "G": "dominant", "Bdim": "dominant",
 }
 
+@metrics.count_unknown("interactive", FUNCTIONS)
 def get_function(ch):
     return FUNCTIONS.get(ch, "tonic")
 
@@ -42,120 +75,241 @@ def get_function(ch):
 # Sampling (2nd order + fallback logic)
 # ------------------------------------------------------
 
-def sample_next_functions_ranked(mood, func1, func2):
+@metrics.timed_sampler("interactive")
+def sample_next_functions_ranked(mood, func1, func2, return_level=False, style=None):
     """
     Return a *sorted list* of (next_function, probability), highest first.
     This is for displaying suggestions to the user.
+
+    With return_level=True, returns (ranked, level) where level is the
+    backoff order used (2, 1 or 0 for uniform).
+
+    style: rank with a (read-only) style model of the registry, see
+    models/model_registry.py, instead of the online model.
     """
+    if style is None:
+        probs, level = get_online_model().lookup(mood, (func1, func2))
+    else:
+        probs, level = REGISTRY.lookup(style, mood, (func1, func2))
+    ranked = sorted(probs.items(), key=lambda x: x[1], reverse=True)
 
-    if mood not in PROB_MODEL:
-        mood = "mixed"
+    if return_level:
+        return ranked, level
+    return ranked
 
-    mood_probs = PROB_MODEL[mood]
-    key = (func1, func2)
 
-    # MAIN CASE — exact 2nd-order probabilities
-    if key in mood_probs:
-        probs = mood_probs[key]
-        # sort by probability
-        ranked = sorted(probs.items(), key=lambda x: x[1], reverse=True)
-        return ranked
+@metrics.timed("interactive")
+def choose_chord_from_function(func, rng=None):
+    return (rng or random).choice(FUNCTION_TO_CHORDS[func])
 
-    # FALLBACK — merge all first-order transitions (only func2)
-    combined = {}
 
-    for (p1, p2), next_probs in mood_probs.items():
-        if p2 == func2:
-            for f_next, p in next_probs.items():
-                combined[f_next] = combined.get(f_next, 0) + p
+def update(mood, context, next_func, weight=1):
+    """Fold an accepted transition into the online model (O(1) per row)."""
+    get_online_model().update(mood, context, next_func, weight)
 
-    if combined:
-        ranked = sorted(combined.items(), key=lambda x: x[1], reverse=True)
+
+# ------------------------------------------------------
+# SESSION ENGINE (no I/O)
+# ------------------------------------------------------
+
+# Chord codes: sessions store bytes, not strings
+CHORDS = list(FUNCTIONS)
+CHORD_CODES = {ch: i for i, ch in enumerate(CHORDS)}
+CHORD_FUNCTIONS = [FUNCTIONS[ch] for ch in CHORDS]
+
+
+class SuggestionCache:
+    """
+    Ranked suggestions per (mood, func1, func2), shared by all sessions.
+    An accepted choice only changes the online model's rows of contexts
+    ending in its func2, so only those entries are dropped. Style rankings
+    are kept per registry model object, so they go away with it when the
+    registry unloads or reloads that style.
+    """
+
+    def __init__(self):
+        self._ranked = {}
+        self._by_model = weakref.WeakKeyDictionary()
+
+    def get(self, mood, func1, func2, style=None):
+        if style is None:
+            table = self._ranked
+        else:
+            model = REGISTRY.get(style, mood, 2)
+            table = self._by_model.get(model)
+            if table is None:
+                table = self._by_model[model] = {}
+
+        key = (mood, func1, func2)
+        ranked = table.get(key)
+        if ranked is None:
+            ranked = table[key] = tuple(
+                sample_next_functions_ranked(mood, func1, func2, style=style)
+            )
         return ranked
 
-    # LAST RESORT
-    return [("tonic", 0.33), ("predominant", 0.33), ("dominant", 0.34)]
+    def warm(self, moods, style=None):
+        """Precompute every 2nd-order context of the given moods."""
+        for mood in moods:
+            for func1 in FUNCTION_TO_CHORDS:
+                for func2 in FUNCTION_TO_CHORDS:
+                    self.get(mood, func1, func2, style)
 
+    def invalidate(self, mood, func2):
+        for func1 in FUNCTION_TO_CHORDS:
+            self._ranked.pop((mood, func1, func2), None)
 
-def choose_chord_from_function(func):
-    return random.choice(FUNCTION_TO_CHORDS[func])
+
+SUGGESTIONS = SuggestionCache()
+
+
+class InteractiveSession:
+    """
+    State of one interactive progression, driven by method calls instead of
+    input(): suggest() → ranked (function, probability) for the current
+    context, choose(index or chord), undo(). Suggestions come from the
+    shared SuggestionCache, so each call is O(1).
+
+    With learn=True (off by default; the CLI's --learn) accepted choices
+    update the online model, and undo() takes them back. With a style, suggestions come from
+    that style's registry model, which is read-only: nothing is learned.
+    """
+
+    __slots__ = ("mood", "chords", "learn", "rng", "style")
+
+    def __init__(self, start_chord, mood="mixed", learn=False, rng=None, style=None):
+        if start_chord not in CHORD_CODES:
+            raise ValueError(f"Unknown chord {start_chord!r}")
+
+        if style is None:
+            self.mood = resolve_mood(get_online_model().counts, mood)
+        else:
+            self.mood = resolve_mood(REGISTRY.get(style, mood, 2).moods, mood)
+        self.style = style
+        self.learn = learn and style is None
+        self.rng = rng
+
+        # Second chord comes from the start chord's function
+        second_chord = choose_chord_from_function(get_function(start_chord), rng)
+        self.chords = bytearray((CHORD_CODES[start_chord], CHORD_CODES[second_chord]))
+
+    @property
+    def progression(self):
+        return [CHORDS[code] for code in self.chords]
+
+    def __len__(self):
+        return len(self.chords)
+
+    def _context(self):
+        return CHORD_FUNCTIONS[self.chords[-2]], CHORD_FUNCTIONS[self.chords[-1]]
+
+    def suggest(self):
+        return SUGGESTIONS.get(self.mood, *self._context(), self.style)
+
+    def choose(self, choice):
+        """
+        Append a chord: `choice` is an index into suggest() (0-based), whose
+        function is voiced with a random chord, or a chord name.
+        """
+        func1, func2 = self._context()
+
+        if isinstance(choice, int):
+            ranked = SUGGESTIONS.get(self.mood, func1, func2, self.style)
+            if not 0 <= choice < len(ranked):
+                raise IndexError(f"No suggestion {choice}")
+            chord = choose_chord_from_function(ranked[choice][0], self.rng)
+        elif choice in CHORD_CODES:
+            chord = choice
+        else:
+            raise ValueError(f"Unknown chord {choice!r}")
+
+        self.chords.append(CHORD_CODES[chord])
+        if self.learn:
+            update(self.mood, (func1, func2), FUNCTIONS[chord])
+            SUGGESTIONS.invalidate(self.mood, func2)
+        return chord
+
+    def undo(self):
+        """Remove the last chosen chord (never the first two); None if nothing to undo."""
+        if len(self.chords) <= 2:
+            return None
+
+        chord = CHORDS[self.chords.pop()]
+        if self.learn:
+            func1, func2 = self._context()
+            update(self.mood, (func1, func2), FUNCTIONS[chord], weight=-1)
+            SUGGESTIONS.invalidate(self.mood, func2)
+        return chord
 
 
 # ------------------------------------------------------
 # INTERACTIVE SESSION
 # ------------------------------------------------------
 
-def interactive_session(start_chord, mood):
-    progression = [start_chord]
+def interactive_session(start_chord, mood, style=None, learn=False):
+    session = InteractiveSession(start_chord, mood, learn=learn, style=style)
+    if session.learn:
+        print(f"\nLearning from your choices; counts are saved to {counts_path()}")
 
     print("\nStarting chord:", start_chord)
-
-    # Step 2: choose second chord (function-consistent)
-    func1 = get_function(start_chord)
-    second_chord = random.choice(FUNCTION_TO_CHORDS[func1])
-    progression.append(second_chord)
-    print(f"Second chord chosen automatically: {second_chord}")
+    print(f"Second chord chosen automatically: {session.progression[1]}")
 
     while True:
         print("\nCurrent progression:")
-        print(" → ".join(progression))
+        print(" → ".join(session.progression))
 
-        func_prev2 = get_function(progression[-2])
-        func_prev1 = get_function(progression[-1])
-
-        ranked_suggestions = sample_next_functions_ranked(
-            mood, func_prev2, func_prev1
-        )
+        ranked_suggestions = session.suggest()
 
         print("\nAI Suggestions (ranked):")
         for i, (func, prob) in enumerate(ranked_suggestions, 1):
             print(f"{i}. {func}  (prob={prob:.3f})")
 
         user_input = input(
-            "\nPick option number OR enter your own chord OR 'done': "
+            "\nPick option number OR enter your own chord OR 'undo' OR 'done': "
         ).strip()
 
         if user_input.lower() == "done":
             break
 
+        if user_input.lower() == "undo":
+            if session.undo() is None:
+                print("Nothing to undo.")
+            continue
+
         # Case 1: user selects suggestion by number
         if user_input.isdigit():
             index = int(user_input) - 1
             if 0 <= index < len(ranked_suggestions):
-                chosen_func = ranked_suggestions[index][0]
-                next_chord = choose_chord_from_function(chosen_func)
-                progression.append(next_chord)
-                continue
+                session.choose(index)
             else:
                 print("Invalid number.")
-                continue
+            continue
 
         # Case 2: user enters chord manually
         if user_input in FUNCTIONS:
-            progression.append(user_input)
-            continue
+            session.choose(user_input)
         else:
             print("Invalid chord. Try again (C, Am, Em, F, Dm, G, Bdim).")
 
-    return progression
+    # Save choices not yet covered by an autosave
+    if session.learn:
+        get_online_model().close()
+        print(f"\nCounts saved to {counts_path()}")
+
+    return session.progression
 
 
 # ------------------------------------------------------
 # MIDI
 # ------------------------------------------------------
 
+@metrics.timed("interactive")
 def render_midi(progression, filename="markov_interactive.mid"):
-    s = stream.Stream()
-    for ch in progression:
-        cs = harmony.ChordSymbol(ch)
-        cs.quarterLength = 2
-        s.append(cs)
-
-    mf = midi.translate.streamToMidiFile(s)
-    mf.open(filename, "wb")
-    mf.write()
-    mf.close()
-    print(f"\nMIDI saved as {filename}")
+    """filename may also be a binary buffer (e.g. io.BytesIO)."""
+    # Known chords are written directly; others go through cached ChordSymbols
+    render_midi_file(progression, filename)
+    if isinstance(filename, str):
+        print(f"\nMIDI saved as {filename}")
 
 
 # ------------------------------------------------------
@@ -163,6 +317,11 @@ def render_midi(progression, filename="markov_interactive.mid"):
 # ------------------------------------------------------
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pick each next chord from ranked suggestions.")
+    parser.add_argument("--learn", action="store_true",
+                        help=f"update the online model with your choices (saved to {COUNTS_FILE})")
+    args = parser.parse_args()
+
     print("\n=== Interactive 2nd-Order Markov Generator ===")
 
     start = input("Enter starting chord (C, Am, F, etc.): ").strip()
@@ -185,7 +344,7 @@ if __name__ == "__main__":
 
     mood = mood_map.get(input("> "), "mixed")
 
-    progression = interactive_session(start, mood)
+    progression = interactive_session(start, mood, learn=args.learn)
 
     print("\nFinal progression:")
     print(" → ".join(progression))
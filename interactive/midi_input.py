@@ -0,0 +1,284 @@
+"""
+Real-time MIDI input mode.
+
+Listens to note events, recognizes the chord being held against the
+FUNCTIONS vocabulary (by pitch class, any voicing or inversion) and emits
+the ranked next-function suggestions as soon as the chord is complete.
+
+Every event's processing time is recorded, and so is the latency from the
+note-on that completed a chord to its suggestions being ready; anything
+over the budget (default 5 ms) is counted as an overrun. Suggestions are
+served from the shared SuggestionCache, which is warmed before the first
+event, and played chords don't update the online model by default, so
+no file I/O happens on the hot path.
+
+Without hardware, replay a MIDI file or a progression:
+
+    python -m interactive.midi_input --file markov_interactive.mid
+    python -m interactive.midi_input --progression C,F,G,C --realtime
+    python -m interactive.midi_input --port "IAC Driver Bus 1"     # needs mido
+
+Events are (seconds, note, velocity) tuples; velocity 0 means note off.
+"""
+
+import argparse
+import asyncio
+import gc
+import sys
+import time
+
+from interactive.interactive_markov_2nd_order import (
+    FUNCTIONS,
+    SUGGESTIONS,
+    get_function,
+    get_online_model,
+    update,
+)
+from utils.metrics import LatencyRecorder
+from utils.midi_reader import read_note_events
+from utils.midi_writer import CHORD_PITCHES, can_render, progression_to_midi
+
+DEFAULT_BUDGET_MS = 5.0
+
+# Pitch-class set → chord name, for every chord of the vocabulary
+PITCH_CLASS_CHORDS = {
+    frozenset(p % 12 for p in pitches): chord
+    for chord, pitches in CHORD_PITCHES.items()
+    if chord in FUNCTIONS
+}
+
+
+# ------------------------------------------------------
+# Chord recognition + suggestions
+# ------------------------------------------------------
+
+class MidiSuggestionEngine:
+    """
+    Feed it note events with handle(); it returns (chord, ranked) when a
+    newly held chord is recognized, else None. A chord is reported once
+    per attack: it must be released (or changed into another chord)
+    before the same chord counts again.
+    """
+
+    def __init__(self, mood="mixed", budget_ms=DEFAULT_BUDGET_MS, learn=False, on_suggest=None):
+        self.mood = mood
+        self.budget_ms = budget_ms
+        self.learn = learn
+        self.on_suggest = on_suggest
+
+        self.held = {}          # note -> number of overlapping note-ons
+        self.held_chord = None  # chord currently recognized
+        self.progression = []
+        self._first_order = {}  # single-chord contexts
+
+        self.event_time = LatencyRecorder()       # every event, ms
+        self.suggest_latency = LatencyRecorder()  # completing note-on → suggestions, ms
+        self.overruns = 0
+
+    def ranked(self):
+        """Ranked suggestions for the current progression (O(1) once warm)."""
+        if len(self.progression) >= 2:
+            return SUGGESTIONS.get(
+                self.mood, get_function(self.progression[-2]), get_function(self.progression[-1])
+            )
+        func = get_function(self.progression[-1])
+        ranked = self._first_order.get(func)
+        if ranked is None:
+            ranked = self._first_order[func] = tuple(get_online_model().ranked(self.mood, (func,)))
+        return ranked
+
+    def handle(self, event, received=None):
+        """
+        Process one (seconds, note, velocity) event. `received` is the
+        perf_counter() timestamp of its arrival (defaults to now).
+        """
+        if received is None:
+            received = time.perf_counter()
+        _, note, velocity = event
+        result = None
+
+        if velocity > 0:
+            self.held[note] = self.held.get(note, 0) + 1
+            chord = PITCH_CLASS_CHORDS.get(frozenset(n % 12 for n in self.held))
+            if chord is not None and chord != self.held_chord:
+                self.held_chord = chord
+                result = self._chord_played(chord, received)
+        else:
+            count = self.held.get(note, 0) - 1
+            if count > 0:
+                self.held[note] = count
+            else:
+                self.held.pop(note, None)
+            if not self.held:
+                self.held_chord = None
+
+        self.event_time.record((time.perf_counter() - received) * 1000)
+        return result
+
+    def _chord_played(self, chord, received):
+        if self.learn and len(self.progression) >= 2:
+            update(
+                self.mood,
+                (get_function(self.progression[-2]), get_function(self.progression[-1])),
+                get_function(chord),
+            )
+            SUGGESTIONS.invalidate(self.mood, get_function(self.progression[-1]))
+
+        self.progression.append(chord)
+        ranked = self.ranked()
+
+        latency_ms = (time.perf_counter() - received) * 1000
+        self.suggest_latency.record(latency_ms)
+        if latency_ms > self.budget_ms:
+            self.overruns += 1
+
+        if self.on_suggest is not None:
+            self.on_suggest(chord, ranked, latency_ms)
+        return chord, ranked
+
+    def summary(self):
+        return {
+            "events": self.event_time.count,
+            "chords": len(self.progression),
+            "event_p50_ms": self.event_time.percentile(50),
+            "event_p99_ms": self.event_time.percentile(99),
+            "suggest_p50_ms": self.suggest_latency.percentile(50),
+            "suggest_p99_ms": self.suggest_latency.percentile(99),
+            "suggest_max_ms": self.suggest_latency.percentile(100),
+            "budget_ms": self.budget_ms,
+            "overruns": self.overruns,
+        }
+
+
+def warm_up(moods):
+    """Load the model and rank every context before the first event."""
+    get_online_model()
+    SUGGESTIONS.warm(moods)
+
+
+# ------------------------------------------------------
+# Event sources
+# ------------------------------------------------------
+
+class VirtualPort:
+    """
+    Stand-in for a MIDI input port: producers send() events, the listener
+    iterates them with their arrival timestamps.
+    """
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    def send(self, event):
+        self.queue.put_nowait((event, time.perf_counter()))
+
+    def close(self):
+        self.queue.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.queue.get()
+        if item is None:
+            raise StopAsyncIteration
+        return item
+
+
+def open_mido_port(name, port):
+    """Forward a hardware/virtual port (needs mido + a backend) into `port`."""
+    import mido
+
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+
+    def callback(msg):
+        if msg.type in ("note_on", "note_off"):
+            velocity = msg.velocity if msg.type == "note_on" else 0
+            event = (time.perf_counter() - start, msg.note, velocity)
+            loop.call_soon_threadsafe(port.send, event)
+
+    return mido.open_input(name, callback=callback)
+
+
+async def replay(events, port, speed=1.0):
+    """Send events into `port` at their recorded times (speed > 1 is faster)."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for event in events:
+        delay = start + event[0] / speed - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        port.send(event)
+    port.close()
+
+
+async def listen(port, engine):
+    async for event, received in port:
+        engine.handle(event, received)
+
+
+def replay_fast(events, engine):
+    """Feed events back to back, without timing (tests, benchmarks)."""
+    for event in events:
+        engine.handle(event)
+
+
+def print_suggestion(chord, ranked, latency_ms):
+    options = ", ".join(f"{func} ({prob:.2f})" for func, prob in ranked)
+    print(f"{chord:>5} → {options}   [{latency_ms:.3f} ms]")
+
+
+async def run(events, engine, realtime, speed, port_name):
+    port = VirtualPort()
+    if port_name is not None:
+        with open_mido_port(port_name, port):
+            print(f"Listening on {port_name} (Ctrl+C to stop)")
+            await listen(port, engine)
+    elif realtime:
+        await asyncio.gather(replay(events, port, speed), listen(port, engine))
+    else:
+        replay_fast(events, engine)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chord suggestions from live or replayed MIDI input.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="MIDI file to replay")
+    source.add_argument("--progression", help="comma-separated chords to synthesize and replay")
+    source.add_argument("--port", help="MIDI input port name (needs mido)")
+    parser.add_argument("--mood", default="mixed")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--realtime", action="store_true", help="replay at the recorded tempo")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--learn", action="store_true", help="update the online model with played chords")
+    args = parser.parse_args()
+
+    if args.file:
+        events = read_note_events(args.file)
+    elif args.progression:
+        progression = [ch.strip() for ch in args.progression.split(",")]
+        if not can_render(progression):
+            unknown = sorted({ch for ch in progression if ch not in CHORD_PITCHES})
+            parser.error(f"--progression: can't synthesize {', '.join(unknown)} "
+                         "(major, minor and diminished triads only)")
+        events = read_note_events(progression_to_midi(progression))
+    else:
+        events = None
+
+    warm_up([args.mood])
+    gc.freeze()  # keep collections of the warm caches off the hot path
+
+    engine = MidiSuggestionEngine(args.mood, args.budget_ms, args.learn, on_suggest=print_suggestion)
+    try:
+        asyncio.run(run(events, engine, args.realtime, args.speed, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.learn:
+            get_online_model().close()
+
+    summary = engine.summary()
+    fields = (f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}" for k, v in summary.items())
+    print("\n" + "  ".join(fields))
+    sys.exit(1 if summary["overruns"] else 0)
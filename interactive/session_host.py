@@ -0,0 +1,157 @@
+"""
+Async driver for many interactive sessions in one event loop.
+
+Front ends (GUI, MIDI controller, network handlers) put commands on the
+host's queue and await the result; one consumer task applies them to the
+InteractiveSession objects. Session calls are O(1) and never block, so a
+single loop can host thousands of sessions, each about 150 bytes
+(__slots__ object + one byte per chord).
+
+    host = SessionHost(idle_timeout=3600)
+    asyncio.create_task(host.run())
+    await host.request("alice", "open", "C", "mixed")
+    ranked = await host.request("alice", "suggest")
+    chord = await host.request("alice", "choose", 0)
+
+Commands: open(start_chord, mood), suggest(), choose(index_or_chord),
+undo(), progression(), close(). close() returns the final progression.
+
+    python -m interactive.session_host --sessions 5000 --steps 20
+runs a simulated load and reports throughput and per-session memory.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from interactive.interactive_markov_2nd_order import (
+    SUGGESTIONS,
+    InteractiveSession,
+    get_online_model,
+)
+
+
+class SessionHost:
+    """Sessions by id, fed through an asyncio queue."""
+
+    def __init__(self, idle_timeout=None, learn=False):
+        self.sessions = {}
+        self.last_seen = {}
+        self.idle_timeout = idle_timeout
+        self.learn = learn
+        self.queue = asyncio.Queue()
+        self.commands = 0
+
+    # --------------------------------------------------
+    # Commands (synchronous, O(1))
+    # --------------------------------------------------
+
+    def dispatch(self, session_id, command, *args):
+        self.commands += 1
+
+        if command == "open":
+            session = self.sessions[session_id] = InteractiveSession(*args, learn=self.learn)
+            self.last_seen[session_id] = time.monotonic()
+            return session.progression
+
+        # Unknown ids (and failed opens) leave nothing behind in last_seen
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise KeyError(f"No open session {session_id!r}")
+        self.last_seen[session_id] = time.monotonic()
+
+        if command == "suggest":
+            return session.suggest()
+        if command == "choose":
+            return session.choose(*args)
+        if command == "undo":
+            return session.undo()
+        if command == "progression":
+            return session.progression
+        if command == "close":
+            del self.sessions[session_id]
+            del self.last_seen[session_id]
+            return session.progression
+
+        raise ValueError(f"Unknown command {command!r}")
+
+    def expire_idle(self):
+        """Drop sessions idle for longer than idle_timeout. Returns how many."""
+        if self.idle_timeout is None:
+            return 0
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = [sid for sid, seen in self.last_seen.items() if seen < cutoff]
+        for sid in expired:
+            self.sessions.pop(sid, None)
+            del self.last_seen[sid]
+        return len(expired)
+
+    # --------------------------------------------------
+    # Async interface
+    # --------------------------------------------------
+
+    async def request(self, session_id, command, *args):
+        """Queue a command and wait for its result."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((session_id, command, args, future))
+        return await future
+
+    async def run(self):
+        """Consume commands forever; errors go back to the caller's future."""
+        while True:
+            session_id, command, args, future = await self.queue.get()
+            try:
+                result = self.dispatch(session_id, command, *args)
+            except Exception as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+            if self.idle_timeout is not None and self.commands % 1024 == 0:
+                self.expire_idle()
+
+
+# ------------------------------------------------------
+# Simulated load
+# ------------------------------------------------------
+
+async def simulate(num_sessions, steps, seed=0):
+    rng = random.Random(seed)
+    host = SessionHost(learn=False)
+    consumer = asyncio.create_task(host.run())
+
+    async def user(i):
+        sid = f"user-{i}"
+        await host.request(sid, "open", rng.choice(["C", "F", "G", "Am"]), "mixed")
+        for _ in range(steps):
+            ranked = await host.request(sid, "suggest")
+            if rng.random() < 0.1:
+                await host.request(sid, "undo")
+            else:
+                await host.request(sid, "choose", rng.randrange(len(ranked)))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(num_sessions)))
+    elapsed = time.perf_counter() - start
+
+    sample = next(iter(host.sessions.values()))
+    session_bytes = sys.getsizeof(sample) + sys.getsizeof(sample.chords)
+    print(f"{num_sessions} sessions, {host.commands} commands in {elapsed:.2f}s "
+          f"({host.commands / elapsed:,.0f} commands/s)")
+    print(f"~{session_bytes} bytes per session ({len(sample)} chords)")
+
+    consumer.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate many concurrent interactive sessions.")
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    get_online_model()
+    SUGGESTIONS.warm(["mixed"])
+    asyncio.run(simulate(args.sessions, args.steps, args.seed))
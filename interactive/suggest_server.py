@@ -0,0 +1,375 @@
+"""
+HTTP suggestion service.
+
+Serves ranked next-function suggestions and generated progressions to
+plugins over the network, from one process that loads the model once.
+Plain asyncio, no web framework:
+
+    python -m interactive.suggest_server --port 8765
+
+    POST /suggest   {"mood": "mixed", "contexts": [["C", "G"], ["F"]]}
+        → {"suggestions": [{"ranked": [["tonic", 0.62], ...], "level": 2,
+                            "chords": {"tonic": ["C", "Am", "Em"], ...}}, ...]}
+
+    POST /generate  {"requests": [{"start": "C", "mood": "mixed", "length": 8, "seed": 1}]}
+        → {"progressions": [["C", "Am", ...]]}
+
+    GET  /stats     request counts, mean batch size, p50/p99 latency (ms),
+                    loaded style models
+
+Contexts are the last chords played, oldest first (2 are used; shorter
+contexts back off to the 1st-order / uniform levels). A request-level
+"mood" applies to every item unless the item is an object with its own
+{"mood": ..., "context": [...]}. "style" works the same way: items with a
+style ("pop", ...) use that style's model from the registry (loaded on
+first use, least recently used styles unloaded; see
+models/model_registry.py), the others the default online model.
+
+Items of concurrent requests are micro-batched: they are collected for at
+most --batch-delay seconds (or until --max-batch items) and answered in
+one pass, with identical (mood, context) suggestions computed once. Moods
+are resolved while parsing (unknown moods answer as "mixed"), and an item
+that fails only fails its own request (500), not the rest of the batch.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from interactive.interactive_markov_2nd_order import (
+    FUNCTION_TO_CHORDS,
+    FUNCTIONS,
+    get_function,
+    get_online_model,
+)
+from models.generate_with_markov_2nd_order import generate_progression, get_model
+from models.markov_backoff import resolve_mood
+from models.model_registry import REGISTRY
+from utils.metrics import LatencyRecorder
+
+DEFAULT_MOOD = "mixed"
+
+# Per-request limits
+MAX_ITEMS = 1024
+MAX_LENGTH = 256
+MAX_BODY = 1 << 20
+
+
+# ------------------------------------------------------
+# Latency and batching
+# ------------------------------------------------------
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent requests and hands them to
+    `handler(items) -> results` in one call, at most `max_delay` seconds
+    after the first pending item or as soon as `max_batch` are waiting.
+    A result that is an exception is raised in its own item's request only.
+    """
+
+    def __init__(self, handler, max_batch=256, max_delay=0.001):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = []
+        self._timer = None
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, items):
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in items]
+        self._pending.extend(zip(items, futures))
+
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.flush)
+
+        return await asyncio.gather(*futures)
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        self.batches += 1
+        self.items += len(pending)
+        try:
+            results = self.handler([item for item, _ in pending])
+        except Exception as exc:
+            for _, future in pending:
+                future.set_exception(exc)
+            return
+
+        for (_, future), result in zip(pending, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def summary(self):
+        return {
+            "batches": self.batches,
+            "mean_batch_size": self.items / self.batches if self.batches else None,
+        }
+
+
+# ------------------------------------------------------
+# Endpoint logic
+# ------------------------------------------------------
+
+def _each(compute, items):
+    """[compute(item)] with a failing item's exception in place of its result."""
+    results = []
+    for item in items:
+        try:
+            results.append(compute(item))
+        except Exception as exc:
+            results.append(exc)
+    return results
+
+
+def suggest_batch(items):
+    """items: (style, mood, context_chords tuple) → suggestion dicts."""
+    model = get_online_model()
+    memo = {}
+
+    def suggest(item):
+        result = memo.get(item)
+        if result is None:
+            style, mood, context = item
+            functions = tuple(get_function(ch) for ch in context[-2:])
+            if style is None:
+                probs, level = model.lookup(mood, functions)
+            else:
+                probs, level = REGISTRY.lookup(style, mood, functions)
+            ranked = sorted(probs.items(), key=lambda x: x[1], reverse=True)
+            result = memo[item] = {
+                "ranked": [[func, prob] for func, prob in ranked],
+                "level": level,
+                "chords": {func: FUNCTION_TO_CHORDS[func] for func, _ in ranked},
+            }
+        return result
+
+    return _each(suggest, items)
+
+
+def generate_batch(items):
+    """items: (start, mood, length, seed, style) → progressions."""
+    def generate(item):
+        start, mood, length, seed, style = item
+        rng = random.Random(seed) if seed is not None else None
+        return generate_progression(start, mood, length, rng, style=style)
+
+    return _each(generate, items)
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _items(body, key):
+    items = body.get(key)
+    if not isinstance(items, list):
+        raise BadRequest(f'"{key}" must be a list')
+    if len(items) > MAX_ITEMS:
+        raise BadRequest(f"at most {MAX_ITEMS} items per request")
+    return items
+
+
+def _mood(mood, style, default_moods):
+    """
+    Mood resolved against the model that will answer (the style's, or
+    `default_moods`), so only known moods reach the batch handlers and
+    their memo tables.
+    """
+    if not isinstance(mood, str):
+        raise BadRequest("mood must be a string")
+    if style is None:
+        return resolve_mood(default_moods, mood)
+    try:
+        moods = REGISTRY.get(style, mood, 2).moods
+    except (FileNotFoundError, ValueError, TypeError):
+        raise BadRequest(f"unknown style {style!r}")
+    return resolve_mood(moods, mood)
+
+
+def parse_suggest(body):
+    default_mood = body.get("mood", DEFAULT_MOOD)
+    default_style = body.get("style")
+    online_moods = get_online_model().counts
+    parsed = []
+    for item in _items(body, "contexts"):
+        mood, style = default_mood, default_style
+        if isinstance(item, dict):
+            mood = item.get("mood", default_mood)
+            style = item.get("style", default_style)
+            item = item.get("context")
+        if not isinstance(item, list) or not all(isinstance(ch, str) for ch in item):
+            raise BadRequest("each context must be a list of chord names")
+        parsed.append((style, _mood(mood, style, online_moods), tuple(item[-2:])))
+    return parsed
+
+
+def parse_generate(body):
+    parsed = []
+    for item in _items(body, "requests"):
+        if not isinstance(item, dict):
+            raise BadRequest("each request must be an object")
+        start = item.get("start", "C")
+        length = item.get("length", 8)
+        seed = item.get("seed")
+        if not isinstance(start, str) or start not in FUNCTIONS:
+            raise BadRequest(f"unknown start chord {start!r}")
+        if not isinstance(length, int) or isinstance(length, bool) or not 1 <= length <= MAX_LENGTH:
+            raise BadRequest(f"length must be an integer in 1..{MAX_LENGTH}")
+        if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)):
+            raise BadRequest("seed must be an integer or null")
+        style = item.get("style", body.get("style"))
+        mood = _mood(item.get("mood", body.get("mood", DEFAULT_MOOD)), style, get_model().index)
+        parsed.append((start, mood, length, seed, style))
+    return parsed
+
+
+# ------------------------------------------------------
+# HTTP server
+# ------------------------------------------------------
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class SuggestServer:
+    """Routes requests to the endpoint batchers and records their latency."""
+
+    def __init__(self, max_batch=256, batch_delay=0.001):
+        self.batchers = {
+            "/suggest": MicroBatcher(suggest_batch, max_batch, batch_delay),
+            "/generate": MicroBatcher(generate_batch, max_batch, batch_delay),
+        }
+        self.parsers = {"/suggest": parse_suggest, "/generate": parse_generate}
+        self.responses = {"/suggest": "suggestions", "/generate": "progressions"}
+        self.latency = {path: LatencyRecorder() for path in self.batchers}
+
+    def stats(self):
+        stats = {
+            path: {**self.latency[path].summary(), **self.batchers[path].summary()}
+            for path in self.batchers
+        }
+        stats["registry"] = REGISTRY.stats()
+        return stats
+
+    async def handle(self, method, path, body):
+        """Return (status, payload) for one request."""
+        if path == "/stats" and method == "GET":
+            return 200, self.stats()
+        if path not in self.batchers:
+            return 404, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        start = time.perf_counter()
+        try:
+            payload = json.loads(body or b"{}")
+            if not isinstance(payload, dict):
+                raise BadRequest("body must be a JSON object")
+            items = self.parsers[path](payload)
+        except (ValueError, TypeError, UnicodeDecodeError) as exc:
+            return 400, {"error": str(exc)}
+
+        try:
+            results = await self.batchers[path].submit(items)
+        except Exception as exc:
+            return 500, {"error": f"{type(exc).__name__}: {exc}"}
+        self.latency[path].record((time.perf_counter() - start) * 1000)
+        return 200, {self.responses[path]: results}
+
+    async def serve_connection(self, reader, writer):
+        """HTTP/1.1 with keep-alive; one request at a time per connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0) or 0)
+                if length > MAX_BODY:
+                    status, payload = 413, {"error": "request body too large"}
+                    body = None
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.handle(method, target.split("?")[0], body)
+
+                data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive or body is None:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def main(host, port, max_batch, batch_delay):
+    # Load everything before accepting connections
+    get_model().sampler
+    get_online_model()
+
+    app = SuggestServer(max_batch, batch_delay)
+    server = await asyncio.start_server(app.serve_connection, host, port)
+    print(f"Serving suggestions on http://{host}:{port} (/suggest, /generate, /stats)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        print(json.dumps(app.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve chord suggestions over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--batch-delay", type=float, default=0.001,
+                        help="seconds to wait for more requests before answering a batch")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args.host, args.port, args.max_batch, args.batch_delay))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,8 @@
+"""
+Markov harmony models.
+
+    from models import load_model
+    model = load_model("markov_probabilities_2nd_order.json")
+"""
+
+from models.model_store import MarkovModel, ModelHandle, find_model_file, load_model, preload
@@ -0,0 +1,287 @@
+"""
+Chord-level Markov models.
+
+The function models predict the next harmonic function and then pick a
+chord uniformly within it. A chord model predicts the next chord itself
+from the previous chords (order 1 or 2), and backs off to the function
+level when a chord context was never seen. Chords are key-independent
+scale-degree tokens ("I", "vi", "V7", "II" = V/V, see utils/transpose.py),
+so one model serves every key:
+
+    1. longest chord context with a trained row (order .. 1)
+    2. next function from the function levels (with their own backoff),
+       then a token from P(token | function, mood) learned from the data
+
+Transitions are stored sparsely, so memory and lookup cost follow the
+number of observed transitions rather than the vocabulary size. Each
+(mood, context length) is a CSRLevel:
+
+    keys        sorted context codes (base V, oldest token most significant)
+    indptr      row r owns entries indptr[r]:indptr[r + 1]
+    next_codes  next-token codes of each entry
+    probs       their probabilities
+    alias_prob  Walker alias table of each row, laid out like next_codes
+    alias       (alias index relative to the row start)
+
+A lookup is one binary search over keys; a draw is one random number and
+two array reads. The model file is written by markov_training_chords.py
+and read through load_model().
+
+Extended tokens (V7, Imaj7, vi9, ...) and the secondary dominants of
+Tests/test.py (II, III, VI) map to their triad's function for the backoff.
+"""
+
+import bisect
+import random
+from array import array
+
+from models.markov_backoff import (
+    HARMONIC_FUNCTIONS,
+    build_nth_order_index,
+    lookup_next_probs,
+    normalize,
+    resolve_mood,
+)
+from models.markov_sampler import AliasTable, CompiledSampler
+from utils.transpose import token_function
+
+# Backoff emission when a function was never observed: its diatonic triads
+FUNCTION_TO_TOKENS = {
+    "tonic": ["I", "vi", "iii"],
+    "predominant": ["IV", "ii"],
+    "dominant": ["V", "vii°"]
+}
+
+# sample(..., return_level=True) level of the function backoff
+LEVEL_FUNCTION = 0
+
+_LARGEST_CODE = (1 << 63) - 1
+
+
+# ------------------------------------------------------
+# Sparse transition rows
+# ------------------------------------------------------
+
+class CSRLevel:
+    """All rows of one context length for one mood (see module docstring)."""
+
+    __slots__ = ("context_length", "keys", "indptr", "next_codes", "probs", "alias_prob", "alias")
+
+    def __init__(self, context_length, rows):
+        """rows: {context_code: {next_code: probability}}."""
+        self.context_length = context_length
+        self.keys = array("q")
+        self.indptr = array("q", [0])
+        self.next_codes = array("i")
+        self.probs = array("d")
+        self.alias_prob = array("d")
+        self.alias = array("i")
+
+        for code in sorted(rows):
+            row = rows[code]
+            table = AliasTable(row)
+            self.keys.append(code)
+            self.next_codes.extend(table.outcomes)
+            self.probs.extend(row[o] for o in table.outcomes)
+            self.alias_prob.extend(table.prob)
+            self.alias.extend(table.alias)
+            self.indptr.append(len(self.next_codes))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, context_code):
+        """Row index of a context code, or -1."""
+        i = bisect.bisect_left(self.keys, context_code)
+        if i < len(self.keys) and self.keys[i] == context_code:
+            return i
+        return -1
+
+    def draw(self, row, rng):
+        start = self.indptr[row]
+        u = rng.random() * (self.indptr[row + 1] - start)
+        column = int(u)
+        if u - column < self.alias_prob[start + column]:
+            return self.next_codes[start + column]
+        return self.next_codes[start + self.alias[start + column]]
+
+    def row(self, row):
+        """{next_code: probability} of one row."""
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return dict(zip(self.next_codes[start:end], self.probs[start:end]))
+
+    @property
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (
+            self.keys, self.indptr, self.next_codes, self.probs, self.alias_prob, self.alias,
+        ))
+
+
+# ------------------------------------------------------
+# Sampler
+# ------------------------------------------------------
+
+class ChordSampler:
+    """
+    CSR token levels per mood, plus the function-level backoff: a
+    CompiledSampler over the function levels and one alias table of
+    P(token | function) per mood.
+    """
+
+    def __init__(self, model, rng=None):
+        self.order = model.order
+        self.tokens = list(model.tokens)
+        self.token_codes = {t: i for i, t in enumerate(self.tokens)}
+        self.rng = rng if rng is not None else random
+
+        V = len(self.tokens)
+        if V ** self.order > _LARGEST_CODE:
+            raise ValueError(f"{V} tokens at order {self.order} overflow 64-bit context codes")
+
+        codes = self.token_codes
+        self.levels = {}
+        for level, moods in model.levels.items():
+            for mood, transitions in moods.items():
+                rows = {}
+                for context, next_probs in transitions.items():
+                    code = 0
+                    for t in context:
+                        code = code * V + codes[t]
+                    rows[code] = {codes[t]: p for t, p in next_probs.items() if p > 0}
+                self.levels.setdefault(mood, {})[level] = CSRLevel(level, rows)
+
+        self.function_index = model.function_index
+        self.function_sampler = CompiledSampler(model.function_index, rng=rng)
+
+        # P(token | function) as (probs, AliasTable): per mood, then pooled
+        # over moods, then uniform over the diatonic tokens of the function
+        pooled = {}
+        self.emissions = {}
+        for mood, by_function in model.emissions.items():
+            self.emissions[mood] = {}
+            for func, probs in by_function.items():
+                self.emissions[mood][func] = (probs, AliasTable(probs))
+                merged = pooled.setdefault(func, {})
+                for t, p in probs.items():
+                    merged[t] = merged.get(t, 0.0) + p
+        self.default_emissions = {}
+        for func, tokens in FUNCTION_TO_TOKENS.items():
+            probs = normalize(pooled.get(func) or dict.fromkeys(tokens, 1.0))
+            self.default_emissions[func] = (probs, AliasTable(probs))
+
+    def seed(self, seed):
+        """Replace the RNG with a fresh random.Random(seed)."""
+        self.rng = random.Random(seed)
+
+    def _find(self, mood, context):
+        """(CSRLevel, row) for the longest known token suffix of context, or (None, -1)."""
+        levels = self.levels.get(mood, {})
+        codes = self.token_codes
+        V = len(self.tokens)
+
+        for j in range(min(self.order, len(context)), 0, -1):
+            level = levels.get(j)
+            if level is None:
+                continue
+            code = 0
+            for t in context[len(context) - j:]:
+                c = codes.get(t)
+                if c is None:
+                    break
+                code = code * V + c
+            else:
+                row = level.find(code)
+                if row >= 0:
+                    return level, row
+        return None, -1
+
+    def _emission(self, mood, func):
+        """(probs, AliasTable) of P(token | func) in `mood`."""
+        emission = self.emissions.get(mood, {}).get(func)
+        return emission if emission is not None else self.default_emissions[func]
+
+    def _functions(self, context):
+        return tuple(token_function(t) for t in context[max(len(context) - self.order, 0):])
+
+    def sample(self, mood, context, return_level=False, rng=None):
+        """
+        Draw the next token after `context` (previous tokens, oldest
+        first). With return_level=True, returns (token, level): the token
+        context length that answered, or LEVEL_FUNCTION (0) for the
+        function backoff.
+        """
+        rng = rng if rng is not None else self.rng
+        mood = resolve_mood(self.levels, mood)
+
+        level, row = self._find(mood, context)
+        if level is not None:
+            token = self.tokens[level.draw(row, rng)]
+            return (token, level.context_length) if return_level else token
+
+        func = self.function_sampler.sample(mood, self._functions(context), rng=rng)
+        token = self._emission(mood, func)[1].draw(rng)
+        return (token, LEVEL_FUNCTION) if return_level else token
+
+    def next_token_probs(self, mood, context):
+        """({token: probability}, level) for the next token after `context`."""
+        mood = resolve_mood(self.levels, mood)
+        level, row = self._find(mood, context)
+        if level is not None:
+            return {self.tokens[c]: p for c, p in level.row(row).items()}, level.context_length
+
+        func_probs, _ = lookup_next_probs(self.function_index, mood, self._functions(context))
+        probs = {}
+        for func, p_func in func_probs.items():
+            for t, p_token in self._emission(mood, func)[0].items():
+                probs[t] = probs.get(t, 0.0) + p_func * p_token
+        return probs, LEVEL_FUNCTION
+
+    def ranked(self, mood, context):
+        """[(token, probability)], most likely first."""
+        probs, _ = self.next_token_probs(mood, context)
+        return sorted(probs.items(), key=lambda x: x[1], reverse=True)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the CSR arrays (the chord-level part of the model)."""
+        return sum(level.nbytes for levels in self.levels.values() for level in levels.values())
+
+
+# ------------------------------------------------------
+# Model file
+# ------------------------------------------------------
+
+class ChordMarkovModel:
+    """
+    A decoded chord model file (see markov_training_chords.py). Token
+    levels are {level: {mood: {context_tuple: {next_token: prob}}}}; the
+    ChordSampler is built on first use.
+    """
+
+    def __init__(self, raw, path=None):
+        self.order = raw["order"]
+        self.tokens = raw["tokens"]
+        self.functions = raw.get("functions", HARMONIC_FUNCTIONS)
+        self.levels = {
+            int(level): {
+                mood: {tuple(key.split("|")): probs for key, probs in transitions.items()}
+                for mood, transitions in moods.items()
+            }
+            for level, moods in raw["levels"].items()
+        }
+        self.function_index = build_nth_order_index(
+            {"order": self.order, "functions": self.functions, "levels": raw["function_levels"]}
+        )
+        self.emissions = raw["emissions"]
+        self.path = path
+        self._sampler = None
+
+    @property
+    def sampler(self):
+        if self._sampler is None:
+            self._sampler = ChordSampler(self)
+        return self._sampler
+
+    @property
+    def moods(self):
+        return list(self.function_index)
@@ -1,13 +1,21 @@
-import json
 import random
-from music21 import stream, harmony, midi
+
+from models.model_store import ModelHandle
+from utils import metrics
+from utils.chord_render import render_midi_file
+from utils.transpose import REFERENCE_KEY, generate_in_key
 
 # ------------------------------------------------------
 # LOAD TRAINED MARKOV MODEL
 # ------------------------------------------------------
 
-with open("markov_probabilities.json", "r") as f:
-    PROB_MODEL = json.load(f)
+MODEL_FILE = "markov_probabilities.json"
+
+MODEL = ModelHandle(MODEL_FILE)
+
+def get_model():
+    """Model is read on first use (see models/model_store.py)."""
+    return MODEL.get()
 
 # ------------------------------------------------------
 # BASIC HARMONY SETUP
@@ -25,6 +33,7 @@ FUNCTIONS = {
     "G": "dominant", "Bdim": "dominant",
 }
 
+@metrics.count_unknown("1st_order", FUNCTIONS)
 def get_function(ch):
     return FUNCTIONS.get(ch, "tonic")
 
@@ -32,60 +41,80 @@ def get_function(ch):
 # PROBABILITY SAMPLING
 # ------------------------------------------------------
 
-def sample_next_function(mood, current_function):
-    """Choose next function using trained Markov probabilities."""
-    if mood not in PROB_MODEL:
-        mood = "mixed"
-
-    mood_probs = PROB_MODEL[mood]
-
-    if current_function not in mood_probs:
-        return random.choice(["tonic", "predominant", "dominant"])
-
-    prob_dict = mood_probs[current_function]
-    funcs = list(prob_dict.keys())
-    weights = list(prob_dict.values())
-
-    return random.choices(funcs, weights=weights)[0]
-
-def choose_chord_from_function(func):
+@metrics.timed_sampler("1st_order")
+def sample_next_function(mood, current_function, return_level=False, rng=None):
+    """
+    Choose next function using trained Markov probabilities.
+    With return_level=True, returns (next_function, level): 1, or 0 when
+    the function was never seen and the uniform fallback answered.
+    """
+    return get_model().sampler.sample(mood, (current_function,), return_level, rng)
+
+@metrics.timed("1st_order")
+def choose_chord_from_function(func, rng=None):
     """Pick a chord belonging to a harmonic function."""
-    return random.choice(FUNCTION_TO_CHORDS[func])
+    return (rng or random).choice(FUNCTION_TO_CHORDS[func])
 
 # ------------------------------------------------------
 # GENERATE PROGRESSION
 # ------------------------------------------------------
 
-def generate_progression(start_chord, mood="mixed", length=8):
+def generate_progression(start_chord, mood="mixed", length=8, rng=None, key=None):
+    """
+    Pass a seeded random.Random as rng for reproducible progressions.
+    key: another major key ("G", "Bb", ...); the progression is generated
+    in C and moved through precomputed tables (utils/transpose.py).
+    """
+    if key not in (None, REFERENCE_KEY):
+        return generate_in_key(generate_progression, start_chord, key, mood, length, rng)
+
+    MODEL.refresh()
     progression = [start_chord]
     current = start_chord
 
     for _ in range(length - 1):
         curr_function = get_function(current)
-        next_function = sample_next_function(mood, curr_function)
-        next_chord = choose_chord_from_function(next_function)
+        next_function = sample_next_function(mood, curr_function, rng=rng)
+        next_chord = choose_chord_from_function(next_function, rng)
 
         progression.append(next_chord)
         current = next_chord
 
     return progression
 
+_BATCH_GENERATOR = None
+
+def get_batch_generator():
+    """Dense tables for batch generation, rebuilt when the model changes. Needs numpy."""
+    global _BATCH_GENERATOR
+    model = MODEL.refresh()
+    if _BATCH_GENERATOR is None or _BATCH_GENERATOR.index is not model.index:
+        from models.markov_batch import BatchGenerator
+        _BATCH_GENERATOR = BatchGenerator(
+            model.index, order=1, warmup=0,
+            function_to_chords=FUNCTION_TO_CHORDS,
+        )
+    return _BATCH_GENERATOR
+
+def generate_batch(start_chords, mood="mixed", length=8, n=None, rng=None):
+    """
+    Vectorized version of generate_progression for large batches.
+    Returns an (n, length) array of chord codes; decode it with
+    get_batch_generator().decode(). Needs numpy.
+    """
+    return get_batch_generator().generate_batch(start_chords, mood, length, n, rng)
+
 # ------------------------------------------------------
 # MIDI RENDERING
 # ------------------------------------------------------
 
+@metrics.timed("1st_order")
 def render_midi(progression, filename="markov_progression.mid"):
-    s = stream.Stream()
-    for ch in progression:
-        cs = harmony.ChordSymbol(ch)
-        cs.quarterLength = 2
-        s.append(cs)
-
-    mf = midi.translate.streamToMidiFile(s)
-    mf.open(filename, "wb")
-    mf.write()
-    mf.close()
-    print(f"MIDI saved as {filename}")
+    """filename may also be a binary buffer (e.g. io.BytesIO)."""
+    # Known chords are written directly; others go through cached ChordSymbols
+    render_midi_file(progression, filename)
+    if isinstance(filename, str):
+        print(f"MIDI saved as {filename}")
 
 # ------------------------------------------------------
 # USER MODE
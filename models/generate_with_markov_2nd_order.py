@@ -1,23 +1,33 @@
-import json
+import heapq
+import math
 import random
-from music21 import stream, harmony, midi
+
+from models.markov_backoff import lookup_next_probs
+from models.model_registry import REGISTRY
+from models.model_store import ModelHandle
+from utils import metrics
+from utils.chord_render import render_midi_file
+from utils.transpose import REFERENCE_KEY, generate_in_key
 
 # ------------------------------------------------------
 # Load trained 2nd-order Markov model
 # ------------------------------------------------------
 
-with open("markov_probabilities_2nd_order.json", "r") as f:
-    RAW_MODEL = json.load(f)
-
-# Decode "func1|func2" → (func1, func2)
-PROB_MODEL = {}
+# 2nd-order table + 1st-order and uniform fallbacks, with alias tables
+MODEL_FILE = "markov_probabilities_2nd_order.json"
 
-for mood, transitions in RAW_MODEL.items():
-    PROB_MODEL[mood] = {}
-    for key_str, next_probs in transitions.items():
-        func1, func2 = key_str.split("|")
-        PROB_MODEL[mood][(func1, func2)] = next_probs
+MODEL = ModelHandle(MODEL_FILE)
 
+def get_model(style=None, mood="mixed"):
+    """
+    Model is read on first use and re-checked by generate_progression()
+    (see ModelHandle in models/model_store.py). A style's model ("pop",
+    "ambient", ...) comes from the shared registry instead, which keeps
+    only the recently used ones loaded (see models/model_registry.py).
+    """
+    if style is not None:
+        return REGISTRY.get(style, mood, 2)
+    return MODEL.get()
 
 # ------------------------------------------------------
 # Basic harmony setup
@@ -35,6 +45,7 @@ FUNCTIONS = {
     "G": "dominant", "Bdim": "dominant",
 }
 
+@metrics.count_unknown("2nd_order", FUNCTIONS)
 def get_function(ch):
     return FUNCTIONS.get(ch, "tonic")
 
@@ -43,56 +54,44 @@ def get_function(ch):
 # Sampling logic
 # ------------------------------------------------------
 
-def sample_next_function(mood, func1, func2):
+@metrics.timed_sampler("2nd_order")
+def sample_next_function(mood, func1, func2, return_level=False, rng=None, style=None, model=None):
     """
     Sample next harmonic function using 2nd-order Markov probabilities.
     Includes fallback to 1st-order, then random if needed.
-    """
-
-    # Fallback mood if not found
-    if mood not in PROB_MODEL:
-        mood = "mixed"
-
-    mood_probs = PROB_MODEL[mood]
-    key = (func1, func2)
-
-    # CASE 1 — Exact 2nd-order match
-    if key in mood_probs:
-        probs = mood_probs[key]
-        funcs = list(probs.keys())
-        weights = list(probs.values())
-        return random.choices(funcs, weights=weights)[0]
-
-    # CASE 2 — Fallback: 1st-order (match only func2)
-    combined = {}
-
-    for (p1, p2), next_probs in mood_probs.items():
-        if p2 == func2:  # match last function
-            for next_func, prob in next_probs.items():
-                combined[next_func] = combined.get(next_func, 0) + prob
-
-    if combined:
-        funcs = list(combined.keys())
-        weights = list(combined.values())
-        return random.choices(funcs, weights=weights)[0]
 
-    # CASE 3 — Total fallback: random choice
-    return random.choice(["tonic", "predominant", "dominant"])
+    With return_level=True, returns (next_function, level) where level is
+    the backoff order used (2, 1 or 0 for uniform). `model` skips the
+    get_model(style, mood) lookup when the caller already has it.
+    """
+    if model is None:
+        model = get_model(style, mood)
+    return model.sampler.sample(mood, (func1, func2), return_level, rng)
 
 
-def choose_chord_from_function(func):
+@metrics.timed("2nd_order")
+def choose_chord_from_function(func, rng=None):
     """Pick a chord belonging to a harmonic function."""
-    return random.choice(FUNCTION_TO_CHORDS[func])
+    return (rng or random).choice(FUNCTION_TO_CHORDS[func])
 
 
 # ------------------------------------------------------
 # Generate full progression
 # ------------------------------------------------------
 
-def generate_progression(start_chord, mood="mixed", length=8):
+def generate_progression(start_chord, mood="mixed", length=8, rng=None, key=None, style=None):
     """
     Build harmonic progression using 2nd-order Markov chain.
+    Pass a seeded random.Random as rng for reproducible progressions.
+    key: another major key ("G", "Bb", ...); the progression is generated
+    in C and moved through precomputed tables (utils/transpose.py).
+    style: a style model of the registry ("pop", ...) instead of the default.
     """
+    if key not in (None, REFERENCE_KEY):
+        return generate_in_key(generate_progression, start_chord, key, mood, length, rng, style=style)
+
+    # Resolved once per progression, not per draw
+    model = MODEL.refresh() if style is None else get_model(style, mood)
     progression = [start_chord]
 
     # If progression is only one chord long
@@ -101,7 +100,7 @@ def generate_progression(start_chord, mood="mixed", length=8):
 
     # Generate second chord from same function
     func1 = get_function(start_chord)
-    second_chord = random.choice(FUNCTION_TO_CHORDS[func1])
+    second_chord = choose_chord_from_function(func1, rng)
     progression.append(second_chord)
 
     # Now continue with 2nd-order logic
@@ -109,30 +108,172 @@ def generate_progression(start_chord, mood="mixed", length=8):
         f_prev2 = get_function(progression[-2])
         f_prev1 = get_function(progression[-1])
 
-        next_func = sample_next_function(mood, f_prev2, f_prev1)
-        next_chord = choose_chord_from_function(next_func)
+        next_func = sample_next_function(mood, f_prev2, f_prev1, rng=rng, model=model)
+        next_chord = choose_chord_from_function(next_func, rng)
 
         progression.append(next_chord)
 
     return progression
 
 
+_BATCH_GENERATOR = None
+
+def get_batch_generator():
+    """Dense tables for batch generation and scoring, rebuilt when the model changes. Needs numpy."""
+    global _BATCH_GENERATOR
+    model = MODEL.refresh()
+    if _BATCH_GENERATOR is None or _BATCH_GENERATOR.index is not model.index:
+        from models.markov_batch import BatchGenerator
+        _BATCH_GENERATOR = BatchGenerator(
+            model.index, order=2, warmup=1,
+            function_to_chords=FUNCTION_TO_CHORDS,
+        )
+    return _BATCH_GENERATOR
+
+def generate_batch(start_chords, mood="mixed", length=8, n=None, rng=None):
+    """
+    Vectorized version of generate_progression for large batches.
+    Returns an (n, length) array of chord codes; decode it with
+    get_batch_generator().decode(). Needs numpy.
+    """
+    return get_batch_generator().generate_batch(start_chords, mood, length, n, rng)
+
+
+# ------------------------------------------------------
+# Scoring
+# ------------------------------------------------------
+
+def score(progressions, mood="mixed", per_position=False, strict=False):
+    """
+    Log-likelihood of progressions under the mood's function model.
+
+    Chords are mapped with get_function, and every chord from the third
+    on is scored like sample_next_function draws it (2nd order → 1st
+    order → uniform backoff). The first two chords are the given context
+    (0.0). strict=True scores the second chord as generate_progression
+    picks it instead: 0.0 when it keeps the start chord's function, -inf
+    otherwise (e.g. C → G can't be generated).
+
+    `progressions` is a list of chord lists (any lengths) or a NumPy
+    (n, length) array of chord codes as returned by generate_batch
+    (-1 = padding). Returns an (n,) array of log-probabilities, plus the
+    (n, length) per-position terms when per_position=True. Needs numpy.
+    """
+    batch = get_batch_generator()
+    if hasattr(progressions, "ndim"):
+        funcs = batch.chord_codes_to_functions(progressions)
+    else:
+        funcs = batch.encode_functions(progressions, get_function)
+    return batch.score(funcs, mood, per_position, strict)
+
+
+# ------------------------------------------------------
+# Top-k search (k-best Viterbi)
+# ------------------------------------------------------
+
+def _matches_end(symbol, func, end):
+    if end is None:
+        return True
+    if isinstance(end, str):
+        end = (end,)
+    return symbol in end or func in end
+
+
+def top_k_progressions(start_chord, mood="mixed", length=8, k=10, end=None, by="chords"):
+    """
+    The k most probable progressions under the model used by
+    generate_progression, as [(log_prob, sequence)], best first.
+
+    by="chords": chord sequences. The 2nd chord and every chord after a
+    function draw are picked uniformly, so their log(1 / len(chords))
+    is included.
+    by="functions": harmonic function sequences (start chord's function first).
+
+    `end` restricts the last chord: a chord or function name (e.g. "tonic")
+    or a collection of them.
+
+    Partial paths are kept per state (previous function, current symbol),
+    at most k per state, so the cost grows linearly with length.
+    """
+    index = MODEL.refresh().index
+    by_chords = by == "chords"
+
+    if by_chords:
+        def options(func):
+            chords = FUNCTION_TO_CHORDS[func]
+            return [(ch, -math.log(len(chords))) for ch in chords]
+        start = start_chord
+        func_of = get_function
+    else:
+        def options(func):
+            return [(func, 0.0)]
+        start = get_function(start_chord)
+        func_of = str
+
+    transitions = {}
+
+    def next_log_probs(func1, func2):
+        """[(symbol, log_prob)] after (func1, func2), backoff as in sampling."""
+        key = (func1, func2)
+        if key not in transitions:
+            probs, _ = lookup_next_probs(index, mood, key)
+            transitions[key] = [
+                (symbol, math.log(p) + choice_lp)
+                for func, p in probs.items() if p > 0
+                for symbol, choice_lp in options(func)
+            ]
+        return transitions[key]
+
+    # state -> [(log_prob, (symbol, parent_node))]; nodes form linked paths
+    node = (start, None)
+    if length < 2:
+        beams = {(None, start): [(0.0, node)]}
+    else:
+        func1 = get_function(start_chord)
+        beams = {}
+        for symbol, lp in options(func1):  # 2nd chord from the start chord's function
+            beams.setdefault((func1, symbol), []).append((lp, (symbol, node)))
+
+    for _ in range(length - 2):
+        candidates = {}
+        for (prev_func, symbol), paths in beams.items():
+            func = func_of(symbol)
+            for next_symbol, lp in next_log_probs(prev_func, func):
+                bucket = candidates.setdefault((func, next_symbol), [])
+                for path_lp, path in paths:
+                    bucket.append((path_lp + lp, (next_symbol, path)))
+        beams = {
+            state: heapq.nlargest(k, bucket, key=lambda x: x[0])
+            for state, bucket in candidates.items()
+        }
+
+    finals = [
+        entry
+        for (_, symbol), paths in beams.items() if _matches_end(symbol, func_of(symbol), end)
+        for entry in paths
+    ]
+
+    results = []
+    for log_prob, path in heapq.nlargest(k, finals, key=lambda x: x[0]):
+        sequence = []
+        while path is not None:
+            sequence.append(path[0])
+            path = path[1]
+        results.append((log_prob, sequence[::-1]))
+    return results
+
+
 # ------------------------------------------------------
 # MIDI export
 # ------------------------------------------------------
 
+@metrics.timed("2nd_order")
 def render_midi(progression, filename="markov_2nd_order.mid"):
-    s = stream.Stream()
-    for ch in progression:
-        cs = harmony.ChordSymbol(ch)
-        cs.quarterLength = 2
-        s.append(cs)
-
-    mf = midi.translate.streamToMidiFile(s)
-    mf.open(filename, "wb")
-    mf.write()
-    mf.close()
-    print(f"MIDI saved as {filename}")
+    """filename may also be a binary buffer (e.g. io.BytesIO)."""
+    # Known chords are written directly; others go through cached ChordSymbols
+    render_midi_file(progression, filename)
+    if isinstance(filename, str):
+        print(f"MIDI saved as {filename}")
 
 
 # ------------------------------------------------------
@@ -0,0 +1,129 @@
+from models.model_store import ModelHandle
+from utils import metrics
+from utils.chord_render import render_midi_file
+from utils.transpose import REFERENCE_KEY, key_tables, token_function
+
+# ------------------------------------------------------
+# Load trained chord-level Markov model
+# ------------------------------------------------------
+
+# Token levels 2 and 1, function-level backoff (see models/chord_markov.py)
+MODEL_FILE = "markov_chord_probabilities.json"
+
+MODEL = ModelHandle(MODEL_FILE)
+
+def get_model():
+    """Model is read on first use (see models/model_store.py)."""
+    return MODEL.get()
+
+# ------------------------------------------------------
+# Basic harmony setup
+# ------------------------------------------------------
+
+def get_function(ch, key=REFERENCE_KEY):
+    """Function of any chord symbol in `key`, extended chords included (default tonic)."""
+    return token_function(key_tables(key).token(ch))
+
+
+# ------------------------------------------------------
+# Sampling logic
+# ------------------------------------------------------
+# The model works on key-independent tokens ("I", "V7", ...); chord names
+# are converted through the precomputed tables of the requested key.
+
+@metrics.timed_sampler("chords")
+def sample_next_token(mood, context, return_level=False, rng=None):
+    """
+    Sample the next token from the previous tokens (oldest first).
+
+    With return_level=True, returns (next_token, level): the length of the
+    token context that was found, or 0 when the context was unseen and the
+    function levels answered.
+    """
+    model = get_model()
+    return model.sampler.sample(mood, tuple(context[-model.order:]), return_level, rng)
+
+
+def sample_next_chord(mood, context, rng=None, key=REFERENCE_KEY):
+    """Next chord name after `context` (chord names in `key`, oldest first)."""
+    tables = key_tables(key)
+    return tables.name(sample_next_token(mood, tables.to_tokens(context[-get_model().order:]), rng=rng))
+
+
+def suggest_next_chords(mood, context, key=REFERENCE_KEY):
+    """[(chord, probability)] in `key`, most likely first."""
+    model = get_model()
+    tables = key_tables(key)
+    ranked = model.sampler.ranked(mood, tuple(tables.to_tokens(context[-model.order:])))
+    return [(tables.name(token), prob) for token, prob in ranked]
+
+
+# ------------------------------------------------------
+# Generate full progression
+# ------------------------------------------------------
+
+def generate_progression(start_chord, mood="mixed", length=8, rng=None, key=REFERENCE_KEY):
+    """
+    Build a progression chord by chord in any major key (e.g. key="Bb").
+    The start chord may be outside the trained vocabulary (e.g. "G7"); it
+    then backs off to its function.
+    """
+    MODEL.refresh()
+    tables = key_tables(key)
+    tokens = [tables.token(start_chord)]
+
+    for _ in range(length - 1):
+        tokens.append(sample_next_token(mood, tokens, rng=rng))
+
+    return tables.realize(tokens)
+
+
+# ------------------------------------------------------
+# MIDI export
+# ------------------------------------------------------
+
+@metrics.timed("chords")
+def render_midi(progression, filename="markov_chords.mid"):
+    """filename may also be a binary buffer (e.g. io.BytesIO)."""
+    # Known chords are written directly; others go through cached ChordSymbols
+    render_midi_file(progression, filename)
+    if isinstance(filename, str):
+        print(f"MIDI saved as {filename}")
+
+
+# ------------------------------------------------------
+# CLI Interface
+# ------------------------------------------------------
+
+if __name__ == "__main__":
+    print("\n=== Chord-Level Markov Progression Generator ===")
+
+    key = input("Key (C, G, Bb, F#, ..., default C): ").strip() or "C"
+    start = input(f"Enter starting chord (default {key}): ").strip() or key
+
+    print("\nSelect mood:")
+    print("1. tension / drive")
+    print("2. stable / floating")
+    print("3. gentle motion")
+    print("4. mixed")
+
+    mood_map = {
+        "1": "tension / drive",
+        "2": "stable / floating",
+        "3": "gentle motion",
+        "4": "mixed"
+    }
+
+    mood = mood_map.get(input("> "), "mixed")
+
+    length = input("\nProgression length (default 8): ").strip()
+    length = int(length) if length.isdigit() else 8
+
+    progression = generate_progression(start, mood, length, key=key)
+
+    print("\nGenerated progression:")
+    print(" → ".join(progression))
+
+    save = input("\nSave MIDI? (y/n): ").lower().startswith("y")
+    if save:
+        render_midi(progression)
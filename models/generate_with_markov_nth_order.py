@@ -0,0 +1,163 @@
+import random
+
+from models.model_store import ModelHandle
+from utils import metrics
+from utils.chord_render import render_midi_file
+from utils.transpose import REFERENCE_KEY, generate_in_key
+
+# ------------------------------------------------------
+# Load trained N-order Markov model
+# ------------------------------------------------------
+# Written by markov_training_nth_order.py; holds every level 1..order,
+# indexed as levels order..1 + uniform fallback
+
+MODEL_FILE = "markov_probabilities_nth_order.json"
+
+MODEL = ModelHandle(MODEL_FILE)
+
+def get_model():
+    """Model is read on first use (see models/model_store.py)."""
+    return MODEL.get()
+
+
+# ------------------------------------------------------
+# Basic harmony setup
+# ------------------------------------------------------
+
+FUNCTION_TO_CHORDS = {
+    "tonic": ["C", "Am", "Em"],
+    "predominant": ["F", "Dm"],
+    "dominant": ["G", "Bdim"]
+}
+
+FUNCTIONS = {
+    "C": "tonic", "Am": "tonic", "Em": "tonic",
+    "F": "predominant", "Dm": "predominant",
+    "G": "dominant", "Bdim": "dominant",
+}
+
+@metrics.count_unknown("nth_order", FUNCTIONS)
+def get_function(ch):
+    return FUNCTIONS.get(ch, "tonic")
+
+
+# ------------------------------------------------------
+# Sampling logic
+# ------------------------------------------------------
+
+@metrics.timed_sampler("nth_order")
+def sample_next_function(mood, context, return_level=False, rng=None):
+    """
+    Sample next harmonic function from the last `order` functions of
+    `context`, backing off to shorter contexts (and uniform) when unseen.
+    """
+    model = get_model()
+    return model.sampler.sample(mood, tuple(context[-model.order:]), return_level, rng)
+
+
+@metrics.timed("nth_order")
+def choose_chord_from_function(func, rng=None):
+    """Pick a chord belonging to a harmonic function."""
+    return (rng or random).choice(FUNCTION_TO_CHORDS[func])
+
+
+# ------------------------------------------------------
+# Generate full progression
+# ------------------------------------------------------
+
+def generate_progression(start_chord, mood="mixed", length=8, rng=None, key=None):
+    """
+    Build harmonic progression using the N-order Markov chain.
+    Short histories at the start use the lower-order levels.
+    key: another major key ("G", "Bb", ...); the progression is generated
+    in C and moved through precomputed tables (utils/transpose.py).
+    """
+    if key not in (None, REFERENCE_KEY):
+        return generate_in_key(generate_progression, start_chord, key, mood, length, rng)
+
+    MODEL.refresh()
+    progression = [start_chord]
+    functions = [get_function(start_chord)]
+
+    for _ in range(length - 1):
+        next_func = sample_next_function(mood, functions, rng=rng)
+        progression.append(choose_chord_from_function(next_func, rng))
+        functions.append(next_func)
+
+    return progression
+
+
+_BATCH_GENERATOR = None
+
+def get_batch_generator():
+    """Dense tables for batch generation, rebuilt when the model changes. Needs numpy."""
+    global _BATCH_GENERATOR
+    model = MODEL.refresh()
+    if _BATCH_GENERATOR is None or _BATCH_GENERATOR.index is not model.index:
+        from models.markov_batch import BatchGenerator
+        _BATCH_GENERATOR = BatchGenerator(
+            model.index, order=model.order,
+            function_to_chords=FUNCTION_TO_CHORDS,
+        )
+    return _BATCH_GENERATOR
+
+def generate_batch(start_chords, mood="mixed", length=8, n=None, rng=None):
+    """
+    Vectorized version of generate_progression for large batches.
+    Returns an (n, length) array of chord codes; decode it with
+    get_batch_generator().decode(). Needs numpy.
+    """
+    return get_batch_generator().generate_batch(start_chords, mood, length, n, rng)
+
+
+# ------------------------------------------------------
+# MIDI export
+# ------------------------------------------------------
+
+@metrics.timed("nth_order")
+def render_midi(progression, filename="markov_nth_order.mid"):
+    """filename may also be a binary buffer (e.g. io.BytesIO)."""
+    # Known chords are written directly; others go through cached ChordSymbols
+    render_midi_file(progression, filename)
+    if isinstance(filename, str):
+        print(f"MIDI saved as {filename}")
+
+
+# ------------------------------------------------------
+# CLI Interface
+# ------------------------------------------------------
+
+if __name__ == "__main__":
+    print(f"\n=== Order-{get_model().order} Markov Progression Generator ===")
+
+    start = input("Enter starting chord (C, Am, F, etc.): ").strip()
+    if start not in FUNCTIONS:
+        print("Invalid chord. Using C.")
+        start = "C"
+
+    print("\nSelect mood:")
+    print("1. tension / drive")
+    print("2. stable / floating")
+    print("3. gentle motion")
+    print("4. mixed")
+
+    mood_map = {
+        "1": "tension / drive",
+        "2": "stable / floating",
+        "3": "gentle motion",
+        "4": "mixed"
+    }
+
+    mood = mood_map.get(input("> "), "mixed")
+
+    length = input("\nProgression length (default 8): ").strip()
+    length = int(length) if length.isdigit() else 8
+
+    progression = generate_progression(start, mood, length)
+
+    print("\nGenerated progression:")
+    print(" → ".join(progression))
+
+    save = input("\nSave MIDI? (y/n): ").lower().startswith("y")
+    if save:
+        render_midi(progression)
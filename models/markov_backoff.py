@@ -0,0 +1,165 @@
+"""
+Backoff index for the Markov function models.
+
+Instead of scanning every (func1, func2) key of a mood whenever a 2nd-order
+context is missing, the lower-order distributions are built once when the
+model is loaded. A lookup then walks the orders from highest to lowest and
+stops at the first context it knows, which is a handful of dict hits.
+
+Index layout:
+
+    index[mood][order][context_tuple] = {next_function: probability}
+
+where order 2 uses (func1, func2), order 1 uses (func2,) and order 0 holds a
+single uniform distribution under the empty tuple ().
+"""
+
+HARMONIC_FUNCTIONS = ["tonic", "predominant", "dominant"]
+
+DEFAULT_MOOD = "mixed"
+
+# Backoff levels reported by lookup_next_probs()
+LEVEL_2ND_ORDER = 2
+LEVEL_1ST_ORDER = 1
+LEVEL_UNIFORM = 0
+
+
+# ------------------------------------------------------
+# Index construction
+# ------------------------------------------------------
+
+def normalize(counts):
+    """Scale a {key: weight} dict so the values sum to 1."""
+    total = sum(counts.values())
+    if total <= 0:
+        return {}
+    return {key: value / total for key, value in counts.items()}
+
+
+def uniform_distribution(functions=HARMONIC_FUNCTIONS):
+    return {func: 1.0 / len(functions) for func in functions}
+
+
+def merge_first_order(transitions):
+    """
+    Sum every 2nd-order row sharing the same last function:
+    {(func1, func2): {next_func: weight}} → {(func2,): {next_func: weight}}.
+    """
+    first_order = {}
+    for (p1, p2), next_probs in transitions.items():
+        combined = first_order.setdefault((p2,), {})
+        for next_func, prob in next_probs.items():
+            combined[next_func] = combined.get(next_func, 0) + prob
+    return first_order
+
+
+def build_backoff_index(prob_model, functions=HARMONIC_FUNCTIONS):
+    """
+    Build the per-mood backoff index from a decoded 2nd-order model
+    (PROB_MODEL[mood][(func1, func2)] = {next_func: prob}).
+
+    The 1st-order rows merge every 2nd-order row sharing the same last
+    function, exactly like the old per-call fallback did, but normalized.
+    """
+    index = {}
+
+    for mood, transitions in prob_model.items():
+        index[mood] = {
+            LEVEL_2ND_ORDER: dict(transitions),
+            LEVEL_1ST_ORDER: {
+                key: normalize(combined) for key, combined in merge_first_order(transitions).items()
+            },
+            LEVEL_UNIFORM: {(): uniform_distribution(functions)},
+        }
+
+    return index
+
+
+def first_order_counts(count_model):
+    """
+    1st-order counts from 2nd-order counts (COUNTS[mood][(func1, func2)] =
+    {next_func: count}) that normalize to the rows of build_backoff_index,
+    scaled to the number of observations they merge. An online model
+    seeded with them backs off exactly like the index of the saved model.
+    """
+    counts = {}
+
+    for mood, rows in count_model.items():
+        merged = merge_first_order({key: normalize(row) for key, row in rows.items()})
+        totals = {}
+        for (p1, p2), row in rows.items():
+            totals[(p2,)] = totals.get((p2,), 0) + sum(row.values())
+        counts[mood] = {
+            key: {f: p * totals[key] for f, p in normalize(combined).items()}
+            for key, combined in merged.items()
+        }
+
+    return counts
+
+
+def build_first_order_index(prob_model, functions=HARMONIC_FUNCTIONS):
+    """
+    Wrap a 1st-order model (PROB_MODEL[mood][func] = {next_func: prob}) in
+    the same index layout, so both model orders share the lookup code.
+    """
+    index = {}
+
+    for mood, transitions in prob_model.items():
+        index[mood] = {
+            LEVEL_1ST_ORDER: {
+                (func,): dict(next_probs) for func, next_probs in transitions.items()
+            },
+            LEVEL_UNIFORM: {(): uniform_distribution(functions)},
+        }
+
+    return index
+
+
+def build_nth_order_index(model):
+    """
+    Build the index from an N-order model file written by
+    markov_training_nth_order.py. Every trained level 1..k is kept, so
+    lookups back off from k down to 1 and finally to uniform.
+    """
+    functions = model.get("functions", HARMONIC_FUNCTIONS)
+    index = {}
+
+    for level_str, moods in model["levels"].items():
+        level = int(level_str)
+        for mood, transitions in moods.items():
+            tables = index.setdefault(mood, {LEVEL_UNIFORM: {(): uniform_distribution(functions)}})
+            tables[level] = {
+                tuple(key_str.split("|")): next_probs
+                for key_str, next_probs in transitions.items()
+            }
+
+    return index
+
+
+# ------------------------------------------------------
+# Lookup
+# ------------------------------------------------------
+
+def resolve_mood(index, mood):
+    return mood if mood in index else DEFAULT_MOOD
+
+
+def lookup_next_probs(index, mood, context):
+    """
+    Return (distribution, level) for the longest known suffix of `context`.
+
+    `level` is the order that answered the query: 2 for an exact 2nd-order
+    match, 1 for the 1st-order fallback, 0 for the uniform last resort.
+    """
+    tables = index[resolve_mood(index, mood)]
+
+    for level in sorted(tables, reverse=True):
+        key = tuple(context[len(context) - level:]) if level else ()
+        if len(key) != level:
+            continue
+        probs = tables[level].get(key)
+        if probs:
+            return probs, level
+
+    # Model without a uniform level: should not happen with build_backoff_index
+    return uniform_distribution(), LEVEL_UNIFORM
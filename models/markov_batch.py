@@ -0,0 +1,245 @@
+"""
+Vectorized batch generation for the Markov function models.
+
+generate_progression() draws one chord at a time in pure Python. For large
+jobs (variations for a whole catalog) BatchGenerator keeps the whole batch
+as an integer-coded (n, length) array and advances every chain at once:
+
+- functions and chords are encoded as small integers,
+- every backoff-resolved distribution is expanded into a dense CDF table
+  indexed by the encoded context (one table per context length),
+- each step is a single inverse-CDF lookup over the whole batch.
+
+    batch = BatchGenerator(BACKOFF_INDEX, order=2, warmup=1)
+    codes = batch.generate_batch("C", "mixed", length=8, n=100000)
+    progressions = batch.decode(codes)
+
+The same tables, as log-probabilities, score whole batches of
+progressions (see score()).
+"""
+
+import itertools
+
+import numpy as np
+
+from models.markov_backoff import HARMONIC_FUNCTIONS, lookup_next_probs, resolve_mood
+
+FUNCTION_TO_CHORDS = {
+    "tonic": ["C", "Am", "Em"],
+    "predominant": ["F", "Dm"],
+    "dominant": ["G", "Bdim"]
+}
+
+
+class BatchGenerator:
+    """
+    Dense, integer-coded view of a backoff index.
+
+    `order` is the longest context used. `warmup` is how many chords after
+    the start chord are drawn from the start chord's own function instead
+    of the model (the 2nd-order generator does this for its second chord).
+    """
+
+    def __init__(
+        self,
+        index,
+        order,
+        warmup=0,
+        functions=HARMONIC_FUNCTIONS,
+        function_to_chords=FUNCTION_TO_CHORDS,
+    ):
+        self.index = index
+        self.order = order
+        self.warmup = warmup
+
+        # Function vocabulary
+        self.functions = list(functions)
+        self.function_codes = {f: i for i, f in enumerate(self.functions)}
+
+        # Chord vocabulary, grouped by function so each function owns a
+        # contiguous [offset, offset + count) range of chord codes
+        self.chords = []
+        offsets, counts = [], []
+        for func in self.functions:
+            offsets.append(len(self.chords))
+            counts.append(len(function_to_chords[func]))
+            self.chords.extend(function_to_chords[func])
+
+        self.chord_codes = {ch: i for i, ch in enumerate(self.chords)}
+        self.chord_offsets = np.array(offsets, dtype=np.int64)
+        self.chord_counts = np.array(counts, dtype=np.int64)
+        self.chord_function = np.array(
+            [self.function_codes[f] for f in self.functions for _ in function_to_chords[f]],
+            dtype=np.int64,
+        )
+        self.chord_dtype = np.int8 if len(self.chords) < 128 else np.int16
+
+        self.moods = list(index)
+        self.mood_codes = {m: i for i, m in enumerate(self.moods)}
+
+        # prob_tables[L] / cdf_tables[L] have shape (moods, V**L, V)
+        self.prob_tables = {
+            length: self._build_prob_table(length) for length in range(1, order + 1)
+        }
+        self.cdf_tables = {
+            length: np.cumsum(table, axis=2) for length, table in self.prob_tables.items()
+        }
+        self._log_prob_tables = None
+
+    def _build_prob_table(self, context_length):
+        """Backoff-resolved, normalized next-function rows for every context."""
+        V = len(self.functions)
+        table = np.zeros((len(self.moods), V ** context_length, V))
+
+        for m, mood in enumerate(self.moods):
+            contexts = itertools.product(range(V), repeat=context_length)
+            for flat, ctx in enumerate(contexts):
+                context = tuple(self.functions[c] for c in ctx)
+                probs, _ = lookup_next_probs(self.index, mood, context)
+                row = np.array([probs.get(f, 0.0) for f in self.functions])
+                table[m, flat] = row / row.sum()
+
+        return table
+
+    @property
+    def log_prob_tables(self):
+        if self._log_prob_tables is None:
+            with np.errstate(divide="ignore"):  # log(0) = -inf: impossible transition
+                self._log_prob_tables = {
+                    length: np.log(table) for length, table in self.prob_tables.items()
+                }
+        return self._log_prob_tables
+
+    # --------------------------------------------------
+    # Encoding
+    # --------------------------------------------------
+
+    def encode_chords(self, chords):
+        try:
+            return np.array([self.chord_codes[ch] for ch in chords], dtype=self.chord_dtype)
+        except KeyError as exc:
+            raise ValueError(f"Unknown chord {exc.args[0]!r}") from None
+
+    def decode(self, codes):
+        """Turn an (n, length) chord-code array back into lists of chord names."""
+        chords = self.chords
+        return [[chords[c] for c in row] for row in np.asarray(codes).tolist()]
+
+    # --------------------------------------------------
+    # Generation
+    # --------------------------------------------------
+
+    def generate_batch(self, start_chords, mood="mixed", length=8, n=None,
+                       rng=None, return_functions=False):
+        """
+        Generate n progressions at once.
+
+        start_chords is one chord name (used for every chain) or a sequence
+        with one start chord per chain. rng is a numpy Generator or a seed.
+        Returns an (n, length) array of chord codes (see decode()), plus the
+        matching function codes when return_functions=True. length=0 gives
+        empty (n, 0) arrays.
+        """
+        if length < 0:
+            raise ValueError(f"length must be >= 0, got {length}")
+        if isinstance(start_chords, str):
+            if n is None:
+                n = 1
+            start_chords = [start_chords] * n
+        elif n is None:
+            n = len(start_chords)
+        elif len(start_chords) != n:
+            raise ValueError("Need one start chord per progression")
+
+        rng = np.random.default_rng(rng)
+        mood_code = self.mood_codes[resolve_mood(self.index, mood)]
+
+        chords = np.empty((n, length), dtype=self.chord_dtype)
+        funcs = np.empty((n, length), dtype=np.int64)
+
+        codes = self.encode_chords(start_chords)  # unknown start chords raise even for length=0
+        if length:
+            chords[:, 0] = codes
+            funcs[:, 0] = self.chord_function[codes]
+
+        V = len(self.functions)
+
+        for t in range(1, length):
+            if t <= self.warmup:
+                next_func = funcs[:, 0]
+            else:
+                L = min(t, self.order)
+                weights = V ** np.arange(L - 1, -1, -1)
+                flat = funcs[:, t - L:t] @ weights
+                cdf = self.cdf_tables[L][mood_code][flat]
+
+                u = rng.random(n)
+                next_func = (cdf <= u[:, None]).sum(axis=1)
+                np.minimum(next_func, V - 1, out=next_func)
+
+            # Uniform chord within the chosen function
+            pick = (rng.random(n) * self.chord_counts[next_func]).astype(np.int64)
+            chords[:, t] = self.chord_offsets[next_func] + pick
+            funcs[:, t] = next_func
+
+        if return_functions:
+            return chords, funcs
+        return chords
+
+    # --------------------------------------------------
+    # Scoring
+    # --------------------------------------------------
+
+    def chord_codes_to_functions(self, codes):
+        """(n, length) chord codes, -1 = padding → function codes, -1 kept."""
+        codes = np.asarray(codes, dtype=np.int64)
+        funcs = self.chord_function[np.maximum(codes, 0)]
+        funcs[codes < 0] = -1
+        return funcs
+
+    def encode_functions(self, progressions, get_function):
+        """Lists of chord names (any lengths) → (n, max_length) function codes, -1 padded."""
+        width = max((len(p) for p in progressions), default=0)
+        funcs = np.full((len(progressions), width), -1, dtype=np.int64)
+        codes = self.function_codes
+        for i, progression in enumerate(progressions):
+            funcs[i, :len(progression)] = [codes[get_function(ch)] for ch in progression]
+        return funcs
+
+    def score(self, funcs, mood="mixed", per_position=False, strict=False):
+        """
+        Log-likelihood of each row of an (n, length) function-code array
+        (-1 = padding at the end of shorter rows).
+
+        Position t scores log P(f_t | previous min(t, order) functions)
+        with the same backoff as sampling. The start chord and the `warmup`
+        positions are the given context and score 0.0, so any progression
+        can be ranked. With strict=True the warmup positions follow the
+        generation rule instead: 0.0 when they keep the start chord's
+        function, -inf otherwise (a progression generate_batch can't
+        produce).
+        Returns the (n,) totals, plus the (n, length) per-position terms
+        when per_position=True.
+        """
+        funcs = np.asarray(funcs, dtype=np.int64)
+        n, length = funcs.shape
+        mood_code = self.mood_codes[resolve_mood(self.index, mood)]
+        V = len(self.functions)
+
+        terms = np.zeros((n, length))
+        for t in range(1, length):
+            valid = funcs[:, t] >= 0
+            if t <= self.warmup:
+                if strict:
+                    same = funcs[:, t] == funcs[:, 0]
+                    terms[:, t] = np.where(valid & ~same, -np.inf, 0.0)
+                continue
+            L = min(t, self.order)
+            flat = np.maximum(funcs[:, t - L:t], 0) @ (V ** np.arange(L - 1, -1, -1))
+            lp = self.log_prob_tables[L][mood_code][flat, np.maximum(funcs[:, t], 0)]
+            terms[:, t] = np.where(valid, lp, 0.0)
+
+        totals = terms.sum(axis=1)
+        if per_position:
+            return totals, terms
+        return totals
@@ -0,0 +1,233 @@
+"""
+Online (incremental) Markov function model.
+
+Keeps raw transition counts next to the probabilities, so accepted
+suggestions can be folded in live instead of regenerating the dataset and
+retraining:
+
+    model = OnlineMarkovModel.load("markov_counts_2nd_order.json", autosave_every=20)
+    model.update("mixed", ("tonic", "predominant"), "dominant")
+    ranked = model.ranked("mixed", ("tonic", "predominant"))
+
+An update touches one row per context length (O(order)) and only drops that
+row's cached probabilities; rows are renormalized the next time they are
+read. Count snapshots are written after every `autosave_every` updates
+and/or once `autosave_interval` seconds have passed since the last save
+(checked on update), and on close().
+
+Snapshot layout (same key encoding as the N-order model file, but counts):
+
+    {"order": 2, "functions": [...],
+     "levels": {"1": {mood: {"tonic": {next_func: count}}},
+                "2": {mood: {"tonic|dominant": {next_func: count}}}}}
+
+A model seeded from probabilities (from_index) records its "prior_weight",
+so its snapshot can be told apart from real counts.
+"""
+
+import json
+import os
+import time
+
+from models.markov_backoff import (
+    HARMONIC_FUNCTIONS,
+    LEVEL_UNIFORM,
+    normalize,
+    resolve_mood,
+    uniform_distribution,
+)
+
+
+class OnlineMarkovModel:
+    """Raw counts per (mood, context) with lazily normalized rows."""
+
+    def __init__(
+        self,
+        order,
+        functions=HARMONIC_FUNCTIONS,
+        snapshot_path=None,
+        autosave_every=None,
+        autosave_interval=None,
+    ):
+        self.order = order
+        self.functions = list(functions)
+        self.uniform = uniform_distribution(self.functions)
+
+        # counts[mood][level][context_tuple] = {next_func: count}
+        self.counts = {}
+        # (mood, level, context_tuple) -> normalized row, filled lazily
+        self._probs = {}
+
+        self.snapshot_path = snapshot_path
+        self.autosave_every = autosave_every
+        self.autosave_interval = autosave_interval
+        self.pending_updates = 0
+        self.last_save = time.monotonic()
+        # Pseudo-count weight of each row when seeded by from_index()
+        self.prior_weight = None
+
+    # --------------------------------------------------
+    # Construction
+    # --------------------------------------------------
+
+    @classmethod
+    def from_snapshot(cls, snapshot, **kwargs):
+        model = cls(snapshot["order"], snapshot.get("functions", HARMONIC_FUNCTIONS), **kwargs)
+        model.prior_weight = snapshot.get("prior_weight")
+        for level_str, moods in snapshot["levels"].items():
+            for mood, rows in moods.items():
+                for key_str, next_counts in rows.items():
+                    model.add_row(mood, tuple(key_str.split("|")), next_counts)
+        return model
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """Load a count snapshot; later saves go back to the same path."""
+        with open(path, "r") as f:
+            snapshot = json.load(f)
+        kwargs.setdefault("snapshot_path", path)
+        return cls.from_snapshot(snapshot, **kwargs)
+
+    @classmethod
+    def from_index(cls, index, order, prior_weight=100, **kwargs):
+        """
+        Seed pseudo-counts from a probability-only backoff index: each row
+        counts as `prior_weight` observations. Used when no count snapshot
+        exists yet (models trained before counts were saved).
+        """
+        model = cls(order, **kwargs)
+        model.prior_weight = prior_weight
+        for mood, levels in index.items():
+            for level, contexts in levels.items():
+                if level == LEVEL_UNIFORM:
+                    continue
+                for context, probs in contexts.items():
+                    model.add_row(
+                        mood, context, {f: p * prior_weight for f, p in probs.items()}
+                    )
+        return model
+
+    def add_row(self, mood, context, next_counts):
+        context = tuple(context)
+        rows = self.counts.setdefault(mood, {}).setdefault(len(context), {})
+        row = rows.setdefault(context, {})
+        for next_func, count in next_counts.items():
+            count += row.get(next_func, 0)
+            if count > 0:
+                row[next_func] = count
+            else:
+                row.pop(next_func, None)
+        if not row:  # fully undone
+            del rows[context]
+        self._probs.pop((mood, len(context), context), None)
+
+    # --------------------------------------------------
+    # Updates
+    # --------------------------------------------------
+
+    def update(self, mood, context, next_func, weight=1):
+        """
+        Fold one observed transition into the counts of every context
+        length 1..order. Probabilities are renormalized lazily on read.
+        A negative weight takes an earlier observation back (undo).
+        Unknown moods count towards the default mood, as in lookup().
+        """
+        mood = resolve_mood(self.counts, mood)
+        context = tuple(context)[-self.order:]
+        for level in range(1, len(context) + 1):
+            self.add_row(mood, context[len(context) - level:], {next_func: weight})
+
+        self.pending_updates += 1
+        self._maybe_autosave()
+
+    def _maybe_autosave(self):
+        if self.snapshot_path is None:
+            return
+        due_by_count = self.autosave_every and self.pending_updates >= self.autosave_every
+        due_by_time = (
+            self.autosave_interval is not None
+            and time.monotonic() - self.last_save >= self.autosave_interval
+        )
+        if due_by_count or due_by_time:
+            self.save()
+
+    # --------------------------------------------------
+    # Lookup
+    # --------------------------------------------------
+
+    def probabilities(self, mood, context):
+        """Normalized row for an exact (mood, context), or None if unseen."""
+        context = tuple(context)
+        key = (mood, len(context), context)
+        probs = self._probs.get(key)
+        if probs is None:
+            row = self.counts.get(mood, {}).get(len(context), {}).get(context)
+            if not row:
+                return None
+            probs = self._probs[key] = normalize(row)
+        return probs
+
+    def lookup(self, mood, context):
+        """(distribution, level) with the same backoff as lookup_next_probs."""
+        mood = resolve_mood(self.counts, mood)
+        context = tuple(context)[-self.order:]
+
+        for level in range(len(context), 0, -1):
+            probs = self.probabilities(mood, context[len(context) - level:])
+            if probs:
+                return probs, level
+
+        return self.uniform, LEVEL_UNIFORM
+
+    def ranked(self, mood, context):
+        probs, _ = self.lookup(mood, context)
+        return sorted(probs.items(), key=lambda x: x[1], reverse=True)
+
+    def to_index(self):
+        """Full backoff index (see markov_backoff.py), e.g. for CompiledSampler."""
+        index = {}
+        for mood, levels in self.counts.items():
+            tables = index[mood] = {LEVEL_UNIFORM: {(): dict(self.uniform)}}
+            for level, rows in levels.items():
+                tables[level] = {context: self.probabilities(mood, context) for context in rows}
+        return index
+
+    # --------------------------------------------------
+    # Snapshots
+    # --------------------------------------------------
+
+    def snapshot(self):
+        snapshot = {
+            "order": self.order,
+            "functions": self.functions,
+            "levels": {
+                str(level): {
+                    mood: {
+                        "|".join(context): dict(row)
+                        for context, row in self.counts[mood][level].items()
+                    }
+                    for mood in self.counts
+                    if level in self.counts[mood]
+                }
+                for level in range(1, self.order + 1)
+            },
+        }
+        if self.prior_weight is not None:
+            snapshot["prior_weight"] = self.prior_weight
+        return snapshot
+
+    def save(self, path=None):
+        """Write a count snapshot atomically (temp file + rename)."""
+        path = path or self.snapshot_path
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+        self.pending_updates = 0
+        self.last_save = time.monotonic()
+
+    def close(self):
+        """Persist any updates not yet saved."""
+        if self.snapshot_path is not None and self.pending_updates:
+            self.save()
@@ -0,0 +1,162 @@
+"""
+Compiled sampler for the Markov function models.
+
+Every (mood, context) distribution of a backoff index is turned into a
+Walker alias table once, when the model is loaded. A draw then costs one
+random number and two list reads, instead of rebuilding the key/weight
+lists and the cumulative weights inside random.choices() on every step.
+
+    sampler = CompiledSampler.from_second_order(PROB_MODEL, rng=random.Random(42))
+    next_func = sampler.sample("mixed", ("tonic", "dominant"))
+"""
+
+import random
+
+from models.markov_backoff import (
+    build_backoff_index,
+    build_first_order_index,
+    build_nth_order_index,
+    resolve_mood,
+)
+
+
+# ------------------------------------------------------
+# Walker alias table
+# ------------------------------------------------------
+
+class AliasTable:
+    """O(1) sampler for one discrete distribution {outcome: weight}."""
+
+    __slots__ = ("outcomes", "prob", "alias", "size")
+
+    def __init__(self, distribution):
+        outcomes = list(distribution)
+        weights = [float(distribution[o]) for o in outcomes]
+        size = len(outcomes)
+        total = sum(weights)
+
+        if size == 0 or total <= 0:
+            raise ValueError("Cannot build an alias table from an empty distribution")
+
+        scaled = [w * size / total for w in weights]
+        prob = [0.0] * size
+        alias = list(range(size))
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] = (scaled[l] + scaled[s]) - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+
+        # Whatever is left is 1.0 up to rounding error
+        for i in large + small:
+            prob[i] = 1.0
+
+        self.outcomes = outcomes
+        self.prob = prob
+        self.alias = alias
+        self.size = size
+
+    def draw(self, rng=random):
+        """Draw one outcome using a single uniform number from `rng`."""
+        u = rng.random() * self.size
+        column = int(u)
+        if u - column < self.prob[column]:
+            return self.outcomes[column]
+        return self.outcomes[self.alias[column]]
+
+
+# ------------------------------------------------------
+# Compiled sampler
+# ------------------------------------------------------
+
+class CompiledSampler:
+    """
+    Alias tables for every state of a backoff index, plus a memo of which
+    table answers a given (mood, context) so backoff is resolved only once.
+
+    `rng` is any object with a random() method (random.Random, the random
+    module itself...). It defaults to the global random module, so code that
+    calls random.seed() keeps working.
+    """
+
+    def __init__(self, index, rng=None):
+        self.index = index
+        self.rng = rng if rng is not None else random
+
+        self.tables = {}
+        for mood, levels in index.items():
+            self.tables[mood] = {
+                level: {
+                    context: AliasTable(probs)
+                    for context, probs in contexts.items()
+                    if probs
+                }
+                for level, contexts in levels.items()
+            }
+
+        # (mood, context) -> (AliasTable, level)
+        self._resolved = {}
+
+    @classmethod
+    def from_first_order(cls, prob_model, rng=None):
+        return cls(build_first_order_index(prob_model), rng=rng)
+
+    @classmethod
+    def from_second_order(cls, prob_model, rng=None):
+        return cls(build_backoff_index(prob_model), rng=rng)
+
+    @classmethod
+    def from_nth_order(cls, model, rng=None):
+        """`model` is the decoded JSON written by markov_training_nth_order.py."""
+        return cls(build_nth_order_index(model), rng=rng)
+
+    def seed(self, seed):
+        """Replace the RNG with a fresh random.Random(seed)."""
+        self.rng = random.Random(seed)
+
+    def resolve(self, mood, context):
+        """Return (AliasTable, level) for the longest known suffix of context."""
+        # Unknown moods share the default mood's memo entries
+        mood = resolve_mood(self.tables, mood)
+        memo_key = (mood, context)
+        hit = self._resolved.get(memo_key)
+        if hit is not None:
+            return hit
+
+        tables = self.tables[mood]
+        for level in sorted(tables, reverse=True):
+            key = tuple(context[len(context) - level:]) if level else ()
+            if len(key) == level and key in tables[level]:
+                hit = (tables[level][key], level)
+                break
+        else:
+            raise KeyError(f"No distribution for mood={mood!r} context={context!r}")
+
+        self._resolved[memo_key] = hit
+        return hit
+
+    @property
+    def memo_size(self):
+        """Number of (mood, context) lookups remembered by resolve()."""
+        return len(self._resolved)
+
+    def sample(self, mood, context, return_level=False, rng=None):
+        """
+        Draw the next function for `context` (a tuple of previous functions,
+        oldest first). With return_level=True, returns (function, level).
+        """
+        table, level = self.resolve(mood, tuple(context))
+        next_func = table.draw(rng if rng is not None else self.rng)
+
+        if return_level:
+            return next_func, level
+        return next_func
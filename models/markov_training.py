@@ -1,66 +1,30 @@
 import json
-from collections import defaultdict
+import sys
+
+from models.markov_training_nth_order import encode_level, train_file
 
 # ===================================================
 # STEP 1 — Load dataset
 # ===================================================
 
-with open("chord_dataset.json", "r") as f:
-    data = json.load(f)
+# Optional path, e.g. chords_dataset.jsonl.gz (streamed, constant memory) or
+# a sharded dataset directory (counted in parallel, one worker per shard)
+dataset_file = sys.argv[1] if len(sys.argv) > 1 else "chord_dataset.json"
 
 # ===================================================
-# STEP 2 — Train Markov model (count transitions)
+# STEP 2 — Count transitions + normalize
 # ===================================================
-
-# model[mood][current_function][next_function] = count
-model = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
-
-FUNCTIONS = {
-    "C": "tonic", "Am": "tonic", "Em": "tonic",
-    "F": "predominant", "Dm": "predominant",
-    "G": "dominant", "Bdim": "dominant",
-}
-
-def get_function(ch):
-    return FUNCTIONS.get(ch, "tonic")
+# Shared N-order trainer with order 1:
+# prob_model[mood][current_function][next_function] = probability
 
 print("Counting transitions...")
 
-for sample in data:
-    mood = sample["mood"]
-    functions = sample["functions"]
-    next_chord = sample["next_chord"]
-
-    current_function = functions[-1]
-    next_function = get_function(next_chord)
-
-    model[mood][current_function][next_function] += 1
-
-print("Training complete — raw counts collected.")
-
-# ===================================================
-# STEP 3 — Convert counts → probabilities (normalization)
-# ===================================================
-
-prob_model = defaultdict(dict)
-
-print("Normalizing counts into probabilities...")
-
-for mood in model:
-    prob_model[mood] = {}
-    for curr_func in model[mood]:
-
-        total = sum(model[mood][curr_func].values())
-
-        prob_model[mood][curr_func] = {}
-
-        for next_func, count in model[mood][curr_func].items():
-            prob_model[mood][curr_func][next_func] = count / total
+prob_model = encode_level(train_file(dataset_file, order=1)[1])
 
-print("Normalization complete.")
+print("Training complete — probabilities normalized.")
 
 # ===================================================
-# STEP 4 — Save the probability model
+# STEP 3 — Save the probability model
 # ===================================================
 
 with open("markov_probabilities.json", "w") as f:
@@ -1,85 +1,46 @@
 import json
-from collections import defaultdict
+import sys
+
+from models.markov_training_nth_order import (
+    count_file,
+    encode_level,
+    normalize_levels,
+    save_counts,
+)
 
 # ------------------------------------------------------
 # Load dataset
 # ------------------------------------------------------
 
-with open("chords_dataset.json", "r") as f:
-    data = json.load(f)
+# Optional path, e.g. chords_dataset.jsonl.gz (streamed, constant memory) or
+# a sharded dataset directory (counted in parallel, one worker per shard)
+dataset_file = sys.argv[1] if len(sys.argv) > 1 else "chords_dataset.json"
 
 # ------------------------------------------------------
-# Prepare model structure
+# Count 2nd-order transitions + normalize
 # ------------------------------------------------------
-# model[mood][(func1, func2)][next_func] = count
-
-model = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
-
-FUNCTIONS = {
-    "C": "tonic", "Am": "tonic", "Em": "tonic",
-    "F": "predominant", "Dm": "predominant",
-    "G": "dominant", "Bdim": "dominant",
-}
-
-def get_function(ch):
-    return FUNCTIONS.get(ch, "tonic")
+# Shared N-order trainer; level 2 is
+# prob_model[mood][(func1, func2)][next_func] = probability
 
 print("Counting 2nd-order transitions...")
 
-for sample in data:
-    mood = sample["mood"]
-    func_seq = sample["functions"]
-    next_chord = sample["next_chord"]
-    next_func = get_function(next_chord)
-
-    if len(func_seq) < 2:
-        continue
-
-    prev2 = func_seq[-2]
-    prev1 = func_seq[-1]
-
-    key = (prev2, prev1)
-
-    model[mood][key][next_func] += 1
+counts = count_file(dataset_file, order=2)
+levels = normalize_levels(counts)
 
 print("2nd-order training complete.")
 
 # ------------------------------------------------------
-# Normalize counts → probabilities
-# ------------------------------------------------------
-
-prob_model = defaultdict(dict)
-
-print("Normalizing...")
-
-for mood in model:
-    prob_model[mood] = {}
-    for key_tuple in model[mood]:
-        total = sum(model[mood][key_tuple].values())
-        prob_model[mood][key_tuple] = {}
-
-        for next_func, count in model[mood][key_tuple].items():
-            prob_model[mood][key_tuple][next_func] = count / total
-
-print("Normalization complete.")
-
-# ------------------------------------------------------
-# Save model (tuple keys → strings)
+# Save model (tuple keys → "func1|func2" strings)
 # ------------------------------------------------------
 
-def encode_key(key_tuple):
-    return f"{key_tuple[0]}|{key_tuple[1]}"
-
-encoded_model = {}
-
-for mood, transitions in prob_model.items():
-    encoded_model[mood] = {}
-    for key_tuple, next_probs in transitions.items():
-        encoded_key = encode_key(key_tuple)
-        encoded_model[mood][encoded_key] = next_probs
-
 with open("markov_probabilities_2nd_order.json", "w") as f:
-    json.dump(encoded_model, f, indent=2)
+    json.dump(encode_level(levels[2]), f, indent=2)
 
 print("\nSaved: markov_probabilities_2nd_order.json")
 
+# Counts (level 2 raw, level 1 merged like the backoff index of the file
+# above), loaded by the interactive generator so accepted suggestions can
+# be folded into the model live
+save_counts(counts, "markov_counts_2nd_order.json", merged_first_order=True)
+
+print("Saved: markov_counts_2nd_order.json")
@@ -0,0 +1,136 @@
+"""
+Chord-level Markov trainer.
+
+Counts, in one pass over the dataset, for every context length j = 1..order:
+
+- chord transitions (last j chords) → next chord, from the samples'
+  "context" / "next_chord" fields,
+- the same transitions at the function level (the backoff for unseen
+  chord contexts),
+- P(chord | function, mood), to turn a backed-off function into a chord.
+
+Chords are counted as scale-degree tokens (see utils/transpose.py), read
+in the sample's "key" (C major when absent), so one model serves every
+key and datasets in several keys share the same rows.
+
+    {
+      "kind": "chord",
+      "order": 2,
+      "functions": ["tonic", "predominant", "dominant"],
+      "tokens": ["I", "IV", "V", "ii", ...],
+      "levels": {"1": {mood: {"I": {next_token: prob}}},
+                 "2": {mood: {"I|V": {next_token: prob}}}},
+      "function_levels": {"1": {mood: {"tonic": {next_func: prob}}}, ...},
+      "emissions": {mood: {"tonic": {"I": prob, "vi": prob, ...}}}
+    }
+
+"function_levels" has the layout of the N-order model's "levels". Any
+dataset the other trainers read works (JSON, JSONL, binary .chords).
+
+Usage: python -m models.markov_training_chords [order] [dataset] [output]
+"""
+
+import argparse
+import json
+
+from models.markov_backoff import HARMONIC_FUNCTIONS, normalize
+from models.markov_training_nth_order import encode_level, load_dataset
+from utils.transpose import REFERENCE_KEY, key_tables, token_function
+
+
+# ------------------------------------------------------
+# Counting
+# ------------------------------------------------------
+
+def _add(table, mood, context, outcome):
+    row = table.setdefault(mood, {}).setdefault(context, {})
+    row[outcome] = row.get(outcome, 0) + 1
+
+
+def count_chord_transitions(data, order=2):
+    """
+    Return (chord_levels, function_levels, emissions) as count tables:
+    {j: {mood: {context_tuple: {next: count}}}} for both levels, and
+    {mood: {function: {token: count}}}.
+    """
+    chord_levels = {j: {} for j in range(1, order + 1)}
+    function_levels = {j: {} for j in range(1, order + 1)}
+    emissions = {}
+
+    samples = data.iter_samples() if hasattr(data, "iter_samples") else data
+    for sample in samples:
+        mood = sample["mood"]
+        tables = key_tables(sample.get("key", REFERENCE_KEY))
+        context = tables.to_tokens(sample["context"][-order:])
+        next_token = tables.token(sample["next_chord"])
+        next_func = token_function(next_token)
+
+        _add(emissions, mood, next_func, next_token)
+
+        functions = [token_function(t) for t in context]
+        for j in range(1, min(order, len(context)) + 1):
+            _add(chord_levels[j], mood, tuple(context[-j:]), next_token)
+            _add(function_levels[j], mood, tuple(functions[-j:]), next_func)
+
+    return chord_levels, function_levels, emissions
+
+
+def normalize_rows(table):
+    """{mood: {key: {outcome: count}}} → probabilities per row."""
+    return {
+        mood: {key: normalize(row) for key, row in rows.items()}
+        for mood, rows in table.items()
+    }
+
+
+# ------------------------------------------------------
+# Model file
+# ------------------------------------------------------
+
+def encode_chord_model(chord_levels, function_levels, emissions, functions=HARMONIC_FUNCTIONS):
+    tokens = set()
+    for level in chord_levels.values():
+        for rows in level.values():
+            for context, row in rows.items():
+                tokens.update(context)
+                tokens.update(row)
+
+    return {
+        "kind": "chord",
+        "order": max(chord_levels),
+        "functions": list(functions),
+        "tokens": sorted(tokens),
+        "levels": {
+            str(j): encode_level(normalize_rows(chord_levels[j])) for j in sorted(chord_levels)
+        },
+        "function_levels": {
+            str(j): encode_level(normalize_rows(function_levels[j])) for j in sorted(function_levels)
+        },
+        "emissions": normalize_rows(emissions),
+    }
+
+
+def train_file(path, order=2):
+    """Count a dataset path and return the encoded model."""
+    return encode_chord_model(*count_chord_transitions(load_dataset(path), order))
+
+
+# ------------------------------------------------------
+# CLI
+# ------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a chord-level Markov model.")
+    parser.add_argument("order", nargs="?", type=int, default=2)
+    parser.add_argument("dataset", nargs="?", default="chords_dataset.json",
+                        help="dataset file or binary .chords directory")
+    parser.add_argument("output", nargs="?", default="markov_chord_probabilities.json")
+    args = parser.parse_args()
+
+    print(f"Counting chord transitions up to order {args.order}...")
+    model = train_file(args.dataset, args.order)
+    print(f"Training complete — {len(model['tokens'])} chord tokens.")
+
+    with open(args.output, "w") as f:
+        json.dump(model, f, indent=2)
+    print(f"\nSaved: {args.output}")
@@ -0,0 +1,452 @@
+"""
+Generic N-order Markov trainer.
+
+One pass over the dataset counts, for every context length j = 1..order,
+the transitions (last j functions) → next function. Counts live in flat
+integer tables indexed by the base-V encoded context instead of nested
+defaultdicts:
+
+- a dense array('Q') per mood while V ** (j + 1) stays small,
+- a plain {code: count} dict (hashed sparse) for larger orders.
+
+The saved model keeps every level, so generators can back off from k to
+k-1 ... down to 1 (and uniform) without any merging at load time:
+
+    {
+      "order": 3,
+      "functions": ["tonic", "predominant", "dominant"],
+      "levels": {
+        "1": {mood: {"tonic": {next_func: prob}}},
+        "2": {mood: {"tonic|dominant": {next_func: prob}}},
+        "3": {mood: {"tonic|dominant|tonic": {next_func: prob}}}
+      }
+    }
+
+Level 1 and level 2 have exactly the layout of markov_probabilities.json and
+markov_probabilities_2nd_order.json.
+
+The dataset may be the original JSON list, streamed JSONL (optionally
+gzip, see utils/dataset_stream.py) or a binary dataset directory (see
+utils/dataset_binary.py).
+
+Sharded dataset directories (see generate_dataset_sharded) and big JSONL
+files can be counted in parallel worker processes, see train_file().
+
+Usage: python -m models.markov_training_nth_order [order] [dataset] [output]
+           [--workers N] [--cache-dir DIR]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.dataset_stream import is_binary_dataset, is_jsonl, iter_dataset
+
+HARMONIC_FUNCTIONS = ["tonic", "predominant", "dominant"]
+
+FUNCTIONS = {
+    "C": "tonic", "Am": "tonic", "Em": "tonic",
+    "F": "predominant", "Dm": "predominant",
+    "G": "dominant", "Bdim": "dominant",
+}
+
+# Largest dense table (entries per mood) before switching to a sparse dict
+DENSE_LIMIT = 1 << 16
+
+def get_function(ch):
+    return FUNCTIONS.get(ch, "tonic")
+
+
+# ------------------------------------------------------
+# Count tables
+# ------------------------------------------------------
+
+class TransitionCounts:
+    """
+    Counts for one context length. Entry (mood, context, next) lives at
+    code = context_code * V + next_code, with the context encoded base V,
+    oldest function as the most significant digit.
+    """
+
+    def __init__(self, context_length, functions=HARMONIC_FUNCTIONS):
+        self.context_length = context_length
+        self.functions = list(functions)
+        self.size = len(self.functions) ** (context_length + 1)
+        self.dense = self.size <= DENSE_LIMIT
+        self.tables = {}
+
+    def _table(self, mood):
+        table = self.tables.get(mood)
+        if table is None:
+            table = array("Q", bytes(8 * self.size)) if self.dense else {}
+            self.tables[mood] = table
+        return table
+
+    def add(self, mood, code, count=1):
+        table = self._table(mood)
+        if self.dense:
+            table[code] += count
+        else:
+            table[code] = table.get(code, 0) + count
+
+    @classmethod
+    def from_arrays(cls, context_length, functions, moods, counts):
+        """
+        Wrap per-mood count arrays (shape (len(moods), V ** (j + 1)), same
+        code layout) as produced by BinaryDataset.transition_counts().
+        """
+        table = cls(context_length, functions)
+        for mood, row in zip(moods, counts):
+            if not row.any():
+                continue
+            if table.dense:
+                table.tables[mood] = array("Q", row.astype("uint64").tobytes())
+            else:
+                nonzero = row.nonzero()[0]
+                table.tables[mood] = dict(zip(nonzero.tolist(), row[nonzero].tolist()))
+        return table
+
+    def update(self, other):
+        """Add the counts of another table of the same context length (reduce step)."""
+        for mood in other.tables:
+            for code, count in other.items(mood):
+                self.add(mood, code, count)
+        return self
+
+    def to_json(self):
+        """Sparse {mood: [[code, count], ...]} for the shard count cache."""
+        return {mood: [[code, c] for code, c in self.items(mood)] for mood in self.tables}
+
+    @classmethod
+    def from_json(cls, context_length, functions, data):
+        table = cls(context_length, functions)
+        for mood, entries in data.items():
+            for code, count in entries:
+                table.add(mood, code, count)
+        return table
+
+    def items(self, mood):
+        """Yield (code, count) for every non-zero entry of a mood."""
+        table = self.tables[mood]
+        if self.dense:
+            return ((code, c) for code, c in enumerate(table) if c)
+        return table.items()
+
+    def decode_context(self, context_code):
+        V = len(self.functions)
+        context = []
+        for _ in range(self.context_length):
+            context_code, digit = divmod(context_code, V)
+            context.append(self.functions[digit])
+        return tuple(reversed(context))
+
+    def to_rows(self):
+        """Counts as {mood: {context_tuple: {next_func: count}}}."""
+        V = len(self.functions)
+        rows_by_mood = {}
+
+        for mood in self.tables:
+            rows = {}
+            for code, count in self.items(mood):
+                context_code, next_code = divmod(code, V)
+                row = rows.setdefault(context_code, {})
+                row[self.functions[next_code]] = count
+
+            rows_by_mood[mood] = {
+                self.decode_context(context_code): row
+                for context_code, row in sorted(rows.items())
+            }
+
+        return rows_by_mood
+
+    def to_probabilities(self):
+        """Normalize into {mood: {context_tuple: {next_func: prob}}}."""
+        prob_model = {}
+
+        for mood, rows in self.to_rows().items():
+            prob_model[mood] = {}
+            for context, row in rows.items():
+                total = sum(row.values())
+                prob_model[mood][context] = {
+                    next_func: count / total for next_func, count in row.items()
+                }
+
+        return prob_model
+
+
+# ------------------------------------------------------
+# Training
+# ------------------------------------------------------
+
+def count_transitions(data, order, functions=HARMONIC_FUNCTIONS):
+    """
+    Count every context length 1..order in a single pass.
+    Returns {context_length: TransitionCounts}.
+
+    A BinaryDataset is counted column-wise with numpy instead of sample by
+    sample.
+    """
+    codes = {f: i for i, f in enumerate(functions)}
+    V = len(functions)
+
+    if hasattr(data, "transition_counts"):
+        chord_functions = [codes[get_function(ch)] for ch in data.chords]
+        arrays = data.transition_counts(order, chord_functions, V)
+        return {
+            j: TransitionCounts.from_arrays(j, functions, data.moods, arrays[j])
+            for j in arrays
+        }
+    levels = {j: TransitionCounts(j, functions) for j in range(1, order + 1)}
+
+    for sample in data:
+        mood = sample["mood"]
+        func_seq = sample["functions"]
+        next_code = codes[get_function(sample["next_chord"])]
+
+        context_code = 0
+        place = 1
+        for j in range(1, min(order, len(func_seq)) + 1):
+            context_code += codes[func_seq[-j]] * place
+            place *= V
+            levels[j].add(mood, context_code * V + next_code)
+
+    return levels
+
+
+def normalize_levels(levels):
+    """{j: TransitionCounts} → {j: {mood: {context_tuple: {next_func: prob}}}}."""
+    return {j: counts.to_probabilities() for j, counts in levels.items()}
+
+
+def train(data, order, functions=HARMONIC_FUNCTIONS):
+    """Return {context_length: {mood: {context_tuple: {next_func: prob}}}}."""
+    return normalize_levels(count_transitions(data, order, functions))
+
+
+# ------------------------------------------------------
+# Model file format
+# ------------------------------------------------------
+
+def encode_key(context):
+    return "|".join(context)
+
+def encode_level(prob_model):
+    """Tuple keys → "f1|f2|..." strings (a bare function name for order 1)."""
+    return {
+        mood: {encode_key(context): next_probs for context, next_probs in transitions.items()}
+        for mood, transitions in prob_model.items()
+    }
+
+def encode_model(levels, functions=HARMONIC_FUNCTIONS):
+    return {
+        "order": max(levels),
+        "functions": list(functions),
+        "levels": {str(j): encode_level(levels[j]) for j in sorted(levels)},
+    }
+
+def load_dataset(path):
+    """
+    Iterate the samples of a dataset file. ".jsonl" / ".jsonl.gz" files are
+    streamed line by line, so training runs in constant memory. A binary
+    dataset directory is memory-mapped and counted with numpy.
+    """
+    if is_binary_dataset(path):
+        from utils.dataset_binary import BinaryDataset  # needs numpy
+        return BinaryDataset(path)
+    return iter_dataset(path)
+
+def save_model(levels, path, functions=HARMONIC_FUNCTIONS):
+    with open(path, "w") as f:
+        json.dump(encode_model(levels, functions), f, indent=2)
+
+def save_counts(levels, path, functions=HARMONIC_FUNCTIONS, merged_first_order=False):
+    """
+    Save raw counts in the same layout as the model file; this is the
+    snapshot format OnlineMarkovModel loads and keeps updating.
+
+    merged_first_order=True writes level 1 merged from level 2 as
+    build_backoff_index does, for models saved without their level 1
+    (markov_probabilities_2nd_order.json), so both back off alike.
+    """
+    rows = {j: counts.to_rows() for j, counts in levels.items()}
+    if merged_first_order:
+        from models.markov_backoff import first_order_counts
+        rows[1] = first_order_counts(rows[2])
+    with open(path, "w") as f:
+        json.dump(encode_model(rows, functions), f)
+
+
+# ------------------------------------------------------
+# Parallel map-reduce training
+# ------------------------------------------------------
+# map:    count one shard file (or one byte range of a big JSONL file)
+#         in a worker process → {j: TransitionCounts}
+# reduce: add the partial tables together
+# then normalize once. Per-shard counts can be cached on disk, so a
+# retrain after adding shards only counts the new ones.
+
+def merge_counts(total, partial):
+    for j, counts in partial.items():
+        if j in total:
+            total[j].update(counts)
+        else:
+            total[j] = counts
+    return total
+
+def iter_jsonl_range(path, start, end):
+    """Samples of an uncompressed JSONL file whose line starts in [start, end)."""
+    with open(path, "rb") as f:
+        if start > 0:
+            # Skip the line that began in the previous range
+            f.seek(start - 1)
+            f.readline()
+        pos = f.tell()
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            if line.strip():
+                yield json.loads(line)
+
+def split_jsonl(path, num_chunks):
+    size = os.path.getsize(path)
+    step = max(1, -(-size // num_chunks))
+    return [(start, min(start + step, size)) for start in range(0, size, step)]
+
+def _count_job(job):
+    path, order, byte_range, functions = job
+    if byte_range is None:
+        return count_transitions(load_dataset(path), order, functions)
+    return count_transitions(iter_jsonl_range(path, *byte_range), order, functions)
+
+def _cache_path(cache_dir, path, order):
+    """Shard name plus a hash of its absolute path: same-named shards of other directories don't collide."""
+    path = os.path.abspath(path.rstrip(os.sep))
+    digest = hashlib.sha1(path.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{os.path.basename(path)}.{digest}.order{order}.counts.json")
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+def load_cached_counts(cache_dir, path, order, functions=HARMONIC_FUNCTIONS):
+    """Return cached shard counts, or None when missing or stale."""
+    cache_file = _cache_path(cache_dir, path, order)
+    if not os.path.exists(cache_file):
+        return None
+
+    with open(cache_file, "r") as f:
+        cached = json.load(f)
+
+    if (
+        cached["source"] != _source_stamp(path)
+        or cached["order"] != order
+        or cached["functions"] != list(functions)
+    ):
+        return None
+
+    return {
+        int(j): TransitionCounts.from_json(int(j), cached["functions"], data)
+        for j, data in cached["levels"].items()
+    }
+
+def save_cached_counts(cache_dir, path, order, levels):
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = {
+        "source": _source_stamp(path),
+        "order": order,
+        "functions": levels[1].functions if levels else HARMONIC_FUNCTIONS,
+        "levels": {str(j): counts.to_json() for j, counts in levels.items()},
+    }
+    with open(_cache_path(cache_dir, path, order), "w") as f:
+        json.dump(cached, f)
+
+def dataset_shards(path):
+    """Shard files of a sharded dataset directory (manifest.json), else None."""
+    from utils.generate_dataset_no_ext import MANIFEST_FILE, shard_paths
+
+    if os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        return shard_paths(path)
+    return None
+
+def count_parallel(path, order, workers=None, cache_dir=None, functions=HARMONIC_FUNCTIONS):
+    """
+    Count a sharded dataset directory shard by shard, or an uncompressed
+    JSONL file chunk by chunk, in worker processes and reduce the results.
+    Shard counts are read from / written to cache_dir when given.
+    """
+    shards = dataset_shards(path)
+    total = {}
+    jobs = []
+
+    if shards is not None:
+        for shard in shards:
+            cached = load_cached_counts(cache_dir, shard, order, functions) if cache_dir else None
+            if cached is not None:
+                merge_counts(total, cached)
+            else:
+                jobs.append((shard, order, None, functions))
+    elif is_jsonl(path) and not path.endswith(".gz"):
+        num_chunks = 4 * (workers or os.cpu_count() or 1)
+        jobs = [(path, order, byte_range, functions) for byte_range in split_jsonl(path, num_chunks)]
+    else:
+        # Not splittable (gzip, JSON list, binary): a single job
+        jobs = [(path, order, None, functions)]
+
+    if not jobs:
+        return total
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for job, partial in zip(jobs, pool.map(_count_job, jobs)):
+            if cache_dir and shards is not None:
+                save_cached_counts(cache_dir, job[0], order, partial)
+            merge_counts(total, partial)
+
+    return total
+
+def count_file(path, order, workers=None, cache_dir=None, functions=HARMONIC_FUNCTIONS):
+    """
+    Count a dataset path. Sharded directories, and any dataset when workers
+    is set, go through the parallel map-reduce path.
+    """
+    if workers or dataset_shards(path) is not None:
+        return count_parallel(path, order, workers, cache_dir, functions)
+    return count_transitions(load_dataset(path), order, functions)
+
+def train_file(path, order, workers=None, cache_dir=None, functions=HARMONIC_FUNCTIONS):
+    """Count a dataset path, then normalize once all counts are merged."""
+    return normalize_levels(count_file(path, order, workers, cache_dir, functions))
+
+
+# ------------------------------------------------------
+# CLI
+# ------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train an N-order Markov function model.")
+    parser.add_argument("order", nargs="?", type=int, default=3)
+    parser.add_argument(
+        "dataset", nargs="?", default="chords_dataset.json",
+        help="dataset file, binary .chords directory or sharded dataset directory",
+    )
+    parser.add_argument("output", nargs="?", default="markov_probabilities_nth_order.json")
+    parser.add_argument("--workers", type=int, default=None, help="count in N worker processes")
+    parser.add_argument("--cache-dir", default=None, help="reuse per-shard counts across runs")
+    parser.add_argument("--counts", default=None, help="also save raw counts (online update snapshot)")
+    args = parser.parse_args()
+
+    print(f"Counting transitions up to order {args.order}...")
+    counts = count_file(args.dataset, args.order, args.workers, args.cache_dir)
+    levels = normalize_levels(counts)
+    print("Training + normalization complete.")
+
+    save_model(levels, args.output)
+    print(f"\nSaved: {args.output}")
+
+    if args.counts:
+        save_counts(counts, args.counts)
+        print(f"Saved counts: {args.counts}")
@@ -0,0 +1,335 @@
+"""
+Binary Markov model format, loaded with mmap.
+
+The JSON model files are parsed and their "f1|f2" keys decoded on every
+load. For big models (high orders, many moods or styles) that dominates
+cold start, so this format stores the probabilities as float32 arrays
+indexed by encoded context and the loader just maps the file: opening it
+is near-instant, rows are decoded when first looked up, and every process
+that maps the same file shares its pages.
+
+    python -m models.model_binary markov_probabilities_2nd_order.json markov_probabilities_2nd_order.bin
+
+    model = load_model("markov_probabilities_2nd_order.bin")   # models.load_model
+    model.sampler.sample("mixed", ("tonic", "dominant"))
+
+File layout (native byte order, recorded in the header):
+
+    b"MARKOVB1"                  magic
+    uint32                       header length
+    header (JSON)                version, order, functions, moods and,
+                                 for each level j, its layout and offsets
+    padding to 64 bytes
+    level arrays                 relative to the end of the padding
+
+A context of j functions is encoded base V (V = len(functions)), oldest
+function most significant, like TransitionCounts. Each level is either
+
+    dense   float32[moods, V ** j, V]        row = probabilities of the
+                                             next function, zeros = unseen
+    sparse  int64 keys[rows] (sorted)        key = mood * V ** j + context
+            float32[rows, V]
+
+Level 0 (uniform) is not stored. Probabilities are float32, so they match
+the JSON model to about 7 significant digits.
+"""
+
+import argparse
+import bisect
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+from array import array
+
+from models.markov_backoff import (
+    DEFAULT_MOOD,
+    HARMONIC_FUNCTIONS,
+    LEVEL_UNIFORM,
+    resolve_mood,
+    uniform_distribution,
+)
+from models.markov_sampler import AliasTable
+from models.model_store import BINARY_MODEL_SUFFIX, load_model
+
+MAGIC = b"MARKOVB1"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# A level is stored dense if at least this fraction of its rows is filled,
+# or if the dense array is small anyway
+DENSE_MIN_FILL = 0.25
+DENSE_MAX_SMALL_ROWS = 1 << 12
+
+
+def _align(n):
+    return -n % ALIGNMENT
+
+
+def _encode_context(context, function_codes, V):
+    code = 0
+    for func in context:
+        code = code * V + function_codes[func]
+    return code
+
+
+# ------------------------------------------------------
+# Export
+# ------------------------------------------------------
+
+def _level_rows(index, moods, level, function_codes):
+    """Sorted (key, row) pairs of one level; key = mood * V ** level + context."""
+    V = len(function_codes)
+    rows = []
+    for m, mood in enumerate(moods):
+        for context, probs in index[mood].get(level, {}).items():
+            if not probs:
+                continue
+            row = [0.0] * V
+            for func, p in probs.items():
+                row[function_codes[func]] = p
+            rows.append((m * V ** level + _encode_context(context, function_codes, V), row))
+    rows.sort()
+    return rows
+
+
+def save_binary_model(index, order, path, functions=HARMONIC_FUNCTIONS):
+    """
+    Write a backoff index (see markov_backoff.py) in the binary format.
+    The file is written to a temporary name and renamed, so processes that
+    have the old version mapped keep a consistent view.
+    """
+    functions = list(functions)
+    function_codes = {f: i for i, f in enumerate(functions)}
+    moods = list(index)
+    V = len(functions)
+    levels = sorted({lv for tables in index.values() for lv in tables if lv != LEVEL_UNIFORM})
+
+    level_meta = {}
+    blobs = []
+    offset = 0
+
+    for level in levels:
+        rows = _level_rows(index, moods, level, function_codes)
+        total_rows = len(moods) * V ** level
+
+        if total_rows <= DENSE_MAX_SMALL_ROWS or len(rows) >= DENSE_MIN_FILL * total_rows:
+            data = array("f", bytes(4 * total_rows * V))
+            for key, row in rows:
+                data[key * V:(key + 1) * V] = array("f", row)
+            level_meta[str(level)] = {"layout": "dense", "offset": offset, "rows": total_rows}
+            parts = [data.tobytes()]
+        else:
+            keys = array("q", (key for key, _ in rows))
+            data = array("f", (p for _, row in rows for p in row))
+            keys_bytes = keys.tobytes()
+            level_meta[str(level)] = {
+                "layout": "sparse",
+                "offset": offset,
+                "data_offset": offset + len(keys_bytes) + _align(len(keys_bytes)),
+                "rows": len(rows),
+            }
+            parts = [keys_bytes, bytes(_align(len(keys_bytes))), data.tobytes()]
+
+        for part in parts:
+            blobs.append(part)
+            offset += len(part)
+        blobs.append(bytes(_align(offset)))
+        offset += _align(offset)
+
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "order": order,
+        "functions": functions,
+        "moods": moods,
+        "levels": level_meta,
+    }).encode("utf-8")
+    prefix = MAGIC + struct.pack("<I", len(header)) + header
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(prefix)
+        f.write(bytes(_align(len(prefix))))
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+
+
+# ------------------------------------------------------
+# Loading
+# ------------------------------------------------------
+
+class MappedLevel:
+    """One level of a mapped model; row(key) returns V floats or None."""
+
+    def __init__(self, buf, meta, V):
+        self.V = V
+        self.layout = meta["layout"]
+        self.rows = meta["rows"]
+        if self.layout == "dense":
+            self.data = buf[meta["offset"]:meta["offset"] + 4 * self.rows * V].cast("f")
+            self.keys = None
+        else:
+            self.keys = buf[meta["offset"]:meta["offset"] + 8 * self.rows].cast("q")
+            self.data = buf[meta["data_offset"]:meta["data_offset"] + 4 * self.rows * V].cast("f")
+
+    def row(self, key):
+        if self.keys is not None:
+            i = bisect.bisect_left(self.keys, key)
+            if i == self.rows or self.keys[i] != key:
+                return None
+            key = i
+        row = self.data[key * self.V:(key + 1) * self.V].tolist()
+        return row if any(row) else None
+
+    def items(self):
+        """(key, row) for every stored non-empty row."""
+        for i in range(self.rows):
+            row = self.data[i * self.V:(i + 1) * self.V].tolist()
+            if any(row):
+                yield (self.keys[i] if self.keys is not None else i), row
+
+
+class MappedMarkovModel:
+    """
+    Read-only model backed by a memory-mapped binary file. Same interface
+    as model_store.MarkovModel (order, functions, moods, sampler, index),
+    but rows are only decoded when looked up.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a binary Markov model")
+        (header_len,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self._mmap[start:start + header_len].decode("utf-8"))
+
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written on a {header['byteorder']}-endian machine")
+
+        self.order = header["order"]
+        self.functions = header["functions"]
+        self.moods = header["moods"]
+        self.V = len(self.functions)
+        self.function_codes = {f: i for i, f in enumerate(self.functions)}
+        self.mood_codes = {m: i for i, m in enumerate(self.moods)}
+        self.uniform = uniform_distribution(self.functions)
+
+        data_start = start + header_len
+        buf = memoryview(self._mmap)[data_start + _align(data_start):]
+        self.levels = {
+            int(level): MappedLevel(buf, meta, self.V)
+            for level, meta in header["levels"].items()
+        }
+        self._sampler = None
+        self._index = None
+
+    def _probs(self, row):
+        return {self.functions[i]: p for i, p in enumerate(row) if p > 0}
+
+    def lookup(self, mood, context):
+        """(distribution, level) with the same backoff as lookup_next_probs."""
+        m = self.mood_codes.get(mood)
+        if m is None:
+            m = self.mood_codes[DEFAULT_MOOD]
+
+        context = tuple(context)
+        for level in sorted(self.levels, reverse=True):
+            if level > len(context):
+                continue
+            suffix = context[len(context) - level:]
+            if any(func not in self.function_codes for func in suffix):
+                continue
+            key = m * self.V ** level + _encode_context(suffix, self.function_codes, self.V)
+            row = self.levels[level].row(key)
+            if row is not None:
+                return self._probs(row), level
+
+        return self.uniform, LEVEL_UNIFORM
+
+    @property
+    def sampler(self):
+        if self._sampler is None:
+            self._sampler = MappedSampler(self)
+        return self._sampler
+
+    @property
+    def index(self):
+        """Full backoff index as dicts (decodes every row; for small models)."""
+        if self._index is None:
+            index = {mood: {LEVEL_UNIFORM: {(): dict(self.uniform)}} for mood in self.moods}
+            for level, mapped in self.levels.items():
+                stride = self.V ** level
+                for key, row in mapped.items():
+                    mood, code = divmod(key, stride)
+                    context = []
+                    for _ in range(level):
+                        code, f = divmod(code, self.V)
+                        context.append(self.functions[f])
+                    index[self.moods[mood]].setdefault(level, {})[tuple(reversed(context))] = self._probs(row)
+            self._index = index
+        return self._index
+
+    def close(self):
+        self.levels = {}
+        self._mmap.close()
+
+
+class MappedSampler:
+    """
+    CompiledSampler counterpart for a mapped model: alias tables are built
+    for a (mood, context) the first time it is sampled, not up front.
+    """
+
+    def __init__(self, model, rng=None):
+        self.model = model
+        self.rng = rng if rng is not None else random
+        self._resolved = {}
+
+    def seed(self, seed):
+        self.rng = random.Random(seed)
+
+    def resolve(self, mood, context):
+        mood = resolve_mood(self.model.mood_codes, mood)
+        memo_key = (mood, context)
+        hit = self._resolved.get(memo_key)
+        if hit is None:
+            probs, level = self.model.lookup(mood, context)
+            hit = self._resolved[memo_key] = (AliasTable(probs), level)
+        return hit
+
+    @property
+    def memo_size(self):
+        """Number of alias tables built so far."""
+        return len(self._resolved)
+
+    def sample(self, mood, context, return_level=False, rng=None):
+        table, level = self.resolve(mood, tuple(context))
+        next_func = table.draw(rng if rng is not None else self.rng)
+
+        if return_level:
+            return next_func, level
+        return next_func
+
+
+# ------------------------------------------------------
+# CLI: convert a JSON model
+# ------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a JSON Markov model to the binary format.")
+    parser.add_argument("model", help="JSON model written by one of the trainers")
+    parser.add_argument("output", nargs="?", help="default: same name with .bin")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.model)[0] + BINARY_MODEL_SUFFIX
+    model = load_model(args.model)
+    save_binary_model(model.index, model.order, output, model.functions)
+    print(f"Binary model saved to {output} ({os.path.getsize(output)} bytes)")
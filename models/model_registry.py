@@ -0,0 +1,273 @@
+"""
+Model registry: Markov models by (style, mood, order), loaded on demand.
+
+load_model() keeps every file it has read, which is right for the few
+models of data/ but not for a server hosting hundreds of styles. The
+registry locates a model file from (style, mood, order), decodes it on
+first use with the same loader (JSON, or mmap for ".bin") and keeps the
+decoded models and their compiled samplers in a bounded LRU: least
+recently used models are dropped once there are more than `max_models`
+of them or they hold more than `max_bytes`.
+
+Style models live in one directory per style under $MARKOV_STYLE_DIR
+(default data/styles), with the file names of data/:
+
+    styles/pop/markov_probabilities_2nd_order.json       every mood of pop
+    styles/ambient/markov_probabilities_2nd_order.bin    binary (preferred)
+    styles/edm/tension-drive/markov_probabilities_2nd_order.json
+                                                         one mood of edm
+
+A mood directory (the mood name in lower case, non-alphanumerics as "-")
+wins over the style's shared file; moods are otherwise the top-level keys
+of one file, as in data/. The "default" style is the usual model of
+model_store.find_model_file(). Order 1 and 2 use their own files, any
+higher order the N-order file.
+
+    from models.model_registry import REGISTRY
+    model = REGISTRY.get("pop", "mixed", 2)
+    model.sampler.sample("mixed", ("tonic", "dominant"))
+
+Memory is measured when a model is loaded, after its sampler is built
+(decoded rows and alias tables), and again whenever its sampler has
+memoized half as many new contexts since (mapped models build their alias
+tables on demand), so max_bytes holds as models warm up. Pages of mapped
+".bin" files belong to the OS page cache and are shared between processes,
+so they are not counted. The styles on disk are listed once, and new style
+directories or retrained files are picked up after clear().
+"""
+
+import functools
+import os
+import re
+import sys
+import types
+from array import array
+from collections import OrderedDict
+
+from models.markov_backoff import lookup_next_probs
+from models.model_store import BINARY_MODEL_SUFFIX, DEFAULT_MODEL_DIR, find_model_file, read_model
+
+STYLE_DIR_ENV = "MARKOV_STYLE_DIR"
+DEFAULT_STYLE_DIR = os.path.join(DEFAULT_MODEL_DIR, "styles")
+DEFAULT_STYLE = "default"
+
+MODEL_FILES = {
+    1: "markov_probabilities.json",
+    2: "markov_probabilities_2nd_order.json",
+}
+NTH_ORDER_FILE = "markov_probabilities_nth_order.json"
+
+# Style names are directory names: no separators or leading dots
+_STYLE_RE = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9_.-]*$")
+
+# LRU bounds
+MAX_MODELS = 256
+MAX_BYTES = 256 * 1024 * 1024
+
+# Memo entries a model may add before it is re-measured, on top of half
+# the entries it had at the last measurement
+MEMO_SLACK = 64
+
+
+# ------------------------------------------------------
+# Locating model files
+# ------------------------------------------------------
+
+@functools.lru_cache(maxsize=1024)
+def mood_dir_name(mood):
+    """"tension / drive" → "tension-drive"."""
+    return re.sub(r"[^a-z0-9]+", "-", str(mood).lower()).strip("-")
+
+
+def model_file(order):
+    return MODEL_FILES.get(order, NTH_ORDER_FILE)
+
+
+def _first_existing(path):
+    """The ".bin" conversion of a JSON path if present, else the path, else None."""
+    for candidate in (os.path.splitext(path)[0] + BINARY_MODEL_SUFFIX, path):
+        if os.path.exists(candidate):
+            return os.path.abspath(candidate)
+    return None
+
+
+# ------------------------------------------------------
+# Memory accounting
+# ------------------------------------------------------
+
+def deep_sizeof(obj, seen=None):
+    """Bytes held by obj and everything it references (shared objects once)."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, (type, types.ModuleType)):
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, array, memoryview)):
+        return size
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_sizeof(key, seen) + deep_sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_sizeof(item, seen)
+    else:
+        if hasattr(obj, "__dict__"):
+            size += deep_sizeof(vars(obj), seen)
+        for cls in type(obj).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if hasattr(obj, name):
+                    size += deep_sizeof(getattr(obj, name), seen)
+    return size
+
+
+def model_nbytes(model):
+    """Decoded model plus its sampler (built here if needed)."""
+    model.sampler
+    return deep_sizeof(model)
+
+
+def memo_size(model):
+    """Entries the model's sampler has memoized (0 if it keeps none)."""
+    return getattr(model.sampler, "memo_size", 0)
+
+
+# ------------------------------------------------------
+# Registry
+# ------------------------------------------------------
+
+class ModelRegistry:
+    """
+    (style, mood, order) → decoded model, with a bounded LRU of loaded
+    files. Moods sharing a file share one entry.
+    """
+
+    def __init__(self, style_dir=None, max_models=MAX_MODELS, max_bytes=MAX_BYTES):
+        self.style_dir = style_dir or os.environ.get(STYLE_DIR_ENV) or DEFAULT_STYLE_DIR
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+
+        # (style, order) -> ({mood dir name: path}, shared path or None),
+        # one entry per style found on disk whatever moods clients send
+        self._files = {}
+        # path -> [model, nbytes, sampler memo size when measured], least
+        # recently used first
+        self._models = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def _style_files(self, style, order):
+        """Model files of one style for `order`, listed on first use."""
+        key = (style, order)
+        files = self._files.get(key)
+        if files is None:
+            if not isinstance(style, str) or not _STYLE_RE.match(style):
+                raise ValueError(f"Invalid style name {style!r}")
+            filename = model_file(order)
+            by_mood = {}
+            if style == DEFAULT_STYLE:
+                shared = _first_existing(find_model_file(filename))
+            else:
+                style_path = os.path.join(self.style_dir, style)
+                if os.path.isdir(style_path):
+                    for name in sorted(os.listdir(style_path)):
+                        path = _first_existing(os.path.join(style_path, name, filename))
+                        if path is not None:
+                            by_mood[name] = path
+                shared = _first_existing(os.path.join(style_path, filename))
+            if not by_mood and shared is None:
+                raise FileNotFoundError(f"No order-{order} model for style {style!r}")
+            files = self._files[key] = (by_mood, shared)
+        return files
+
+    def locate(self, style, mood, order):
+        """
+        Path of the model file for (style, mood, order); FileNotFoundError
+        if there is none, ValueError for a malformed style name.
+        """
+        by_mood, shared = self._style_files(style, order)
+        path = by_mood.get(mood_dir_name(mood), shared) if by_mood else shared
+        if path is None:
+            raise FileNotFoundError(f"No order-{order} model for style {style!r}, mood {mood!r}")
+        return path
+
+    def get(self, style=DEFAULT_STYLE, mood="mixed", order=2):
+        """Decoded model (sampler compiled) for (style, mood, order)."""
+        path = self.locate(style, mood, order)
+        entry = self._models.get(path)
+        if entry is not None:
+            self._models.move_to_end(path)
+            self.hits += 1
+            model = entry[0]
+            # Samplers build alias tables lazily: re-measure once the memo
+            # has grown by half since the last measurement
+            if memo_size(model) > entry[2] * 1.5 + MEMO_SLACK:
+                self._measure(entry)
+                self._evict()
+            return model
+
+        model = read_model(path)
+        entry = self._models[path] = [model, 0, 0]
+        self._measure(entry)
+        self.loads += 1
+        self._evict()
+        return model
+
+    def _measure(self, entry):
+        self.nbytes -= entry[1]
+        entry[1] = model_nbytes(entry[0])
+        entry[2] = memo_size(entry[0])
+        self.nbytes += entry[1]
+
+    def sampler(self, style=DEFAULT_STYLE, mood="mixed", order=2):
+        return self.get(style, mood, order).sampler
+
+    def lookup(self, style, mood, context, order=2):
+        """(distribution, level) for `context`, as lookup_next_probs."""
+        model = self.get(style, mood, order)
+        if hasattr(model, "lookup"):
+            return model.lookup(mood, context)  # mapped: no full index
+        return lookup_next_probs(model.index, mood, context)
+
+    def _evict(self):
+        # The model just loaded is kept even if it alone exceeds max_bytes
+        while len(self._models) > 1 and (
+            len(self._models) > self.max_models or self.nbytes > self.max_bytes
+        ):
+            _, (_, nbytes, _) = self._models.popitem(last=False)
+            self.nbytes -= nbytes
+            self.evictions += 1
+
+    def __contains__(self, key):
+        """Whether (style, mood, order) is currently loaded."""
+        try:
+            return self.locate(*key) in self._models
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def __len__(self):
+        return len(self._models)
+
+    def clear(self):
+        """Drop every loaded model and listed style."""
+        self._files.clear()
+        self._models.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return {
+            "models": len(self._models),
+            "bytes": self.nbytes,
+            "max_models": self.max_models,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+
+# Shared by the generator and interactive modules
+REGISTRY = ModelRegistry()
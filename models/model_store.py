@@ -0,0 +1,204 @@
+"""
+Shared, lazily loaded Markov models.
+
+The generator and interactive modules used to open their model JSON at
+import time, relative to the working directory, and decode the "f1|f2"
+keys in every process. load_model() does that work once per file and
+caches the result by absolute path (a name is resolved the first time it
+is seen); the cache entry is reused as long as the file's mtime and size
+are unchanged, so a retrained model is picked up on the next call, for
+the cost of one stat. The generators hold their file in a ModelHandle and
+re-check it at the start of a progression, at most every
+MODEL_RECHECK_SECONDS. Binary ".bin" models are memory-mapped instead of
+parsed (see model_binary.py).
+
+    from models import load_model
+    model = load_model("markov_probabilities_2nd_order.json")
+    model.sampler.sample("mixed", ("tonic", "dominant"))
+
+Relative file names are looked up in the working directory first (the old
+behaviour), then in $MARKOV_MODEL_DIR, then in the repository's data/.
+
+For a pool of worker processes, call preload() in the parent before
+forking: the children inherit the decoded model and its alias tables
+through copy-on-write instead of parsing the JSON again.
+"""
+
+import gc
+import json
+import os
+import time
+
+from models.markov_backoff import (
+    HARMONIC_FUNCTIONS,
+    build_backoff_index,
+    build_first_order_index,
+    build_nth_order_index,
+)
+from models.markov_sampler import CompiledSampler
+
+MODEL_DIR_ENV = "MARKOV_MODEL_DIR"
+
+# Memory-mapped binary models (model_binary.py)
+BINARY_MODEL_SUFFIX = ".bin"
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# How often the generators call load_model() again to notice a retrained file
+MODEL_RECHECK_SECONDS = 1.0
+
+# abspath -> (mtime_ns, size, MarkovModel)
+_CACHE = {}
+# path as given -> abspath it resolved to
+_RESOLVED = {}
+
+
+# ------------------------------------------------------
+# Model object
+# ------------------------------------------------------
+
+class MarkovModel:
+    """
+    A decoded model file: backoff index (see markov_backoff.py), its order
+    and function vocabulary. The CompiledSampler is built on first use.
+    """
+
+    def __init__(self, index, order, functions=HARMONIC_FUNCTIONS, path=None):
+        self.index = index
+        self.order = order
+        self.functions = list(functions)
+        self.path = path
+        self._sampler = None
+
+    @property
+    def sampler(self):
+        if self._sampler is None:
+            self._sampler = CompiledSampler(self.index)
+        return self._sampler
+
+    @property
+    def moods(self):
+        return list(self.index)
+
+
+def decode_model(raw, path=None):
+    """
+    Build a MarkovModel from any of the JSON layouts the trainers write:
+    1st order {mood: {func: probs}}, 2nd order {mood: {"f1|f2": probs}} or
+    the N-order file with "order" and "levels". Chord-level models
+    ("kind": "chord", see markov_training_chords.py) decode to a
+    ChordMarkovModel.
+    """
+    if raw.get("kind") == "chord":
+        from models.chord_markov import ChordMarkovModel
+        return ChordMarkovModel(raw, path)
+
+    if "levels" in raw:
+        return MarkovModel(
+            build_nth_order_index(raw), raw["order"],
+            raw.get("functions", HARMONIC_FUNCTIONS), path,
+        )
+
+    second_order = any("|" in key for transitions in raw.values() for key in transitions)
+    if not second_order:
+        return MarkovModel(build_first_order_index(raw), 1, path=path)
+
+    prob_model = {
+        mood: {tuple(key_str.split("|")): next_probs for key_str, next_probs in transitions.items()}
+        for mood, transitions in raw.items()
+    }
+    return MarkovModel(build_backoff_index(prob_model), 2, path=path)
+
+
+# ------------------------------------------------------
+# Loading
+# ------------------------------------------------------
+
+def find_model_file(filename):
+    """Resolve a model file name (cwd, then $MARKOV_MODEL_DIR, then data/)."""
+    if os.path.isabs(filename) or os.path.exists(filename):
+        return filename
+
+    for directory in (os.environ.get(MODEL_DIR_ENV), DEFAULT_MODEL_DIR):
+        if directory and os.path.exists(os.path.join(directory, filename)):
+            return os.path.join(directory, filename)
+
+    return filename  # let open() report the missing file
+
+
+def read_model(path):
+    """Decode a model file without caching it (load_model() caches)."""
+    if path.endswith(BINARY_MODEL_SUFFIX):
+        from models.model_binary import MappedMarkovModel  # mmap, rows decoded on demand
+        return MappedMarkovModel(path)
+    with open(path, "r") as f:
+        return decode_model(json.load(f), path)
+
+
+def load_model(path):
+    """Decoded model for `path`, parsed once per (path, mtime, size)."""
+    resolved = _RESOLVED.get(path)
+    try:
+        st = os.stat(resolved)
+    except (TypeError, FileNotFoundError):  # first use, or the file went away
+        resolved = _RESOLVED[path] = os.path.abspath(find_model_file(path))
+        st = os.stat(resolved)
+    path = resolved
+
+    cached = _CACHE.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+
+    model = read_model(path)
+    _CACHE[path] = (st.st_mtime_ns, st.st_size, model)
+    return model
+
+
+class ModelHandle:
+    """
+    A generator's model file. get() returns the current model (read on
+    first use); refresh() goes through load_model() again, at most every
+    `interval` seconds, so a retrained file is picked up without a stat
+    per draw.
+
+        MODEL = ModelHandle("markov_probabilities.json")
+        model = MODEL.refresh()      # once per progression
+        MODEL.get().sampler          # per chord
+    """
+
+    def __init__(self, path, interval=MODEL_RECHECK_SECONDS):
+        self.path = path
+        self.interval = interval
+        self._model = None
+        self._checked = 0.0
+
+    def get(self):
+        if self._model is None:
+            return self.refresh()
+        return self._model
+
+    def refresh(self):
+        now = time.monotonic()
+        if self._model is None or now - self._checked >= self.interval:
+            self._model = load_model(self.path)
+            self._checked = now
+        return self._model
+
+
+def preload(*paths, freeze=True):
+    """
+    Load models (and their alias tables) before forking workers. With
+    freeze=True the loaded objects are moved out of the garbage collector's
+    reach (gc.freeze), so collections in the children don't write to the
+    shared pages.
+    """
+    models = [load_model(path) for path in paths]
+    for model in models:
+        model.sampler
+    if freeze:
+        gc.freeze()
+    return models
+
+
+def clear_cache():
+    _CACHE.clear()
+    _RESOLVED.clear()
@@ -0,0 +1,212 @@
+"""
+Tension-curve progressions by dynamic programming.
+
+Tests/test.py builds a progression that follows a tension curve
+(W = up, S = down, D = neutral) by filtering the allowed next chords at
+each step and picking one at random; at a dead end it silently drops the
+constraint. This module solves the same problem exactly: it computes,
+backwards over the curve, how much valid continuation every chord has
+left at every step, then samples forwards only among chords that can
+still complete the curve. Every draw satisfies the whole curve, and a
+curve that cannot be followed is reported before anything is sampled.
+
+    solver = TensionCurveSolver("C", length=8, curve="WSWDS")
+    solver.sample()            # one progression
+    solver.sample_batch(1000)  # many, from the same tables
+
+    solve_tension_curve("C", 8, "WSWDS", n=10, weighting="chain")
+
+weighting="uniform" draws uniformly among all valid progressions;
+weighting="chain" keeps the original random.choice transition
+probabilities, conditioned on following the curve.
+
+Tests/test.py imports its chord tables from here.
+"""
+
+import bisect
+import itertools
+import random
+
+# -----------------------------
+# Chord functions, rules and tension (shared with Tests/test.py)
+# -----------------------------
+base_functions = {
+    "C": ("Tonic", 1.0),
+    "Am": ("Tonic", 1.0),
+    "F": ("Predominant", 2.0),
+    "G": ("Dominant", 3.0),
+    "D": ("Secondary Dominant (V/V)", 3.5),
+    "E": ("Secondary Dominant (V/vi)", 3.5),
+    "A": ("Secondary Dominant (V/ii)", 3.5)
+}
+
+next_chord_map = {
+    "Tonic": ["F", "G", "C"],
+    "Predominant": ["G", "C"],
+    "Dominant": ["C", "D", "E", "A"],
+    "Secondary Dominant (V/V)": ["G"],
+    "Secondary Dominant (V/vi)": ["Am"],
+    "Secondary Dominant (V/ii)": ["D"]
+}
+
+def tension_with_extensions(chord_name, base_tension):
+    if chord_name in ["G", "D", "E", "A"]:  # Dominants + secondary dominants
+        return base_tension + 1.0
+    elif chord_name in ["C", "Am", "F"]:    # Tonic/Predominant color notes
+        return base_tension + 0.5
+    else:
+        return base_tension
+
+# Curve symbols; arrows are accepted too
+UP, DOWN, NEUTRAL = "W", "S", "D"
+CURVE_SYMBOLS = {"W": UP, "↑": UP, "S": DOWN, "↓": DOWN, "D": NEUTRAL, "→": NEUTRAL}
+
+# Largest tension difference that still counts as neutral
+NEUTRAL_TOLERANCE = 0.2
+
+
+class InfeasibleCurve(ValueError):
+    """No progression from the start chord follows the curve."""
+
+
+# ------------------------------------------------------
+# Feasible transitions, precomputed
+# ------------------------------------------------------
+
+def chord_tension(chord_name):
+    _, base = base_functions[chord_name]
+    return tension_with_extensions(chord_name, base)
+
+
+def _follows(change, current, nxt):
+    diff = chord_tension(nxt) - chord_tension(current)
+    if change == UP:
+        return diff > 0
+    if change == DOWN:
+        return diff < 0
+    return abs(diff) <= NEUTRAL_TOLERANCE
+
+
+def _build_transitions():
+    """
+    TRANSITIONS[change][chord] = ((next_chord, chain_probability), ...),
+    change None = unconstrained. chain_probability is the original
+    random.choice probability over next_chord_map.
+    """
+    transitions = {None: {}, UP: {}, DOWN: {}, NEUTRAL: {}}
+    for chord_name, (function, _) in base_functions.items():
+        allowed = next_chord_map.get(function, [])
+        options = [(nxt, 1.0 / len(allowed)) for nxt in allowed]
+        transitions[None][chord_name] = tuple(options)
+        for change in (UP, DOWN, NEUTRAL):
+            transitions[change][chord_name] = tuple(
+                (nxt, p) for nxt, p in options if _follows(change, chord_name, nxt)
+            )
+    return transitions
+
+
+TRANSITIONS = _build_transitions()
+
+
+def parse_curve(curve):
+    """'WSD' / '↑↓→' / list of symbols → list of W/S/D."""
+    try:
+        return [CURVE_SYMBOLS[ch.upper()] for ch in curve]
+    except KeyError as exc:
+        raise ValueError(f"Unknown tension curve symbol {exc.args[0]!r} (use W, S or D)") from None
+
+
+# ------------------------------------------------------
+# Solver
+# ------------------------------------------------------
+
+class TensionCurveSolver:
+    """
+    Backward tables for one (start chord, length, curve). Step i (from
+    chord i to chord i + 1) follows curve[i]; steps past the end of the
+    curve are unconstrained, like in Tests/test.py.
+    """
+
+    def __init__(self, start_chord, length, curve, weighting="uniform"):
+        if start_chord not in base_functions:
+            raise ValueError(f"Unknown chord {start_chord!r}")
+        if weighting not in ("uniform", "chain"):
+            raise ValueError("weighting must be 'uniform' or 'chain'")
+
+        self.start_chord = start_chord
+        self.length = length
+        changes = parse_curve(curve)[:max(length - 1, 0)]
+        self.changes = changes + [None] * (max(length - 1, 0) - len(changes))
+        self.weighting = weighting
+
+        self._check_reachable()
+
+        # beta[t][chord] ∝ total weight of valid completions from chord at
+        # position t (rescaled per step, so long curves don't underflow)
+        chords = list(base_functions)
+        beta = [None] * max(length, 1)
+        beta[-1] = dict.fromkeys(chords, 1.0)
+        for t in range(length - 2, -1, -1):
+            row = {
+                ch: sum(self._weight(p) * beta[t + 1][nxt] for nxt, p in TRANSITIONS[self.changes[t]][ch])
+                for ch in chords
+            }
+            scale = max(row.values()) or 1.0
+            beta[t] = {ch: w / scale for ch, w in row.items()}
+
+        # Cumulative next-chord tables per (step, chord), for bisect sampling
+        self._tables = []
+        for t in range(length - 1):
+            tables = {}
+            for ch in chords:
+                options = [
+                    (nxt, self._weight(p) * beta[t + 1][nxt])
+                    for nxt, p in TRANSITIONS[self.changes[t]][ch]
+                ]
+                options = [(nxt, w) for nxt, w in options if w > 0]
+                if options:
+                    tables[ch] = (
+                        [nxt for nxt, _ in options],
+                        list(itertools.accumulate(w for _, w in options)),
+                    )
+            self._tables.append(tables)
+
+    def _weight(self, p):
+        return p if self.weighting == "chain" else 1.0
+
+    def _check_reachable(self):
+        """Forward pass over the reachable chords: fail at the first dead end."""
+        reachable = {self.start_chord}
+        for t, change in enumerate(self.changes):
+            reachable = {
+                nxt for ch in reachable for nxt, _ in TRANSITIONS[change][ch]
+            }
+            if not reachable:
+                curve = "".join(c or "-" for c in self.changes)
+                raise InfeasibleCurve(
+                    f"No progression from {self.start_chord} follows {curve!r}: "
+                    f"dead end at step {t + 1} ({change})"
+                )
+
+    def sample(self, rng=None):
+        rng = rng or random
+        progression = [self.start_chord]
+        for tables in self._tables:
+            chords, cumulative = tables[progression[-1]]
+            u = rng.random() * cumulative[-1]
+            progression.append(chords[bisect.bisect_right(cumulative, u)])
+        return progression
+
+    def sample_batch(self, n, rng=None):
+        return [self.sample(rng) for _ in range(n)]
+
+
+def solve_tension_curve(start_chord, length, curve, n=None, weighting="uniform", rng=None):
+    """
+    One progression following `curve` (or a list of n of them). Raises
+    InfeasibleCurve right away if the curve cannot be followed.
+    """
+    solver = TensionCurveSolver(start_chord, length, curve, weighting)
+    if n is None:
+        return solver.sample(rng)
+    return solver.sample_batch(n, rng)
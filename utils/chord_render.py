@@ -0,0 +1,113 @@
+"""
+Shared MIDI rendering with a memoized ChordSymbol cache.
+
+Parsing a chord symbol with harmony.ChordSymbol is the dominant cost of
+music21 rendering, and extended symbols ("G7", "Am9", "Fmaj7", ...) make
+the vocabulary larger. ChordSymbolCache parses each symbol once, keeps the
+parsed object as a template and hands out deep copies of it; the resolved
+MIDI note numbers are cached alongside. The cache is a bounded LRU with
+hit/miss counters, so long-running services don't grow without limit.
+
+Progressions made only of the project's diatonic chords skip music21
+entirely (see midi_writer.py). music21 itself is imported on first use, so
+importing this module (and the generators that use it) stays cheap.
+"""
+
+import copy
+from collections import OrderedDict
+
+from utils.midi_writer import QUARTER_LENGTH, can_render, progression_to_midi, write_bytes
+
+DEFAULT_CACHE_SIZE = 512
+
+
+def music21_symbol(symbol):
+    """music21 spells flats with "-": "Bb7" → "B-7", "Ebbm" → "E--m"."""
+    if symbol[1:3] == "bb":
+        return symbol[0] + "--" + symbol[3:]
+    if symbol[1:2] == "b":
+        return symbol[0] + "-" + symbol[2:]
+    return symbol
+
+
+class ChordSymbolCache:
+    """Bounded LRU cache: chord symbol string → parsed ChordSymbol template."""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._templates = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _entry(self, symbol):
+        entry = self._templates.get(symbol)
+        if entry is not None:
+            self.hits += 1
+            self._templates.move_to_end(symbol)
+            return entry
+
+        self.misses += 1
+        from music21 import harmony  # slow import, only when actually rendering
+        template = harmony.ChordSymbol(music21_symbol(symbol))
+        entry = (template, tuple(p.midi for p in template.pitches))
+        self._templates[symbol] = entry
+
+        if len(self._templates) > self.maxsize:
+            self._templates.popitem(last=False)
+            self.evictions += 1
+
+        return entry
+
+    def chord_symbol(self, symbol, quarter_length=QUARTER_LENGTH):
+        """A fresh ChordSymbol cloned from the cached template."""
+        cs = copy.deepcopy(self._entry(symbol)[0])
+        cs.quarterLength = quarter_length
+        return cs
+
+    def midi_pitches(self, symbol):
+        """MIDI note numbers of a symbol, lowest first."""
+        return self._entry(symbol)[1]
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._templates),
+            "maxsize": self.maxsize,
+        }
+
+    def clear(self):
+        self._templates.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+# Shared by every render_midi in the project
+CHORD_CACHE = ChordSymbolCache()
+
+
+def progression_to_stream(progression, quarter_length=QUARTER_LENGTH, cache=CHORD_CACHE):
+    from music21 import stream
+    s = stream.Stream()
+    for ch in progression:
+        s.append(cache.chord_symbol(ch, quarter_length))
+    return s
+
+
+def render_midi_bytes(progression, cache=CHORD_CACHE):
+    """
+    SMF bytes for a progression: written directly when every chord is in
+    the precomputed table, otherwise through music21 with cached symbols.
+    """
+    if can_render(progression):
+        return progression_to_midi(progression)
+
+    from music21 import midi
+    s = progression_to_stream(progression, cache=cache)
+    return midi.translate.streamToMidiFile(s).writestr()
+
+
+def render_midi_file(progression, target, cache=CHORD_CACHE):
+    """Render to a file path or a binary buffer (e.g. io.BytesIO)."""
+    write_bytes(render_midi_bytes(progression, cache), target)
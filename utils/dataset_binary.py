@@ -0,0 +1,241 @@
+"""
+Compact columnar dataset format.
+
+The JSON/JSONL datasets store one record per (prefix, next chord), so a
+session of length L is written L - 1 times with growing context lists. The
+binary format stores every progression once, as flat arrays in a directory
+(named "*.chords", BINARY_DATASET_SUFFIX):
+
+    chords.i8    int8   chord code of every token, sessions back to back
+    offsets.i64  int64  start of each session in chords.i8 (+ final end)
+    moods.i8     int8   mood code of each session
+    meta.json           chord vocabulary (+ function of each chord),
+                        mood names and sizes; written last, only when the
+                        writer finished without an error
+
+All three arrays are raw native-endian files, so BinaryDataset opens them
+with numpy.memmap and even a 100M-token corpus "loads" instantly. Training
+samples (prefix → next chord) are derived on the fly.
+
+Memory-mapped reading and column-wise counting use numpy.
+"""
+
+import json
+import os
+import sys
+from array import array
+
+import numpy as np
+
+from utils.dataset_stream import BINARY_META_FILE as META_FILE
+
+CHORDS_FILE = "chords.i8"
+OFFSETS_FILE = "offsets.i64"
+MOODS_FILE = "moods.i8"
+
+FORMAT_VERSION = 1
+
+# Tokens buffered in memory by the writer before each flush
+FLUSH_TOKENS = 1 << 16
+
+
+# ------------------------------------------------------
+# Writer
+# ------------------------------------------------------
+
+class BinaryDatasetWriter:
+    """
+    Append sessions one at a time; buffers are flushed to disk every
+    FLUSH_TOKENS tokens, so memory use is constant.
+
+        with BinaryDatasetWriter("chords_dataset.chords", KEY_CHORDS, MOODS, FUNCTIONS) as w:
+            w.add_session("mixed", ["C", "F", "G", "C"])
+
+    `functions` maps chord → harmonic function and is stored in meta.json.
+    If the with-block raises, the files are closed without meta.json, so
+    the partial directory is not mistaken for a dataset.
+    """
+
+    def __init__(self, path, chords, moods, functions):
+        if len(chords) > 127 or len(moods) > 127:
+            raise ValueError("int8 codes support at most 127 chords and 127 moods")
+
+        os.makedirs(path, exist_ok=True)
+        # An older dataset's meta.json must not describe the files rewritten below
+        if os.path.exists(os.path.join(path, META_FILE)):
+            os.remove(os.path.join(path, META_FILE))
+        self.path = path
+        self.chords = list(chords)
+        self.moods = list(moods)
+        self.functions = [functions[ch] for ch in self.chords]
+        self.chord_codes = {ch: i for i, ch in enumerate(self.chords)}
+        self.mood_codes = {m: i for i, m in enumerate(self.moods)}
+
+        self._files = {
+            name: open(os.path.join(path, name), "wb")
+            for name in (CHORDS_FILE, OFFSETS_FILE, MOODS_FILE)
+        }
+        self._chords = array("b")
+        self._offsets = array("q", [0])
+        self._moods = array("b")
+
+        self.num_sessions = 0
+        self.num_tokens = 0
+
+    def add_session(self, mood, progression):
+        self._chords.extend(self.chord_codes[ch] for ch in progression)
+        self.num_tokens += len(progression)
+        self.num_sessions += 1
+        self._offsets.append(self.num_tokens)
+        self._moods.append(self.mood_codes[mood])
+
+        if len(self._chords) >= FLUSH_TOKENS:
+            self.flush()
+
+    def flush(self):
+        for name, buf in (
+            (CHORDS_FILE, self._chords),
+            (OFFSETS_FILE, self._offsets),
+            (MOODS_FILE, self._moods),
+        ):
+            buf.tofile(self._files[name])
+            del buf[:]
+
+    def _close_files(self):
+        for f in self._files.values():
+            f.close()
+
+    def close(self):
+        self.flush()
+        self._close_files()
+
+        meta = {
+            "version": FORMAT_VERSION,
+            "byteorder": sys.byteorder,
+            "chords": self.chords,
+            "functions": self.functions,
+            "moods": self.moods,
+            "num_sessions": self.num_sessions,
+            "num_tokens": self.num_tokens,
+        }
+        with open(os.path.join(self.path, META_FILE), "w") as f:
+            json.dump(meta, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._close_files()
+
+
+# ------------------------------------------------------
+# Reader
+# ------------------------------------------------------
+
+class BinaryDataset:
+    """Memory-mapped view of a binary dataset directory."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, META_FILE), "r") as f:
+            meta = json.load(f)
+
+        if meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written on a {meta['byteorder']}-endian machine")
+
+        self.path = path
+        self.chords = meta["chords"]
+        self.functions = meta["functions"]
+        self.moods = meta["moods"]
+        self.num_sessions = meta["num_sessions"]
+        self.num_tokens = meta["num_tokens"]
+
+        self.chord_codes = self._memmap(CHORDS_FILE, np.int8, self.num_tokens)
+        self.offsets = self._memmap(OFFSETS_FILE, np.int64, self.num_sessions + 1)
+        self.mood_codes = self._memmap(MOODS_FILE, np.int8, self.num_sessions)
+
+    def _memmap(self, name, dtype, length):
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode="r", shape=(length,))
+
+    def __len__(self):
+        """Number of (prefix → next chord) samples."""
+        return self.num_tokens - self.num_sessions
+
+    def session(self, i):
+        """Return (mood, progression) for session i."""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return (
+            self.moods[self.mood_codes[i]],
+            [self.chords[c] for c in self.chord_codes[start:end]],
+        )
+
+    def iter_samples(self):
+        """
+        Derive the classic per-prefix samples on the fly, in the same order
+        and layout as the JSON dataset.
+        """
+        chord_function = dict(zip(self.chords, self.functions))
+        for i in range(self.num_sessions):
+            mood, progression = self.session(i)
+            functions = [chord_function[ch] for ch in progression]
+            for t in range(1, len(progression)):
+                yield {
+                    "context": progression[:t],
+                    "functions": functions[:t],
+                    "mood": mood,
+                    "next_chord": progression[t],
+                }
+
+    def _session_chunks(self, chunk_tokens):
+        """Yield (first_session, last_session + 1) ranges of ~chunk_tokens."""
+        first = 0
+        while first < self.num_sessions:
+            target = self.offsets[first] + chunk_tokens
+            last = int(np.searchsorted(self.offsets, target, side="right")) - 1
+            last = min(max(last, first + 1), self.num_sessions)
+            yield first, last
+            first = last
+
+    def transition_counts(self, order, chord_functions, num_functions, chunk_tokens=1 << 22):
+        """
+        Count (last j functions → next function) for every j = 1..order.
+
+        chord_functions maps each chord code of this dataset to a function
+        code. Returns {j: array of shape (len(moods), V ** (j + 1))}, indexed
+        by context_code * V + next_code (oldest function most significant),
+        the same layout as TransitionCounts.
+        """
+        V = num_functions
+        chord_functions = np.asarray(chord_functions, dtype=np.int64)
+        counts = {
+            j: np.zeros(len(self.moods) * V ** (j + 1), dtype=np.int64)
+            for j in range(1, order + 1)
+        }
+
+        for first, last in self._session_chunks(chunk_tokens):
+            start, end = int(self.offsets[first]), int(self.offsets[last])
+            funcs = chord_functions[np.asarray(self.chord_codes[start:end])]
+
+            lengths = np.diff(np.asarray(self.offsets[first:last + 1]))
+            session_start = np.repeat(np.asarray(self.offsets[first:last]) - start, lengths)
+            position = np.arange(end - start) - session_start
+            moods = np.repeat(np.asarray(self.mood_codes[first:last], dtype=np.int64), lengths)
+
+            context = np.zeros(end - start, dtype=np.int64)
+            place = 1
+            for j in range(1, order + 1):
+                # Shift by j: function j steps back, only inside the session
+                shifted = np.zeros_like(funcs)
+                shifted[j:] = funcs[:-j]
+                context += shifted * place
+                place *= V
+
+                valid = position >= j
+                codes = (moods[valid] * V ** j + context[valid]) * V + funcs[valid]
+                counts[j] += np.bincount(codes, minlength=counts[j].size)
+
+        return {j: c.reshape(len(self.moods), V ** (j + 1)) for j, c in counts.items()}
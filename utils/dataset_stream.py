@@ -0,0 +1,88 @@
+"""
+Streaming dataset I/O.
+
+Datasets can be stored as newline-delimited JSON (one sample per line,
+".jsonl"), optionally gzip-compressed (".jsonl.gz"). Writers consume an
+iterator and readers yield one sample at a time, so neither side ever
+holds the whole dataset in memory. Plain ".json" files (a single list, the
+original format) are still readable, and so are binary dataset
+directories (see dataset_binary.py), whose samples are derived on the fly.
+"""
+
+import gzip
+import io
+import json
+import os
+
+# Marker file of a binary dataset directory (dataset_binary.py)
+BINARY_META_FILE = "meta.json"
+# Name suffix that selects the binary format when writing a dataset
+# (".bin" is taken by the binary model files of model_binary.py)
+BINARY_DATASET_SUFFIX = ".chords"
+
+
+def is_jsonl(path):
+    return str(path).endswith((".jsonl", ".jsonl.gz", ".ndjson", ".ndjson.gz"))
+
+
+def is_binary_dataset(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, BINARY_META_FILE))
+
+
+class ReproducibleGzipWriter(gzip.GzipFile):
+    """
+    GzipFile that leaves the file name and mtime out of the header, so the
+    same content always gives the same bytes whatever the path or time.
+    """
+
+    def __init__(self, path, mode="wb"):
+        self._raw = open(path, mode)
+        super().__init__(filename="", mode=mode, fileobj=self._raw, mtime=0)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._raw.close()
+
+
+def open_text(path, mode="r"):
+    """Open a text file, transparently gzip-compressed if it ends with .gz."""
+    if str(path).endswith(".gz"):
+        if mode == "r":
+            return gzip.open(path, "rt", encoding="utf-8")
+        return io.TextIOWrapper(ReproducibleGzipWriter(path, mode + "b"), encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_jsonl(samples, path):
+    """Write samples one line at a time. Returns the number written."""
+    count = 0
+    with open_text(path, "w") as f:
+        for sample in samples:
+            f.write(json.dumps(sample, separators=(",", ":")))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def iter_jsonl(path):
+    with open_text(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_dataset(path):
+    """
+    Yield the samples of a dataset file. JSONL files are streamed with
+    constant memory; legacy .json lists are loaded and then iterated.
+    """
+    if is_binary_dataset(path):
+        from utils.dataset_binary import BinaryDataset  # needs numpy
+        yield from BinaryDataset(path).iter_samples()
+    elif is_jsonl(path):
+        yield from iter_jsonl(path)
+    else:
+        with open_text(path) as f:
+            yield from json.load(f)
@@ -1,5 +1,12 @@
+import argparse
+import hashlib
 import json
+import os
 import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+from utils.dataset_stream import BINARY_DATASET_SUFFIX, is_binary_dataset, is_jsonl, iter_dataset, write_jsonl
 
 # ------------------------------------------------------
 # Functional Harmony Knowledge
@@ -66,16 +73,15 @@ def suggest_next(prev_chord, mood_filter):
 # Dataset generation
 # ------------------------------------------------------
 
-def generate_dataset(
-    num_sessions=500,
-    max_length=8,
-    output_file="chords_dataset.json"
-):
-    dataset = []
-
+def iter_sessions(num_sessions=500, max_length=8, rng=random):
+    """
+    Yield (mood, progression) for each synthetic session.
+    rng defaults to the global random module; pass a random.Random to make
+    the output reproducible.
+    """
     for _ in range(num_sessions):
-        mood = random.choice(MOODS)
-        progression = [random.choice(KEY_CHORDS)]
+        mood = rng.choice(MOODS)
+        progression = [rng.choice(KEY_CHORDS)]
 
         for step in range(1, max_length):
             prev = progression[-1]
@@ -84,28 +90,214 @@ def generate_dataset(
             if not suggestions:
                 break
 
-            next_chord = random.choice(suggestions)
+            next_chord = rng.choice(suggestions)
+            progression.append(next_chord)
 
-            # Store clean AI training sample
-            example = {
-                "context": progression.copy(),
-                "functions": [get_function(ch) for ch in progression],
-                "mood": mood,
-                "next_chord": next_chord
-            }
-            dataset.append(example)
+        yield mood, progression
 
-            progression.append(next_chord)
+def session_samples(mood, progression):
+    """Expand one session into its (context → next chord) training samples."""
+    functions = [get_function(ch) for ch in progression]
+
+    for t in range(1, len(progression)):
+        # Store clean AI training sample
+        yield {
+            "context": progression[:t],
+            "functions": functions[:t],
+            "mood": mood,
+            "next_chord": progression[t]
+        }
+
+def sample_sessions(samples):
+    """
+    Inverse of session_samples(): rebuild (mood, progression) from samples
+    in dataset order (a session's samples are consecutive, the first with a
+    one-chord context). One-chord sessions have no samples and are lost.
+    """
+    mood = progression = None
+    for sample in samples:
+        context = sample["context"]
+        if len(context) == 1:
+            if progression is not None:
+                yield mood, progression
+            mood, progression = sample["mood"], list(context)
+        elif context != progression:
+            raise ValueError("Samples are not grouped by session")
+        progression.append(sample["next_chord"])
+
+    if progression is not None:
+        yield mood, progression
 
+def iter_samples(num_sessions=500, max_length=8, rng=random):
+    """Yield training samples one at a time, session by session."""
+    for mood, progression in iter_sessions(num_sessions, max_length, rng):
+        yield from session_samples(mood, progression)
+
+def write_dataset(output_file, num_sessions=500, max_length=8, rng=random):
+    """
+    Generate and save a dataset; returns the number of samples.
+
+    A ".jsonl" / ".jsonl.gz" output_file is written incrementally (constant
+    memory); a ".chords" output_file is a compact binary dataset directory
+    storing each progression once (see dataset_binary.py); ".json" keeps
+    the original single indented list.
+    """
+    if str(output_file).endswith(BINARY_DATASET_SUFFIX):
+        from utils.dataset_binary import BinaryDatasetWriter
+
+        with BinaryDatasetWriter(output_file, KEY_CHORDS, MOODS, FUNCTIONS) as writer:
+            for mood, progression in iter_sessions(num_sessions, max_length, rng):
+                writer.add_session(mood, progression)
+        return writer.num_tokens - writer.num_sessions
+
+    return save_samples(iter_samples(num_sessions, max_length, rng), output_file)
+
+def save_samples(samples, output_file):
+    """Write per-prefix samples as JSONL (streamed) or a JSON list."""
+    if is_jsonl(output_file):
+        return write_jsonl(samples, output_file)
+
+    dataset = list(samples)
     with open(output_file, "w") as f:
         json.dump(dataset, f, indent=2)
+    return len(dataset)
+
+def generate_dataset(
+    num_sessions=500,
+    max_length=8,
+    output_file="chords_dataset.json"
+):
+    count = write_dataset(output_file, num_sessions, max_length)
 
-    print(f"Dataset created: {len(dataset)} samples")
+    print(f"Dataset created: {count} samples")
     print(f"Saved as: {output_file}")
 
+# ------------------------------------------------------
+# Sharded parallel generation
+# ------------------------------------------------------
+
+MANIFEST_FILE = "manifest.json"
+
+def shard_seed(master_seed, shard):
+    """Derive a stable per-shard seed (independent of Python's hash salt)."""
+    digest = hashlib.sha256(f"{master_seed}:{shard}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+def split_sessions(num_sessions, num_shards):
+    base, extra = divmod(num_sessions, num_shards)
+    return [base + (1 if i < extra else 0) for i in range(num_shards)]
+
+def _generate_shard(job):
+    shard, output_file, num_sessions, max_length, seed = job
+    rng = random.Random(seed)
+    count = write_dataset(output_file, num_sessions, max_length, rng)
+    return {
+        "shard": shard,
+        "file": os.path.basename(output_file),
+        "seed": seed,
+        "sessions": num_sessions,
+        "samples": count,
+    }
+
+def generate_dataset_sharded(
+    num_sessions=10000,
+    max_length=8,
+    output_dir="chords_dataset_shards",
+    num_shards=8,
+    seed=0,
+    workers=None,
+    suffix=".jsonl.gz"
+):
+    """
+    Split num_sessions over num_shards shards generated in parallel by a
+    ProcessPoolExecutor. Shard i uses random.Random(shard_seed(seed, i)) and
+    writes output_dir/shard-0000i<suffix>; manifest.json lists every shard.
+
+    The output only depends on (seed, num_shards), never on the number of
+    workers or on scheduling order. Returns the manifest dict.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = [
+        (i, os.path.join(output_dir, f"shard-{i:05d}{suffix}"), n, max_length, shard_seed(seed, i))
+        for i, n in enumerate(split_sessions(num_sessions, num_shards))
+    ]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        shards = list(pool.map(_generate_shard, jobs))
+
+    manifest = {
+        "seed": seed,
+        "num_shards": num_shards,
+        "num_sessions": num_sessions,
+        "max_length": max_length,
+        "samples": sum(s["samples"] for s in shards),
+        "shards": shards,
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"Dataset created: {manifest['samples']} samples in {num_shards} shards")
+    print(f"Manifest: {os.path.join(output_dir, MANIFEST_FILE)}")
+    return manifest
+
+def load_manifest(output_dir):
+    with open(os.path.join(output_dir, MANIFEST_FILE), "r") as f:
+        return json.load(f)
+
+def shard_paths(output_dir):
+    """Shard files of a sharded dataset, in shard order."""
+    manifest = load_manifest(output_dir)
+    return [os.path.join(output_dir, s["file"]) for s in manifest["shards"]]
+
+def merge_shards(output_dir, output_file):
+    """
+    Concatenate the shards of output_dir, in shard order, into one dataset
+    file (any format write_dataset() supports, whatever the shards' format).
+    Returns the sample count.
+    """
+    paths = shard_paths(output_dir)
+
+    if str(output_file).endswith(BINARY_DATASET_SUFFIX):
+        from utils.dataset_binary import BinaryDataset, BinaryDatasetWriter
+
+        with BinaryDatasetWriter(output_file, KEY_CHORDS, MOODS, FUNCTIONS) as writer:
+            for path in paths:
+                if is_binary_dataset(path):
+                    shard = BinaryDataset(path)
+                    sessions = (shard.session(i) for i in range(shard.num_sessions))
+                else:
+                    sessions = sample_sessions(iter_dataset(path))
+                for mood, progression in sessions:
+                    writer.add_session(mood, progression)
+        return writer.num_tokens - writer.num_sessions
+
+    samples = chain.from_iterable(iter_dataset(path) for path in paths)
+    return save_samples(samples, output_file)
+
 # ------------------------------------------------------
 # RUN
 # ------------------------------------------------------
 
 if __name__ == "__main__":
-    generate_dataset(num_sessions=10000, max_length=8)
+    parser = argparse.ArgumentParser(description="Generate the synthetic chord dataset.")
+    parser.add_argument(
+        "output", nargs="?", default="chords_dataset.json",
+        help=".json, .jsonl(.gz) or .chords (binary); with --shards, an output directory",
+    )
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--max-length", type=int, default=8)
+    parser.add_argument("--shards", type=int, default=0, help="generate N shards in parallel")
+    parser.add_argument("--seed", type=int, default=0, help="master seed for sharded mode")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--suffix", default=".jsonl.gz", help="shard file format")
+    args = parser.parse_args()
+
+    if args.shards:
+        generate_dataset_sharded(
+            args.sessions, args.max_length, args.output,
+            num_shards=args.shards, seed=args.seed,
+            workers=args.workers, suffix=args.suffix,
+        )
+    else:
+        generate_dataset(args.sessions, args.max_length, args.output)
@@ -0,0 +1,295 @@
+"""
+Opt-in instrumentation for the generators.
+
+Off by default: the decorators below return the function unchanged, so a
+normal run pays nothing. Set an environment variable before starting
+Python to turn it on:
+
+    MARKOV_METRICS=1                  collect counters + latency histograms
+    MARKOV_METRICS=metrics.prom       ... and write them there at exit
+    MARKOV_PROFILE=run.pstats         cProfile the whole run, pstats file at exit
+
+    MARKOV_METRICS=metrics.prom python -m models.generate_with_markov_2nd_order
+    python -m pstats run.pstats
+
+What is collected (Prometheus text format, see render_prometheus()):
+
+    markov_calls_total{model, function}           calls of each wrapped function
+    markov_latency_seconds{model, function}       latency histogram per function
+    markov_backoff_level_total{model, level}      sampling draws per backoff level
+                                                  (level 1 in a 2nd-order model is
+                                                  the 1st-order fallback, 0 uniform)
+    markov_sample_seconds{model, level}           sampling latency per backoff level
+    markov_unknown_chord_total{model}             get_function() defaulting to tonic
+
+The decision is taken when a module is imported; call enable() before
+importing the generators to turn it on from code.
+"""
+
+import atexit
+import bisect
+import functools
+import os
+import time
+from collections import deque
+
+METRICS_ENV = "MARKOV_METRICS"
+PROFILE_ENV = "MARKOV_PROFILE"
+
+ENABLED = os.environ.get(METRICS_ENV, "") not in ("", "0")
+
+# Histogram bucket upper bounds, seconds (1 µs .. 1 s)
+LATENCY_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0,
+)
+
+HELP = {
+    "markov_calls_total": ("counter", "Calls of an instrumented function."),
+    "markov_latency_seconds": ("histogram", "Latency of an instrumented function."),
+    "markov_backoff_level_total": ("counter", "Sampling draws resolved at each backoff level."),
+    "markov_sample_seconds": ("histogram", "Sampling latency by backoff level."),
+    "markov_unknown_chord_total": ("counter", "Unknown chords mapped to the default function."),
+}
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus semantics)."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """[(upper_bound, count <= bound)], ending with +Inf."""
+        total = 0
+        rows = []
+        for bound, count in zip(list(self.bounds) + [float("inf")], self.counts):
+            total += count
+            rows.append((bound, total))
+        return rows
+
+
+# Latency samples kept for LatencyRecorder percentiles
+LATENCY_WINDOW = 10000
+
+
+class LatencyRecorder:
+    """
+    Sliding window of latencies (ms) with percentiles, for the servers and
+    the MIDI input loop. Always on, unlike the collectors below.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, ms):
+        self.samples.append(ms)
+        self.count += 1
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def summary(self):
+        return {
+            "requests": self.count,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+        }
+
+
+# (name, labels) -> int / Histogram; labels is a tuple of (key, value)
+COUNTERS = {}
+HISTOGRAMS = {}
+
+
+def enable():
+    """Turn collection on for modules imported from now on."""
+    global ENABLED
+    ENABLED = True
+
+
+def reset():
+    for key in COUNTERS:
+        COUNTERS[key] = 0
+    for key in HISTOGRAMS:
+        HISTOGRAMS[key] = Histogram(HISTOGRAMS[key].bounds)
+
+
+def counter_key(name, **labels):
+    key = (name, tuple(labels.items()))
+    COUNTERS.setdefault(key, 0)
+    return key
+
+
+def histogram_key(name, **labels):
+    key = (name, tuple(labels.items()))
+    HISTOGRAMS.setdefault(key, Histogram())
+    return key
+
+
+# ------------------------------------------------------
+# Decorators
+# ------------------------------------------------------
+
+def timed(model, function=None):
+    """Count calls and record latency of the decorated function."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        name = function or fn.__name__
+        calls = counter_key("markov_calls_total", model=model, function=name)
+        latency = histogram_key("markov_latency_seconds", model=model, function=name)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                HISTOGRAMS[latency].observe(time.perf_counter() - start)
+                COUNTERS[calls] += 1
+        return wrapper
+    return decorate
+
+
+def timed_sampler(model, function=None):
+    """
+    Like timed(), for functions with a return_level parameter: also counts
+    which backoff level answered and times each level separately. The call
+    is bound to fn's signature, so return_level may be passed positionally.
+    """
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        import inspect  # only paid for when metrics are on
+        signature = inspect.signature(fn)
+        name = function or fn.__name__
+        calls = counter_key("markov_calls_total", model=model, function=name)
+        latency = histogram_key("markov_latency_seconds", model=model, function=name)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            return_level = bound.arguments.get("return_level", False)
+            bound.arguments["return_level"] = True
+            start = time.perf_counter()
+            result, level = fn(*bound.args, **bound.kwargs)
+            elapsed = time.perf_counter() - start
+
+            COUNTERS[calls] += 1
+            HISTOGRAMS[latency].observe(elapsed)
+            level_key = ("markov_backoff_level_total", (("model", model), ("level", str(level))))
+            COUNTERS[level_key] = COUNTERS.get(level_key, 0) + 1
+            sample_key = ("markov_sample_seconds", (("model", model), ("level", str(level))))
+            if sample_key not in HISTOGRAMS:
+                HISTOGRAMS[sample_key] = Histogram()
+            HISTOGRAMS[sample_key].observe(elapsed)
+
+            if return_level:
+                return result, level
+            return result
+        return wrapper
+    return decorate
+
+
+def count_unknown(model, known):
+    """Count calls of get_function(chord) for chords missing from `known`."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        unknown = counter_key("markov_unknown_chord_total", model=model)
+
+        @functools.wraps(fn)
+        def wrapper(ch):
+            if ch not in known:
+                COUNTERS[unknown] += 1
+            return fn(ch)
+        return wrapper
+    return decorate
+
+
+# ------------------------------------------------------
+# Export
+# ------------------------------------------------------
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _bound(value):
+    return "+Inf" if value == float("inf") else repr(value)
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for name, (kind, text) in HELP.items():
+        rows = sorted((labels, v) for (n, labels), v in COUNTERS.items() if n == name)
+        hists = sorted(
+            ((labels, h) for (n, labels), h in HISTOGRAMS.items() if n == name),
+            key=lambda item: item[0],
+        )
+        if not rows and not hists:
+            continue
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in rows:
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for labels, hist in hists:
+            for bound, count in hist.cumulative():
+                lines.append(f"{name}_bucket{_labels(labels, [('le', _bound(bound))])} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {hist.sum!r}")
+            lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    with open(path, "w") as f:
+        f.write(render_prometheus())
+
+
+def _dump_at_exit(path):
+    write_prometheus(path)
+    print(f"Metrics saved as {path}")
+
+
+# ------------------------------------------------------
+# Environment hooks
+# ------------------------------------------------------
+
+if os.environ.get(METRICS_ENV, "") not in ("", "0", "1"):
+    atexit.register(_dump_at_exit, os.environ[METRICS_ENV])
+
+if os.environ.get(PROFILE_ENV):
+    import cProfile
+
+    PROFILER = cProfile.Profile()
+
+    def _save_profile(path):
+        PROFILER.disable()
+        PROFILER.dump_stats(path)
+        print(f"Profile saved as {path} (python -m pstats {path})")
+
+    atexit.register(_save_profile, os.environ[PROFILE_ENV])
+    PROFILER.enable()
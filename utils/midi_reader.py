@@ -0,0 +1,121 @@
+"""
+Minimal Standard MIDI File reader for note events.
+
+Counterpart of midi_writer.py, used to replay recorded performances
+without MIDI hardware. Only what the replay harness needs is decoded:
+note-on/note-off on any channel, plus tempo changes to convert ticks to
+seconds. Other events are skipped.
+
+    events = read_note_events("markov_interactive.mid")
+    # [(seconds, note, velocity), ...] sorted by time; velocity 0 = note off
+"""
+
+import struct
+
+DEFAULT_TEMPO = 500000  # usec per quarter (120 bpm)
+
+# Data bytes of channel messages by status high nibble
+_DATA_LENGTH = {0x8: 2, 0x9: 2, 0xA: 2, 0xB: 2, 0xC: 1, 0xD: 1, 0xE: 2}
+
+
+def _read_vlq(data, pos):
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, pos
+
+
+def _read_track(data):
+    """Yield (tick, kind, payload) with kind "note" or "tempo"."""
+    pos = 0
+    tick = 0
+    status = None
+
+    while pos < len(data):
+        delta, pos = _read_vlq(data, pos)
+        tick += delta
+
+        byte = data[pos]
+        if byte == 0xFF:  # meta event
+            kind = data[pos + 1]
+            length, pos = _read_vlq(data, pos + 2)
+            if kind == 0x51 and length == 3:
+                yield tick, "tempo", int.from_bytes(data[pos:pos + 3], "big")
+            elif kind == 0x2F:
+                return
+            pos += length
+            continue
+
+        if byte in (0xF0, 0xF7):  # sysex
+            length, pos = _read_vlq(data, pos + 1)
+            pos += length
+            continue
+
+        if byte & 0x80:
+            status = byte
+            pos += 1
+        elif status is None:
+            raise ValueError("Running status without a previous status byte")
+
+        high = status >> 4
+        args = data[pos:pos + _DATA_LENGTH[high]]
+        pos += _DATA_LENGTH[high]
+
+        if high == 0x9:
+            yield tick, "note", (args[0], args[1])
+        elif high == 0x8:
+            yield tick, "note", (args[0], 0)
+
+
+def read_note_events(source):
+    """
+    Return [(seconds, note, velocity)] of all tracks, sorted by time.
+    `source` is a path, bytes, or a binary file-like object.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        data = bytes(source)
+    elif hasattr(source, "read"):
+        data = source.read()
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+
+    if data[:4] != b"MThd":
+        raise ValueError("Not a Standard MIDI File")
+    header_len, _, num_tracks, division = struct.unpack(">IHHH", data[4:14])
+    if division & 0x8000:
+        raise ValueError("SMPTE time division is not supported")
+
+    pos = 8 + header_len
+    tempos = []
+    notes = []
+    for track in range(num_tracks):
+        kind, length = struct.unpack(">4sI", data[pos:pos + 8])
+        pos += 8
+        if kind == b"MTrk":
+            for order, (tick, event, payload) in enumerate(_read_track(data[pos:pos + length])):
+                if event == "tempo":
+                    tempos.append((tick, payload))
+                else:
+                    notes.append((tick, track, order, payload))
+        pos += length
+
+    # Tick → seconds through the tempo map
+    tempos.sort()
+    notes.sort()
+    events = []
+    seconds = 0.0
+    last_tick = 0
+    tempo = DEFAULT_TEMPO
+    t = 0
+    for tick, _, _, (note, velocity) in notes:
+        while t < len(tempos) and tempos[t][0] <= tick:
+            seconds += (tempos[t][0] - last_tick) * tempo / division / 1e6
+            last_tick, tempo = tempos[t]
+            t += 1
+        events.append((seconds + (tick - last_tick) * tempo / division / 1e6, note, velocity))
+
+    return events
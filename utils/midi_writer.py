@@ -0,0 +1,129 @@
+"""
+Direct Standard MIDI File writer for chord progressions.
+
+render_midi() used to build a music21 Stream, parse every chord through
+harmony.ChordSymbol and run midi.translate.streamToMidiFile, which costs
+tens of milliseconds per file. For the project's chord vocabulary the
+pitches are fixed, so this module writes the SMF bytes directly from a
+precomputed chord → MIDI note table.
+
+The output matches what music21 writes for a Stream of ChordSymbols with
+quarterLength 2: format 1, 10080 ticks per quarter, a conductor track
+(120 bpm, 4/4) and one note track on channel 1 at velocity 90.
+
+    data = progression_to_midi(["C", "F", "G", "C"])
+    write_midi(["C", "F", "G", "C"], "progression.mid")   # path or binary buffer
+"""
+
+import struct
+
+# Semitones above the root, by chord-symbol quality suffix
+TRIAD_INTERVALS = {"": (0, 4, 7), "m": (0, 3, 7), "dim": (0, 3, 6)}
+
+
+def triad_pitches(letter, accidental, quality):
+    """
+    MIDI notes of harmony.ChordSymbol for a triad, lowest first. music21
+    puts roots lettered C..G in octave 3 and A, B in octave 2, then applies
+    the accidental (C = (48, 52, 55), Am = (45, 48, 52), Ab = (44, 48, 51)).
+    """
+    index = "CDEFGAB".index(letter)
+    root = (48 if index < 5 else 36) + (0, 2, 4, 5, 7, 9, 11)[index] + accidental
+    return tuple(root + i for i in TRIAD_INTERVALS[quality])
+
+
+# Every major/minor/diminished triad on every spelled root (Bb, F#, E#, ...),
+# so progressions in any key are written directly (see utils/transpose.py)
+CHORD_PITCHES = {
+    letter + text + quality: triad_pitches(letter, offset, quality)
+    for letter in "CDEFGAB"
+    for text, offset in (("bb", -2), ("b", -1), ("", 0), ("#", 1), ("##", 2))
+    for quality in TRIAD_INTERVALS
+}
+
+TICKS_PER_QUARTER = 10080
+QUARTER_LENGTH = 2
+VELOCITY = 90
+CHANNEL = 0  # music21 channel 1
+
+TEMPO_USEC_PER_QUARTER = 500000  # 120 bpm
+
+
+def can_render(progression):
+    """True if every chord has a precomputed pitch table entry."""
+    return all(ch in CHORD_PITCHES for ch in progression)
+
+
+def _vlq(value):
+    """MIDI variable-length quantity."""
+    out = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        out.insert(0, 0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(out)
+
+
+def _chunk(kind, data):
+    return kind + struct.pack(">I", len(data)) + data
+
+
+# Constant parts, built once
+_HEADER = _chunk(b"MThd", struct.pack(">HHH", 1, 2, TICKS_PER_QUARTER))
+
+_CONDUCTOR_TRACK = _chunk(
+    b"MTrk",
+    b"\x00\xff\x51\x03" + TEMPO_USEC_PER_QUARTER.to_bytes(3, "big")
+    + b"\x00\xff\x58\x04\x04\x02\x18\x08"
+    + _vlq(TICKS_PER_QUARTER) + b"\xff\x2f\x00",
+)
+
+# Empty track name + centered pitch bend, as music21 writes them
+_TRACK_START = b"\x00\xff\x03\x00" + bytes([0x00, 0xE0 | CHANNEL, 0x00, 0x40])
+_TRACK_END = _vlq(TICKS_PER_QUARTER) + b"\xff\x2f\x00"
+
+_NOTE_ON = 0x90 | CHANNEL
+_NOTE_OFF = 0x80 | CHANNEL
+
+
+def _chord_events(pitches, duration_ticks):
+    """Delta-timed note-on/note-off bytes for one block chord."""
+    events = bytearray()
+    for p in pitches:
+        events += bytes([0x00, _NOTE_ON, p, VELOCITY])
+    delta = _vlq(duration_ticks)
+    for i, p in enumerate(pitches):
+        events += (delta if i == 0 else b"\x00") + bytes([_NOTE_OFF, p, 0])
+    return bytes(events)
+
+
+# Per-chord event bytes for the default duration
+_CHORD_EVENTS = {
+    ch: _chord_events(pitches, QUARTER_LENGTH * TICKS_PER_QUARTER)
+    for ch, pitches in CHORD_PITCHES.items()
+}
+
+
+def progression_to_midi(progression, quarter_length=QUARTER_LENGTH):
+    """Return the Standard MIDI File bytes for a chord progression."""
+    if quarter_length == QUARTER_LENGTH:
+        body = b"".join(_CHORD_EVENTS[ch] for ch in progression)
+    else:
+        ticks = int(round(quarter_length * TICKS_PER_QUARTER))
+        body = b"".join(_chord_events(CHORD_PITCHES[ch], ticks) for ch in progression)
+
+    return _HEADER + _CONDUCTOR_TRACK + _chunk(b"MTrk", _TRACK_START + body + _TRACK_END)
+
+
+def write_bytes(data, target):
+    """Write MIDI bytes to a file path or a binary file-like object."""
+    if hasattr(target, "write"):
+        target.write(data)
+    else:
+        with open(target, "wb") as f:
+            f.write(data)
+
+
+def write_midi(progression, target, quarter_length=QUARTER_LENGTH):
+    """Write a progression to a file path or a binary file-like object."""
+    write_bytes(progression_to_midi(progression, quarter_length), target)
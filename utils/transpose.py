@@ -0,0 +1,218 @@
+"""
+Key-independent chord tokens and per-key transposition tables.
+
+Chords are encoded relative to the key as Roman-numeral interval tokens:
+the numeral is the scale step of the root, upper case for major, lower
+case for minor, "°" for diminished, with b/# when the root is off the
+major scale. Extensions stay as a suffix:
+
+    in C:  C → I   Dm → ii   G7 → V7   Bdim → vii°   D → II (V/V)   Bb → bVII
+    in G:  G → I   Am → ii   D7 → V7   F#dim → vii°  A → II         F → bVII
+
+The synthetic dataset and the trained models stay in C major (the
+reference key); tokens make them usable in every major key without
+duplicating any data. KeyTables(key) precomputes, once per key:
+
+    names / tokens    triad token ↔ chord name for every step and b/#/natural root
+    from_reference    C-major chord name → chord name in this key
+    to_reference      chord name in this key → C-major chord name
+
+so moving a progression between keys costs one dict lookup per chord.
+MIDI pitches need no per-key table: midi_writer.CHORD_PITCHES already
+holds every triad spelling these tables produce.
+
+    tables = key_tables("Bb")
+    tables.realize(["I", "vi", "ii", "V7"])         # ['Bb', 'Gm', 'Cm', 'F7']
+    tables.to_tokens(["Bb", "Gm", "Cm", "F7"])      # ['I', 'vi', 'ii', 'V7']
+"""
+
+import re
+
+from utils.midi_writer import TRIAD_INTERVALS
+
+REFERENCE_KEY = "C"
+
+LETTERS = "CDEFGAB"
+# Pitch class of each letter = major-scale interval of each step
+NATURAL_PC = (0, 2, 4, 5, 7, 9, 11)
+NUMERALS = ("I", "II", "III", "IV", "V", "VI", "VII")
+ACCIDENTALS = {-2: "bb", -1: "b", 0: "", 1: "#", 2: "##"}
+ACCIDENTAL_VALUES = {text: value for value, text in ACCIDENTALS.items()}
+
+# Extended chords / tokens remembered per key after the precomputed triads
+MAX_MEMO = 4096
+
+# Harmonic function of the triad tokens (secondary dominants V/V, V/vi and
+# V/ii of Tests/test.py are II, III and VI); anything else counts as tonic
+TOKEN_FUNCTIONS = {
+    "I": "tonic", "iii": "tonic", "vi": "tonic",
+    "ii": "predominant", "IV": "predominant",
+    "V": "dominant", "vii°": "dominant",
+    "II": "dominant", "III": "dominant", "VI": "dominant",
+}
+
+_CHORD_RE = re.compile(r"^([A-G])(bb|b|##|#)?(.*)$")
+_TOKEN_RE = re.compile(r"^(bb|b|##|#)?(VII|VI|V|IV|III|II|I|vii|vi|v|iv|iii|ii|i)(°?)(.*)$")
+
+
+# ------------------------------------------------------
+# Parsing
+# ------------------------------------------------------
+
+def _split_quality(rest):
+    """"m7" → ("m", "7"), "maj7" → ("", "maj7"), "dim" → ("dim", "")."""
+    if rest.startswith("dim"):
+        return "dim", rest[3:]
+    if rest.startswith("m") and not rest.startswith("maj"):
+        return "m", rest[1:]
+    return "", rest
+
+
+def parse_chord(name):
+    """Chord symbol → (letter index, accidental, quality, extension), or None."""
+    match = _CHORD_RE.match(name)
+    if match is None:
+        return None
+    letter, accidental, rest = match.groups()
+    quality, extension = _split_quality(rest)
+    return LETTERS.index(letter), ACCIDENTAL_VALUES[accidental or ""], quality, extension
+
+
+def parse_token(token):
+    """Token → (step, accidental, quality, extension), or None."""
+    match = _TOKEN_RE.match(token)
+    if match is None:
+        return None
+    accidental, numeral, dim, extension = match.groups()
+    if dim:
+        quality = "dim"
+    elif numeral.islower():
+        quality = "m"
+    else:
+        quality = ""
+    return NUMERALS.index(numeral.upper()), ACCIDENTAL_VALUES[accidental or ""], quality, extension
+
+
+def make_token(step, accidental, quality, extension=""):
+    numeral = NUMERALS[step] if quality == "" else NUMERALS[step].lower()
+    return ACCIDENTALS[accidental] + numeral + ("°" if quality == "dim" else "") + extension
+
+
+def _wrap(semitones):
+    """Smallest signed distance, -6..5."""
+    return (semitones + 6) % 12 - 6
+
+
+def token_function(token):
+    """Harmonic function of a token (extensions ignored; default tonic)."""
+    func = TOKEN_FUNCTIONS.get(token)
+    if func is None:
+        parsed = parse_token(token)
+        if parsed is not None:
+            func = TOKEN_FUNCTIONS.get(make_token(*parsed[:3]))
+    return func or "tonic"
+
+
+# ------------------------------------------------------
+# Per-key tables
+# ------------------------------------------------------
+
+class KeyTables:
+    """Token ↔ chord-name tables of one major key."""
+
+    def __init__(self, key):
+        parsed = parse_chord(key)
+        if parsed is None or parsed[2:] != ("", ""):
+            raise ValueError(f"Unknown key {key!r} (use a major key such as C, G, Bb, F#)")
+        self.key = key
+        self.letter, accidental = parsed[:2]
+        self.tonic_pc = (NATURAL_PC[self.letter] + accidental) % 12
+
+        self.names = {}
+        self.tokens = {}
+        triads = []
+        for step in range(7):
+            for accidental in (-1, 0, 1):
+                for quality in TRIAD_INTERVALS:
+                    token = make_token(step, accidental, quality)
+                    name = self._spell(step, accidental, quality)
+                    self.names[token] = name
+                    self.tokens.setdefault(name, token)
+                    triads.append(token)
+
+        self.reference = reference = self if key == REFERENCE_KEY else key_tables(REFERENCE_KEY)
+        self.from_reference = {reference.names[t]: self.names[t] for t in triads}
+        self.to_reference = {self.names[t]: reference.names[t] for t in triads}
+
+    def _spell(self, step, accidental, quality, extension=""):
+        letter = (self.letter + step) % 7
+        pc = (self.tonic_pc + NATURAL_PC[step] + accidental) % 12
+        root_accidental = _wrap(pc - NATURAL_PC[letter])
+        return LETTERS[letter] + ACCIDENTALS[root_accidental] + quality + extension
+
+    def token(self, chord):
+        """Chord name in this key → token. Unparseable names pass through unchanged."""
+        token = self.tokens.get(chord)
+        if token is None:
+            parsed = parse_chord(chord)
+            if parsed is None:
+                return chord
+            letter, accidental, quality, extension = parsed
+            step = (letter - self.letter) % 7
+            pc = (NATURAL_PC[letter] + accidental) % 12
+            token = make_token(step, _wrap(pc - self.tonic_pc - NATURAL_PC[step]), quality, extension)
+            if len(self.tokens) < MAX_MEMO:
+                self.tokens[chord] = token  # extended chords are added as they show up
+        return token
+
+    def name(self, token):
+        """Token → chord name in this key. Unparseable tokens pass through unchanged."""
+        name = self.names.get(token)
+        if name is None:
+            parsed = parse_token(token)
+            if parsed is None:
+                return token
+            name = self._spell(*parsed)
+            if len(self.names) < MAX_MEMO:
+                self.names[token] = name
+        return name
+
+    def reference_chord(self, chord):
+        """Chord name in this key → the same degree in C major ("D7" in G → "G7")."""
+        name = self.to_reference.get(chord)
+        if name is None:
+            name = self.reference.name(self.token(chord))
+        return name
+
+    def to_tokens(self, progression):
+        return [self.token(ch) for ch in progression]
+
+    def realize(self, tokens):
+        return [self.name(t) for t in tokens]
+
+
+# key -> KeyTables, built on first use
+KEY_TABLES = {}
+
+
+def key_tables(key=REFERENCE_KEY):
+    tables = KEY_TABLES.get(key)
+    if tables is None:
+        tables = KEY_TABLES[key] = KeyTables(key)
+    return tables
+
+
+def generate_in_key(generate, start_chord, key, *args, **kwargs):
+    """
+    Run a C-major generator, generate(start_chord, *args, **kwargs), in
+    another key: the start chord is moved to C and the generated chords
+    back to `key` (the start chord itself is returned as given).
+    """
+    tables = key_tables(key)
+    progression = generate(tables.reference_chord(start_chord), *args, **kwargs)
+    return [start_chord] + [tables.from_reference[ch] for ch in progression[1:]]
+
+
+def transpose(progression, from_key, to_key):
+    """Move a progression of chord names from one major key to another."""
+    return key_tables(to_key).realize(key_tables(from_key).to_tokens(progression))